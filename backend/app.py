@@ -1,19 +1,40 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from starlette.responses import FileResponse
 from pathlib import Path
 from database.database import engine
-from database import models
+from database.migrations import run_migrations
+from services.n8n_notify import N8N_DISPATCHER_ENABLED, dispatcher
+from services.indexing import INDEXER_ENABLED, workers as index_workers
+from services.static_assets import StaticManifest
+from services.compression import CompressionMiddleware
+from services.llm_providers import aclose_providers
 
-app = FastAPI()
-models.Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Envoi des webhooks n8n en attente dans l'outbox
+    if N8N_DISPATCHER_ENABLED:
+        dispatcher.start()
+    # Indexation incrémentale des notes modifiées (journal note_changes)
+    if INDEXER_ENABLED:
+        index_workers.start()
+    yield
+    await index_workers.stop()
+    await dispatcher.stop()
+    await aclose_providers()
+
+
+app = FastAPI(lifespan=lifespan)
+run_migrations(engine)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "http://109.129.246.230:3000"],
     allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(CompressionMiddleware)
 
 from routes.agent import router as agent_router
 from routes.user import router as user_router
@@ -30,23 +51,24 @@ app.include_router(project.router)
 
 BASE_DIR = Path(__file__).resolve().parent
 FRONTEND_DIST = BASE_DIR / "frontend_dist"
-INDEX_FILE = FRONTEND_DIST / "index.html"
 
-for sub in ["_next", "assets", "static"]:
-    p = FRONTEND_DIST / sub
-    if p.exists():
-        app.mount(f"/{sub}", StaticFiles(directory=p), name=sub)
+# Index des fichiers du front (et de leurs variantes .br/.gz) construit une
+# fois ici : plus de stat par requête. Relancer l'app après un build du front.
+STATIC_FILES = StaticManifest(FRONTEND_DIST)
+
+
+def _serve_frontend(request: Request, full_path: str):
+    response = STATIC_FILES.response(request, full_path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    return response
+
 
 @app.get("/", include_in_schema=False)
-def root():
-    return FileResponse(INDEX_FILE)
+def root(request: Request):
+    return _serve_frontend(request, "")
 
 
 @app.get("/{full_path:path}", include_in_schema=False)
-def spa_fallback(full_path: str):
-    candidate = FRONTEND_DIST / full_path
-    if candidate.is_dir():
-        candidate = candidate / "index.html"
-    if candidate.exists():
-        return FileResponse(candidate)
-    return FileResponse(INDEX_FILE)
+def spa_fallback(full_path: str, request: Request):
+    return _serve_frontend(request, full_path)
@@ -1,7 +1,10 @@
 import subprocess
 import shutil
+import sys
 from pathlib import Path
 
+from services.static_assets import brotli, precompress_dir
+
 ROOT = Path(__file__).resolve().parents[1]  # dossier racine du projet
 FRONTEND = ROOT / "frontend"
 OUT = FRONTEND / "out"
@@ -11,7 +14,19 @@ def run(cmd, cwd=None):
     print(f"$ {' '.join(cmd)}")
     subprocess.run(cmd, cwd=cwd, check=True)
 
+def compress():
+    # Variantes .br/.gz servies directement par app.py (voir services/static_assets.py)
+    written = precompress_dir(DIST)
+    print(f"Précompressé: {written['gzip']} .gz, {written['br']} .br ({written['skipped']} fichiers trop petits)")
+    if brotli is None:
+        print("Paquet `brotli` absent : pas de variantes .br")
+
 def main():
+    # --compress-only : précompresse un frontend_dist déjà construit
+    if "--compress-only" in sys.argv[1:]:
+        compress()
+        return
+
     run(["npm", "install"], cwd=FRONTEND)
     run(["npm", "run", "build"], cwd=FRONTEND)
     run(["npx", "next", "export"], cwd=FRONTEND)
@@ -21,6 +36,7 @@ def main():
     DIST.mkdir(parents=True, exist_ok=True)
     shutil.copytree(OUT, DIST, dirs_exist_ok=True)
     print(f"Copié: {OUT} → {DIST}")
+    compress()
 
 if __name__ == "__main__":
     main()
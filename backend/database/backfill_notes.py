@@ -0,0 +1,107 @@
+# backend/database/backfill_notes.py
+"""
+Calcule les champs dérivés (wordCount, résumé automatique, contentHash) des
+notes existantes, par lots, chaque lot dans sa propre transaction.
+
+Par défaut seules les notes sans contentHash sont traitées (notes antérieures
+à la migration 0008) : le script peut être relancé sans risque. --force
+recalcule tout (après un changement de l'algorithme de résumé par exemple) ;
+les résumés saisis par l'utilisateur ne sont jamais remplacés.
+
+--embeddings découpe aussi les notes en chunks et calcule les vecteurs
+manquants ou périmés de chaque utilisateur (sinon c'est fait en tâche de fond,
+sauf après un changement d'EMBEDDER).
+
+--links recalcule le graphe entre notes (liens [[...]] et concepts partagés).
+
+Usage :
+    python -m database.backfill_notes [--batch-size 500] [--force] [--embeddings] [--links]
+"""
+import argparse
+import time
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .models import Note, User
+from services.embeddings import get_embedder, refresh_embeddings
+from services.graph_services import refresh_links
+from services.note_processing import apply_content
+
+
+def backfill(batch_size: int = 500, force: bool = False) -> int:
+    processed = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            stmt = select(Note).where(Note.id > last_id)
+            if not force:
+                stmt = stmt.where(Note.contentHash.is_(None))
+            notes = db.scalars(stmt.order_by(Note.id).limit(batch_size)).all()
+            if not notes:
+                return processed
+            for note in notes:
+                if force:
+                    note.contentHash = None
+                apply_content(note)
+            db.commit()
+            processed += len(notes)
+            last_id = notes[-1].id
+        print(f"[backfill] {processed} notes traitées")
+
+
+def backfill_embeddings() -> int:
+    with SessionLocal() as db:
+        user_ids = db.scalars(select(User.id)).all()
+    total = 0
+    for user_id in user_ids:
+        with SessionLocal() as db:
+            total += refresh_embeddings(db, user_id)
+            db.commit()
+    print(f"[backfill] embeddings ({get_embedder().model_id}) : {total} chunks recalculés")
+    return total
+
+
+def backfill_links(batch_size: int = 500) -> int:
+    with SessionLocal() as db:
+        user_ids = db.scalars(select(User.id)).all()
+    total = 0
+    for user_id in user_ids:
+        last_id = ""
+        while True:
+            with SessionLocal() as db:
+                ids = db.scalars(
+                    select(Note.id).where(Note.user_id == user_id, Note.id > last_id)
+                    .order_by(Note.id).limit(batch_size)
+                ).all()
+                if not ids:
+                    break
+                # Les lots suivants recalculent aussi les liens concept des
+                # notes déjà traitées qui partagent leurs concepts
+                refresh_links(db, user_id, ids)
+                db.commit()
+            last_id = ids[-1]
+            total += len(ids)
+    print(f"[backfill] liens : {total} notes traitées")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--force", action="store_true", help="recalcule aussi les notes déjà traitées")
+    parser.add_argument("--embeddings", action="store_true", help="calcule aussi les embeddings")
+    parser.add_argument("--links", action="store_true", help="recalcule aussi le graphe entre notes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = backfill(args.batch_size, args.force)
+    if args.embeddings:
+        backfill_embeddings()
+    if args.links:
+        backfill_links(args.batch_size)
+    print(f"[backfill] terminé : {total} notes en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# backend/database/bench_responses.py
+"""
+Benchmark de la liste des notes d'un utilisateur (5 000 notes par défaut) :
+temps de sérialisation et octets transférés.
+
+    sérialisation : JSONResponse(jsonable_encoder(...)) (avant)
+                    contre FastJSONResponse / orjson (après)
+    transfert     : GET /notes/user/{id} sans compression, en gzip, et en br
+                    si le paquet `brotli` est installé
+
+La base est temporaire ; le contenu des notes est du texte de taille réaliste.
+
+Usage :
+    python -m database.bench_responses [--notes 5000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+_TMP = tempfile.mkdtemp(prefix="corebrain-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from .database import SessionLocal  # noqa: E402
+from .models import Note, User  # noqa: E402
+
+_WORDS = (
+    "projet réunion objectif client budget planning équipe livraison analyse "
+    "risque priorité suivi note idée document version test retour décision"
+).split()
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _seed(count: int) -> str:
+    rng = random.Random(42)
+    user_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.add(User(id=user_id, name="bench", email="bench@bench.io", createdAt=now))
+        db.flush()
+        rows = []
+        for i in range(count):
+            created = now - timedelta(minutes=i)
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "title": f"Note {i} — {_paragraph(rng, 4)}",
+                "content": "\n\n".join(_paragraph(rng, rng.randint(20, 80)) for _ in range(rng.randint(1, 5))),
+                "pinned": i % 17 == 0,
+                "createdAt": created,
+                "updatedAt": created,
+            })
+        db.execute(insert(Note.__table__), rows)
+        db.commit()
+    return user_id
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    import app as app_module  # applique les migrations sur la base temporaire
+    from services.compression import brotli
+    from services.responses import FastJSONResponse
+
+    user_id = _seed(args.notes)
+    client = TestClient(app_module.app)
+
+    # Sérialisation seule, sur les lignes renvoyées par la route
+    items = client.get(f"/notes/user/{user_id}", headers={"Accept-Encoding": "identity"}).json()
+    for item in items:
+        item["createdAt"] = datetime.fromisoformat(item["createdAt"])
+        item["updatedAt"] = datetime.fromisoformat(item["updatedAt"])
+    before = _time(lambda: JSONResponse(jsonable_encoder(items)), args.repeat)
+    after = _time(lambda: FastJSONResponse(items), args.repeat)
+    print(f"[bench] {len(items)} notes — sérialisation : jsonable_encoder+json {before:7.1f} ms | "
+          f"orjson {after:6.1f} ms (x{before / after:.1f})")
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        resp = client.get(f"/notes/user/{user_id}", headers={"Accept-Encoding": encoding})
+        wire = int(resp.headers["content-length"])
+        ms = _time(lambda: client.get(f"/notes/user/{user_id}", headers={"Accept-Encoding": encoding}), args.repeat)
+        print(f"[bench] GET /notes/user ({encoding:<8}) : {wire / 1024:8.1f} Kio transférés, {ms:7.1f} ms de bout en bout")
+    if brotli is None:
+        print("[bench] paquet `brotli` absent : br non mesuré")
+
+
+if __name__ == "__main__":
+    main()
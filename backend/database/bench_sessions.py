@@ -0,0 +1,163 @@
+# backend/database/bench_sessions.py
+"""
+Benchmark de latence des routes sous charge mixte lecture/écriture :
+session sync en threadpool (ancien `get_db` par routeur) contre la session
+partagée (database.session.get_db) dans ses deux modes, `threaded`
+(ThreadedSession, défaut SQLite) et `native` (AsyncSession + aiosqlite).
+
+Les deux variantes exécutent les mêmes requêtes (liste paginée des notes
+d'un utilisateur, création de note) sur une base temporaire ; l'ancienne
+variante est reproduite par deux routes /_bench/sync/... montées pour
+l'occasion. Une sonde mesure aussi le retard de la boucle asyncio.
+
+Usage :
+    python -m database.bench_sessions [--requests 2000] [--concurrency 64] [--writes 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+_TMP = tempfile.mkdtemp(prefix="corebrain-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+import httpx  # noqa: E402
+from fastapi import Depends, HTTPException  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from . import session as session_module  # noqa: E402
+from .database import SessionLocal  # noqa: E402
+from .models import Note, User  # noqa: E402
+from services.indexing import record_changes  # noqa: E402
+from services.note_processing import derived_fields  # noqa: E402
+
+
+def _legacy_get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _mount_legacy_routes(app) -> None:
+    # Même travail que les routes partagées : vérification de l'utilisateur,
+    # champs dérivés et journal d'indexation à la création
+    @app.get("/_bench/sync/notes/{user_id}")
+    def legacy_list(user_id: str, db: Session = Depends(_legacy_get_db)):
+        if db.query(User.id).filter(User.id == user_id).first() is None:
+            raise HTTPException(status_code=404)
+        rows = (
+            db.query(Note.id, Note.title, Note.createdAt)
+            .filter(Note.user_id == user_id)
+            .order_by(Note.createdAt.desc(), Note.id.desc())
+            .limit(20)
+            .all()
+        )
+        return [{"id": r.id, "title": r.title, "createdAt": r.createdAt} for r in rows]
+
+    @app.post("/_bench/sync/notes/{user_id}", status_code=201)
+    def legacy_create(user_id: str, db: Session = Depends(_legacy_get_db)):
+        db.get(User, user_id)
+        now = datetime.utcnow()
+        content = "x " * 50
+        note = Note(id=str(uuid.uuid4()), user_id=user_id, title="bench", content=content,
+                    createdAt=now, updatedAt=now, **derived_fields(content, None))
+        db.add(note)
+        record_changes(db, user_id, [note.id], "content")
+        db.commit()
+        db.refresh(note)
+        return {"id": note.id}
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def _run(client: httpx.AsyncClient, label: str, read, write, total: int, concurrency: int, write_ratio: float):
+    latencies = {"read": [], "write": []}
+    lags = []
+    stop = asyncio.Event()
+
+    async def probe():
+        while not stop.is_set():
+            t = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - t - 0.01)
+
+    queue = list(range(total))
+
+    async def worker():
+        while queue:
+            queue.pop()
+            kind = "write" if random.random() < write_ratio else "read"
+            t = time.perf_counter()
+            r = await (write() if kind == "write" else read())
+            r.raise_for_status()
+            latencies[kind].append(time.perf_counter() - t)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    all_lat = latencies["read"] + latencies["write"]
+    print(f"[bench] {label:<8} {total / elapsed:8.1f} req/s | "
+          f"lecture p50 {_pct(latencies['read'], .5):6.1f} ms p95 {_pct(latencies['read'], .95):6.1f} ms | "
+          f"écriture p50 {_pct(latencies['write'], .5):6.1f} ms p95 {_pct(latencies['write'], .95):6.1f} ms | "
+          f"global p99 {_pct(all_lat, .99):6.1f} ms | "
+          f"retard boucle moy {statistics.mean(lags) * 1000:5.1f} ms max {max(lags) * 1000:5.1f} ms")
+
+
+async def main_async(args) -> None:
+    import app as app_module  # applique les migrations sur la base temporaire
+
+    app = app_module.app
+    _mount_legacy_routes(app)
+    # Les routes montées après le fallback SPA doivent passer devant lui
+    app.router.routes.sort(key=lambda r: getattr(r, "path", "").startswith("/_bench") is False)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        user = await client.post("/users/", json={"name": "bench", "email": "bench@bench.io", "password": "x"})
+        uid = user.json()["id"]
+        for i in range(200):
+            await client.post("/notes/", json={"user_id": uid, "title": f"seed {i}", "content": "x " * 50})
+
+        await _run(
+            client, "sync",
+            lambda: client.get(f"/_bench/sync/notes/{uid}"),
+            lambda: client.post(f"/_bench/sync/notes/{uid}"),
+            args.requests, args.concurrency, args.writes,
+        )
+        for mode in ("threaded", "native"):
+            session_module.ASYNC_SESSION_MODE = mode
+            await _run(
+                client, mode,
+                lambda: client.get(f"/notes/user/{uid}", params={"limit": 20, "fields": "id,title,createdAt"}),
+                lambda: client.post("/notes/", json={"user_id": uid, "title": "bench", "content": "x " * 50}),
+                args.requests, args.concurrency, args.writes,
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--writes", type=float, default=0.2, help="part d'écritures (0-1)")
+    args = parser.parse_args()
+    random.seed(42)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
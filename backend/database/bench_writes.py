@@ -0,0 +1,97 @@
+# backend/database/bench_writes.py
+"""
+Benchmark d'écritures concurrentes SQLite : profil historique (aucun PRAGMA)
+contre le profil de database.sqlite_pragmas().
+
+Chaque thread enchaîne des transactions courtes (INSERT d'une note + lecture
+de la liste de l'utilisateur), comme le font les routes. Les bases sont
+créées dans un répertoire temporaire : corebrain.db n'est jamais touchée.
+
+Usage :
+    python -m database.bench_writes [--threads 8] [--writes 200]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from .database import Base, install_sqlite_profile, sqlite_pragmas
+from .models import Note, User
+
+
+def run_profile(label: str, pragmas: dict, threads: int, writes: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"bench_{label}.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    install_sqlite_profile(engine, pragmas)
+    Base.metadata.create_all(engine, tables=[User.__table__, Note.__table__])
+    Session = sessionmaker(bind=engine)
+
+    user_id = str(uuid.uuid4())
+    with Session() as db:
+        db.add(User(id=user_id, name="bench", email=f"{user_id}@bench"))
+        db.commit()
+
+    ok = 0
+    locked = 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal ok, locked
+        for i in range(writes):
+            db = Session()
+            try:
+                now = datetime.utcnow()
+                db.add(Note(id=str(uuid.uuid4()), user_id=user_id, title=f"n{i}",
+                            content="x " * 50, createdAt=now, updatedAt=now))
+                db.commit()
+                db.query(Note.id).filter(Note.user_id == user_id) \
+                    .order_by(Note.createdAt.desc()).limit(20).all()
+                with lock:
+                    ok += 1
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    locked += 1
+            finally:
+                db.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return {
+        "profile": label,
+        "ok": ok,
+        "locked": locked,
+        "seconds": round(elapsed, 2),
+        "writes_per_s": round(ok / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="transactions par thread")
+    args = parser.parse_args()
+
+    tuned = sqlite_pragmas() or {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000}
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, pragmas in (("historique", {}), ("optimise", tuned)):
+            r = run_profile(label, pragmas, args.threads, args.writes, workdir)
+            print(f"[bench] {r['profile']:<10} {r['ok']:>6} écritures ok, {r['locked']:>4} 'database is locked', "
+                  f"{r['seconds']:>6}s → {r['writes_per_s']} écritures/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from .models import User, Project, Area, Note, Tag
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
 from sqlalchemy import func, text
+from services.tag_services import resolve_tags
 import random
 import string
 
@@ -65,11 +66,7 @@ def ensure_user(db, uid: str) -> User:
     return u
 
 def get_or_create_tag(db, name: str) -> Tag:
-    t = db.query(Tag).filter(Tag.name == name).first()
-    if t: return t
-    t = Tag(id=gen_id(), name=name, createdAt=random_past_datetime())
-    db.add(t)
-    return t
+    return resolve_tags(db, [name])[0]
 
 def clear_existing_seed(db, user_id: str, prefix: str):
     """Supprime toutes les données SEED (avec le prefix) pour un user, sans toucher le reste."""
@@ -161,17 +158,11 @@ BASE_TAGS = [
 PEOPLE = ["Alice", "Bruno", "Camille", "David", "Emma", "Farid", "Gaëlle", "Hugo", "Inès", "Jonas", "Lina", "Maya"]
 
 def generate_tags(db):
-    tags = []
     base = set(BASE_TAGS)
     while len(base) < COUNTS["tags"]:
         base.add(f"t{safe_token(3)}")
-    for name in list(base)[:COUNTS["tags"]]:
-        tname = f"{SEED_PREFIX} {name}"
-        tag = db.query(Tag).filter(Tag.name == tname).first()
-        if not tag:
-            tag = Tag(id=gen_id(), name=tname, createdAt=random_past_datetime())
-            db.add(tag)
-        tags.append(tag)
+    names = [f"{SEED_PREFIX} {name}" for name in list(base)[:COUNTS["tags"]]]
+    tags = resolve_tags(db, names)
     db.flush()
     return tags
 
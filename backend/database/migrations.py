@@ -0,0 +1,728 @@
+# backend/database/migrations.py
+"""
+Migrations de schéma versionnées (remplace Base.metadata.create_all).
+
+Chaque migration est une fonction `(conn) -> None` enregistrée avec un
+numéro croissant ; les versions appliquées sont tracées dans
+`schema_migrations`. Les migrations doivent rester idempotentes (checkfirst /
+IF NOT EXISTS) pour supporter les bases créées avant ce mécanisme.
+
+Usage :
+    python -m database.migrations            # applique les migrations
+    python -m database.migrations status     # liste les versions
+"""
+import sys
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import (
+    JSON, Boolean, CheckConstraint, Column, DateTime, Float, ForeignKey, Index, Integer,
+    LargeBinary, MetaData, String, Table, Text, UniqueConstraint, inspect, text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from .database import engine as default_engine
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, name: str):
+    def register(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def _enqueue_all_notes(conn: Connection, kind: str) -> None:
+    """Journalise toutes les notes pour l'indexation en tâche de fond (services/indexing.py)."""
+    conn.execute(
+        text(
+            'INSERT INTO note_changes (note_id, user_id, kind, "createdAt", attempts) '
+            "SELECT id, user_id, :kind, :now, 0 FROM notes"
+        ),
+        {"kind": kind, "now": datetime.utcnow()},
+    )
+
+
+def add_column(conn: Connection, table: str, column: Column) -> None:
+    """ALTER TABLE ADD COLUMN à partir d'une définition figée, si absente."""
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    ddl_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN "{column.name}" {ddl_type}')
+
+
+def create_index(conn: Connection, name: str, table: str, *columns: str) -> None:
+    """CREATE INDEX IF NOT EXISTS (SQLite et PostgreSQL)."""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+
+
+###############################################################
+# SCHÉMA FIGÉ
+###############################################################
+# Chaque migration décrit les tables et index tels qu'ils étaient à sa
+# livraison, jamais via database/models.py : le modèle courant peut porter des
+# colonnes ou index ajoutés par une migration ultérieure (ex. un index sur une
+# colonne pas encore créée). Modifier le schéma = nouvelle migration + modèle.
+_frozen = MetaData()
+
+_users_v1 = Table(
+    "users", _frozen,
+    Column("id", String, primary_key=True),
+    Column("name", String),
+    Column("email", String, unique=True),
+    Column("avatarUrl", String),
+    Column("passwordHash", String),
+    Column("createdAt", DateTime, nullable=False),
+)
+_projects_v1 = Table(
+    "projects", _frozen,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("description", Text),
+    Column("context", Text),
+    Column(
+        "status", String,
+        CheckConstraint("status IN ('ACTIVE', 'PAUSED', 'COMPLETED')"),
+        nullable=False,
+    ),
+    Column("startDate", DateTime, nullable=False),
+    Column("plannedEndDate", DateTime),
+    Column("endDate", DateTime),
+    Column("priority", Integer, nullable=False),
+    Column("color", String),
+    Column("createdAt", DateTime, nullable=False),
+    Column("updatedAt", DateTime, nullable=False),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+)
+_areas_v1 = Table(
+    "areas", _frozen,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("description", Text),
+    Column("color", String),
+    Column("createdAt", DateTime, nullable=False),
+    Column("updatedAt", DateTime, nullable=False),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+)
+_notes_v1 = Table(
+    "notes", _frozen,
+    Column("id", String, primary_key=True),
+    Column("title", String, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("summary", Text),
+    Column("wordCount", Integer),
+    Column("pinned", Boolean, nullable=False),
+    Column("createdAt", DateTime, nullable=False),
+    Column("updatedAt", DateTime, nullable=False),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+)
+_tags_v1 = Table(
+    "tags", _frozen,
+    Column("id", String, primary_key=True),
+    Column("name", String, unique=True, nullable=False),
+    Column("createdAt", DateTime, nullable=False),
+)
+_project_notes_v1 = Table(
+    "project_notes", _frozen,
+    Column("project_id", String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
+    Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("added_at", DateTime, nullable=False),
+)
+_area_notes_v1 = Table(
+    "area_notes", _frozen,
+    Column("area_id", String, ForeignKey("areas.id", ondelete="CASCADE"), primary_key=True),
+    Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("added_at", DateTime, nullable=False),
+)
+_note_tags_v1 = Table(
+    "note_tags", _frozen,
+    Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", String, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+)
+
+_conversations_v1 = Table(
+    "conversations", _frozen,
+    Column("id", String, primary_key=True),
+    Column("createdAt", DateTime, nullable=False),
+)
+_conversation_messages_v1 = Table(
+    "conversation_messages", _frozen,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("conversation_id", String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+    Column("role", String, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("createdAt", DateTime, nullable=False),
+    Index("ix_conversation_messages_conv", "conversation_id", "id"),
+)
+
+_agent_results_v1 = Table(
+    "agent_results", _frozen,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("project_id", String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False),
+    Column("kind", String, nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("payload", JSON, nullable=False),
+    Column("receivedAt", DateTime, nullable=False),
+    UniqueConstraint("project_id", "kind", "version", name="uq_agent_results_version"),
+    Index("ix_agent_results_kind_received", "kind", "receivedAt"),
+)
+
+_n8n_outbox_v1 = Table(
+    "n8n_outbox", _frozen,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("event", String, nullable=False),
+    Column("project_id", String, nullable=False),
+    Column("payload", JSON, nullable=False),
+    Column(
+        "status", String,
+        CheckConstraint("status IN ('pending', 'sending', 'sent', 'dead')"),
+        nullable=False,
+    ),
+    Column("attempts", Integer, nullable=False),
+    Column("coalesced", Integer, nullable=False),
+    Column("nextAttemptAt", DateTime, nullable=False),
+    Column("lastError", Text),
+    Column("createdAt", DateTime, nullable=False),
+    Column("sentAt", DateTime),
+    Index("ix_n8n_outbox_due", "status", "nextAttemptAt"),
+    Index("ix_n8n_outbox_dedup", "project_id", "event", "createdAt"),
+)
+
+# Vecteurs par note (0009), remplacés par note_chunks (0011)
+_note_embeddings_v1 = Table(
+    "note_embeddings", _frozen,
+    Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("model", String, nullable=False),
+    Column("noteUpdatedAt", DateTime, nullable=False),
+    Column("vector", LargeBinary, nullable=False),
+    Index("ix_note_embeddings_user", "user_id"),
+)
+
+_note_changes_v1 = Table(
+    "note_changes", _frozen,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("note_id", String, nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("kind", String, CheckConstraint("kind IN ('content', 'links', 'delete')"), nullable=False),
+    Column("createdAt", DateTime, nullable=False),
+    Column("claimToken", String),
+    Column("claimedAt", DateTime),
+    Column("attempts", Integer, nullable=False),
+    Column("lastError", Text),
+    Index("ix_note_changes_claim", "claimedAt", "id"),
+    Index("ix_note_changes_token", "claimToken"),
+)
+
+_note_chunks_v1 = Table(
+    "note_chunks", _frozen,
+    Column("id", String(40), primary_key=True),
+    Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("position", Integer, nullable=False),
+    Column("start", Integer, nullable=False),
+    Column("end", Integer, nullable=False),
+    Column("heading", String),
+    Column("text", Text, nullable=False),
+    Column("noteHash", String(64)),
+    Column("embedHash", String(64), nullable=False),
+    Column("model", String),
+    Column("vector", LargeBinary),
+    Column("embeddedAt", DateTime),
+    Index("ix_note_chunks_note", "note_id", "noteHash"),
+    Index("ix_note_chunks_user_model", "user_id", "model", "embeddedAt"),
+)
+
+_note_links_v1 = Table(
+    "note_links", _frozen,
+    Column("source_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("target_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("kind", String, CheckConstraint("kind IN ('wiki', 'concept')"), primary_key=True),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("weight", Float, nullable=False),
+    Index("ix_note_links_target", "target_id", "kind", "source_id"),
+)
+_note_link_refs_v1 = Table(
+    "note_link_refs", _frozen,
+    Column("source_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("target_key", String, primary_key=True),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Index("ix_note_link_refs_key", "user_id", "target_key", "source_id"),
+)
+_note_concepts_v1 = Table(
+    "note_concepts", _frozen,
+    Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("concept", String, primary_key=True),
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Index("ix_note_concepts_user_concept", "user_id", "concept", "note_id"),
+)
+
+_user_counters_v1 = Table(
+    "user_counters", _frozen,
+    Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    Column("counter", String, primary_key=True),
+    Column("ref_id", String, primary_key=True),
+    Column("value", Integer, nullable=False),
+)
+
+
+###############################################################
+# MIGRATIONS
+###############################################################
+@migration(1, "initial_schema")
+def _initial_schema(conn: Connection) -> None:
+    tables = [
+        _users_v1, _projects_v1, _areas_v1, _notes_v1, _tags_v1,
+        _project_notes_v1, _area_notes_v1, _note_tags_v1,
+    ]
+    _frozen.create_all(conn, tables=tables, checkfirst=True)
+
+
+# Index FTS5 tel que livré en 0002 (rowid FTS = rowid de `notes`), remplacé
+# par 0014
+_NOTE_TAGS_V1 = (
+    "SELECT COALESCE(group_concat(t.name, ' '), '') "
+    "FROM note_tags nt JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id = {ref}"
+)
+_NOTES_FTS_V1 = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title, content, summary, tags,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content, summary, tags)
+        VALUES (NEW.rowid, NEW.title, NEW.content, COALESCE(NEW.summary, ''),
+                ({_NOTE_TAGS_V1.format(ref="NEW.id")}));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = OLD.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content, summary ON notes BEGIN
+        UPDATE notes_fts
+        SET title = NEW.title, content = NEW.content, summary = COALESCE(NEW.summary, '')
+        WHERE rowid = NEW.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS note_tags_fts_ai AFTER INSERT ON note_tags BEGIN
+        UPDATE notes_fts SET tags = ({_NOTE_TAGS_V1.format(ref="NEW.note_id")})
+        WHERE rowid = (SELECT rowid FROM notes WHERE id = NEW.note_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS note_tags_fts_ad AFTER DELETE ON note_tags BEGIN
+        UPDATE notes_fts SET tags = ({_NOTE_TAGS_V1.format(ref="OLD.note_id")})
+        WHERE rowid = (SELECT rowid FROM notes WHERE id = OLD.note_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tags_fts_au AFTER UPDATE OF name ON tags BEGIN
+        UPDATE notes_fts
+        SET tags = ({_NOTE_TAGS_V1.format(ref="(SELECT id FROM notes WHERE rowid = notes_fts.rowid)")})
+        WHERE rowid IN (
+            SELECT n.rowid FROM notes n JOIN note_tags nt ON nt.note_id = n.id
+            WHERE nt.tag_id = NEW.id
+        );
+    END
+    """,
+]
+
+
+@migration(2, "notes_fts")
+def _notes_fts(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+    existed = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")
+    ).first() is not None
+    for stmt in _NOTES_FTS_V1:
+        conn.exec_driver_sql(stmt)
+    if not existed:
+        conn.exec_driver_sql(f"""
+            INSERT INTO notes_fts(rowid, title, content, summary, tags)
+            SELECT n.rowid, n.title, n.content, COALESCE(n.summary, ''),
+                   ({_NOTE_TAGS_V1.format(ref="n.id")})
+            FROM notes n
+        """)
+
+
+@migration(3, "hot_query_indexes")
+def _hot_query_indexes(conn: Connection) -> None:
+    # Listes paginées par utilisateur (createdAt DESC, id DESC)
+    create_index(conn, "ix_notes_user_created", "notes", "user_id", "createdAt", "id")
+    create_index(conn, "ix_projects_user_created", "projects", "user_id", "createdAt", "id")
+    create_index(conn, "ix_areas_user_created", "areas", "user_id", "createdAt", "id")
+    # Jointures inverses (les PK servent projet/zone/note → notes/tags)
+    create_index(conn, "ix_project_notes_note", "project_notes", "note_id", "project_id")
+    create_index(conn, "ix_area_notes_note", "area_notes", "note_id", "area_id")
+    create_index(conn, "ix_note_tags_tag", "note_tags", "tag_id", "note_id")
+
+
+@migration(4, "conversations")
+def _conversations(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_conversations_v1, _conversation_messages_v1], checkfirst=True)
+
+
+@migration(5, "project_llm_settings")
+def _project_llm_settings(conn: Connection) -> None:
+    add_column(conn, "projects", Column("llmProvider", String))
+    add_column(conn, "projects", Column("llmModel", String))
+    add_column(conn, "projects", Column("llmTemperature", Float))
+
+
+@migration(6, "agent_results")
+def _agent_results(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_agent_results_v1], checkfirst=True)
+
+
+@migration(7, "n8n_outbox")
+def _n8n_outbox(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_n8n_outbox_v1], checkfirst=True)
+
+
+@migration(8, "note_derived_fields")
+def _note_derived_fields(conn: Connection) -> None:
+    # Remplissage des lignes existantes : python -m database.backfill_notes
+    add_column(conn, "notes", Column("contentHash", String(64)))
+    add_column(conn, "notes", Column("autoSummary", Boolean))
+
+
+@migration(9, "note_embeddings")
+def _note_embeddings(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_note_embeddings_v1], checkfirst=True)
+
+
+@migration(10, "note_changes")
+def _note_changes(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_note_changes_v1], checkfirst=True)
+    # Index de note_embeddings remplacé par un index couvrant (user_id, model, noteUpdatedAt)
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_note_embeddings_user")
+    create_index(conn, "ix_note_embeddings_user_model", "note_embeddings", "user_id", "model", "noteUpdatedAt")
+
+
+@migration(11, "note_chunks")
+def _note_chunks(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_note_chunks_v1], checkfirst=True)
+    conn.exec_driver_sql("DROP TABLE IF EXISTS note_embeddings")
+    # Toutes les notes existantes passent par l'indexation en tâche de fond
+    # (découpage + vecteurs) ; python -m database.backfill_notes --embeddings
+    # fait le même travail hors ligne
+    _enqueue_all_notes(conn, "content")
+
+
+@migration(12, "note_links")
+def _note_links(conn: Connection) -> None:
+    add_column(conn, "notes", Column("titleKey", String))
+    create_index(conn, "ix_notes_user_title_key", "notes", "user_id", "titleKey")
+    _frozen.create_all(conn, tables=[_note_links_v1, _note_link_refs_v1, _note_concepts_v1], checkfirst=True)
+    # Liens calculés en tâche de fond (ou python -m database.backfill_notes --links)
+    _enqueue_all_notes(conn, "links")
+
+
+# Compteurs initiaux tels que calculés par services/user_stats.py en 0013
+# (valeurs non nulles seulement)
+_USER_COUNTERS_V1 = [
+    "DELETE FROM user_counters",
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT user_id, 'notes', '', COUNT(*) FROM notes GROUP BY user_id
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT user_id, 'pinned', '', SUM(CASE WHEN pinned THEN 1 ELSE 0 END) FROM notes
+    GROUP BY user_id HAVING SUM(CASE WHEN pinned THEN 1 ELSE 0 END) > 0
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT user_id, 'words', '', SUM(COALESCE("wordCount", 0)) FROM notes
+    GROUP BY user_id HAVING SUM(COALESCE("wordCount", 0)) > 0
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT user_id, 'areas', '', COUNT(*) FROM areas GROUP BY user_id
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT user_id, 'projects', status, COUNT(*) FROM projects GROUP BY user_id, status
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT n.user_id, 'project_notes', pn.project_id, COUNT(*)
+    FROM project_notes pn JOIN notes n ON n.id = pn.note_id GROUP BY n.user_id, pn.project_id
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT n.user_id, 'area_notes', an.area_id, COUNT(*)
+    FROM area_notes an JOIN notes n ON n.id = an.note_id GROUP BY n.user_id, an.area_id
+    """,
+    """
+    INSERT INTO user_counters (user_id, counter, ref_id, value)
+    SELECT n.user_id, 'tag_notes', nt.tag_id, COUNT(*)
+    FROM note_tags nt JOIN notes n ON n.id = nt.note_id GROUP BY n.user_id, nt.tag_id
+    """,
+]
+
+
+@migration(13, "user_counters")
+def _user_counters(conn: Connection) -> None:
+    _frozen.create_all(conn, tables=[_user_counters_v1], checkfirst=True)
+    # Ensuite maintenus à chaque écriture (services/user_stats.py)
+    for stmt in _USER_COUNTERS_V1:
+        conn.exec_driver_sql(stmt)
+
+
+# Index FTS5 à clé stable : le rowid FTS vient de notes_fts_keys (INTEGER
+# PRIMARY KEY, non renuméroté par VACUUM), note_id / user_id sont dans l'index
+_NOTE_FTS_KEY = "(SELECT id FROM notes_fts_keys WHERE note_id = {ref})"
+_NOTES_FTS_V2 = [
+    "DROP TRIGGER IF EXISTS notes_fts_ai",
+    "DROP TRIGGER IF EXISTS notes_fts_ad",
+    "DROP TRIGGER IF EXISTS notes_fts_au",
+    "DROP TRIGGER IF EXISTS note_tags_fts_ai",
+    "DROP TRIGGER IF EXISTS note_tags_fts_ad",
+    "DROP TRIGGER IF EXISTS tags_fts_au",
+    "DROP TABLE IF EXISTS notes_fts",
+    """
+    CREATE TABLE IF NOT EXISTS notes_fts_keys (
+        id INTEGER PRIMARY KEY,
+        note_id VARCHAR NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE notes_fts USING fts5(
+        title, content, summary, tags, user_id, note_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT OR IGNORE INTO notes_fts_keys(note_id) VALUES (NEW.id);
+        INSERT INTO notes_fts(rowid, title, content, summary, tags, user_id, note_id)
+        VALUES ({_NOTE_FTS_KEY.format(ref="NEW.id")}, NEW.title, NEW.content,
+                COALESCE(NEW.summary, ''), ({_NOTE_TAGS_V1.format(ref="NEW.id")}),
+                NEW.user_id, NEW.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER notes_fts_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = {_NOTE_FTS_KEY.format(ref="OLD.id")};
+        DELETE FROM notes_fts_keys WHERE note_id = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER notes_fts_au AFTER UPDATE OF title, content, summary, user_id ON notes BEGIN
+        UPDATE notes_fts
+        SET title = NEW.title, content = NEW.content, summary = COALESCE(NEW.summary, ''),
+            user_id = NEW.user_id
+        WHERE rowid = {_NOTE_FTS_KEY.format(ref="NEW.id")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER note_tags_fts_ai AFTER INSERT ON note_tags BEGIN
+        UPDATE notes_fts SET tags = ({_NOTE_TAGS_V1.format(ref="NEW.note_id")})
+        WHERE rowid = {_NOTE_FTS_KEY.format(ref="NEW.note_id")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER note_tags_fts_ad AFTER DELETE ON note_tags BEGIN
+        UPDATE notes_fts SET tags = ({_NOTE_TAGS_V1.format(ref="OLD.note_id")})
+        WHERE rowid = {_NOTE_FTS_KEY.format(ref="OLD.note_id")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER tags_fts_au AFTER UPDATE OF name ON tags BEGIN
+        UPDATE notes_fts
+        SET tags = ({_NOTE_TAGS_V1.format(ref="notes_fts.note_id")})
+        WHERE rowid IN (
+            SELECT k.id FROM note_tags nt JOIN notes_fts_keys k ON k.note_id = nt.note_id
+            WHERE nt.tag_id = NEW.id
+        );
+    END
+    """,
+    "INSERT OR IGNORE INTO notes_fts_keys(note_id) SELECT id FROM notes",
+    f"""
+    INSERT INTO notes_fts(rowid, title, content, summary, tags, user_id, note_id)
+    SELECT k.id, n.title, n.content, COALESCE(n.summary, ''),
+           ({_NOTE_TAGS_V1.format(ref="n.id")}), n.user_id, n.id
+    FROM notes n JOIN notes_fts_keys k ON k.note_id = n.id
+    """,
+]
+
+
+@migration(14, "notes_fts_note_key")
+def _notes_fts_note_key(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+    for stmt in _NOTES_FTS_V2:
+        conn.exec_driver_sql(stmt)
+
+
+# Recherche PostgreSQL : tsvector stocké dans notes."searchVector" (index GIN),
+# tenu à jour par triggers comme notes_fts sous SQLite. Les tags vivent dans
+# une autre table : ni colonne générée ni index d'expression possibles.
+# unaccent est une extension « trusted » (PG ≥ 13) : le propriétaire de la
+# base peut l'installer sans être superutilisateur.
+_NOTES_SEARCH_PG_V1 = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    'ALTER TABLE notes ADD COLUMN IF NOT EXISTS "searchVector" tsvector',
+    """
+    CREATE OR REPLACE FUNCTION notes_search_vector(p_id text, p_title text, p_content text, p_summary text)
+    RETURNS tsvector LANGUAGE sql STABLE AS $$
+        SELECT setweight(to_tsvector('simple', unaccent(COALESCE(p_title, ''))), 'A')
+            || setweight(to_tsvector('simple', unaccent(COALESCE((
+                   SELECT string_agg(t.name, ' ') FROM note_tags nt
+                   JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id = p_id
+               ), ''))), 'B')
+            || setweight(to_tsvector('simple', unaccent(COALESCE(p_summary, ''))), 'C')
+            || setweight(to_tsvector('simple', unaccent(COALESCE(p_content, ''))), 'D')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notes_search_vector_tg() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW."searchVector" := notes_search_vector(NEW.id, NEW.title, NEW.content, NEW.summary);
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION note_tags_search_vector_tg() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE notes n
+        SET "searchVector" = notes_search_vector(n.id, n.title, n.content, n.summary)
+        WHERE n.id = CASE WHEN TG_OP = 'DELETE' THEN OLD.note_id ELSE NEW.note_id END;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tags_search_vector_tg() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE notes n
+        SET "searchVector" = notes_search_vector(n.id, n.title, n.content, n.summary)
+        FROM note_tags nt
+        WHERE nt.note_id = n.id AND nt.tag_id = NEW.id;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS notes_search_vector_biu ON notes",
+    """
+    CREATE TRIGGER notes_search_vector_biu
+    BEFORE INSERT OR UPDATE OF title, content, summary ON notes
+    FOR EACH ROW EXECUTE FUNCTION notes_search_vector_tg()
+    """,
+    "DROP TRIGGER IF EXISTS note_tags_search_vector_aid ON note_tags",
+    """
+    CREATE TRIGGER note_tags_search_vector_aid
+    AFTER INSERT OR DELETE ON note_tags
+    FOR EACH ROW EXECUTE FUNCTION note_tags_search_vector_tg()
+    """,
+    "DROP TRIGGER IF EXISTS tags_search_vector_au ON tags",
+    """
+    CREATE TRIGGER tags_search_vector_au
+    AFTER UPDATE OF name ON tags
+    FOR EACH ROW EXECUTE FUNCTION tags_search_vector_tg()
+    """,
+    'UPDATE notes SET "searchVector" = notes_search_vector(id, title, content, summary)',
+    'CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING gin ("searchVector")',
+]
+
+
+@migration(15, "notes_search_pg")
+def _notes_search_pg(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    for stmt in _NOTES_SEARCH_PG_V1:
+        conn.exec_driver_sql(stmt)
+
+
+@migration(16, "note_links_directed")
+def _note_links_directed(conn: Connection) -> None:
+    # 0003 telle que livrée créait tous les index du modèle Note : sur une base
+    # dont `notes` n'avait pas encore titleKey, SQLite a indexé la chaîne
+    # constante "titleKey" et 0012 a gardé cet index, aux entrées fausses
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_notes_user_title_key")
+    create_index(conn, "ix_notes_user_title_key", "notes", "user_id", "titleKey")
+    # Liens concept orientés (voisines retenues par chaque note) : tout le
+    # graphe est recalculé en tâche de fond
+    _enqueue_all_notes(conn, "links")
+
+
+###############################################################
+# RUNNER
+###############################################################
+def _ensure_version_table(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL)"
+    )
+
+
+def applied_versions(conn: Connection) -> set:
+    return {r[0] for r in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine = default_engine, target: Optional[int] = None) -> List[str]:
+    """
+    Applique les migrations manquantes, chacune dans sa transaction
+    (jusqu'à la version `target` incluse si précisée).
+    """
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+
+    applied = []
+    for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if target is not None and version > target:
+            break
+        try:
+            with engine.begin() as conn:
+                if version in applied_versions(conn):
+                    continue
+                fn(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()},
+                )
+        except IntegrityError:
+            # Bénin seulement si un autre worker vient d'enregistrer la même
+            # version ; sinon c'est la migration elle-même qui a échoué
+            with engine.connect() as conn:
+                if version in applied_versions(conn):
+                    continue
+            raise
+        applied.append(f"{version:04d}_{name}")
+        print(f"[migrations] appliquée : {version:04d}_{name}")
+    return applied
+
+
+def main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else "upgrade"
+    if cmd == "upgrade":
+        run_migrations()
+        return 0
+    if cmd == "status":
+        with default_engine.begin() as conn:
+            _ensure_version_table(conn)
+            done = applied_versions(conn)
+        for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+            print(f"{'✅' if version in done else '⏳'} {version:04d}_{name}")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,6 @@
 from sqlalchemy import (
-    Column, String, Text, Integer, Boolean, DateTime,
-    ForeignKey, CheckConstraint, Table
+    Column, String, Text, Integer, Boolean, DateTime, Float,
+    ForeignKey, CheckConstraint, Table, Index, JSON, UniqueConstraint, LargeBinary
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -53,6 +53,11 @@ class Project(Base):
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
     updatedAt = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    # 🔹 Réglages LLM de l'agent du projet (None = défauts globaux)
+    llmProvider = Column(String)
+    llmModel = Column(String)
+    llmTemperature = Column(Float)
+
     # 🔹 Relation : chaque projet appartient à un utilisateur
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     user = relationship("User", back_populates="projects")
@@ -60,6 +65,11 @@ class Project(Base):
     # 🔹 Relation : un projet peut avoir plusieurs notes
     notes = relationship("Note", secondary="project_notes", back_populates="projects")
 
+    # Liste paginée des projets d'un utilisateur (createdAt DESC, id DESC)
+    __table_args__ = (
+        Index("ix_projects_user_created", "user_id", "createdAt", "id"),
+    )
+
     def __repr__(self):
         return f"<Project(name={self.name}, user_id={self.user_id}, status={self.status})>"
 
@@ -80,6 +90,10 @@ class Area(Base):
     # 🔹 Relation N↔N avec les notes
     notes = relationship("Note", secondary="area_notes", back_populates="areas")
 
+    __table_args__ = (
+        Index("ix_areas_user_created", "user_id", "createdAt", "id"),
+    )
+
     def __repr__(self):
         return f"<Area(name={self.name}, user_id={self.user_id})>"
 
@@ -93,6 +107,11 @@ class Note(Base):
     content = Column(Text, nullable=False)
     summary = Column(Text)
     wordCount = Column(Integer)
+    # Champs dérivés du contenu (services/note_processing.py)
+    contentHash = Column(String(64))
+    autoSummary = Column(Boolean)
+    # Titre normalisé, cible des liens [[...]] (services/graph_services.py)
+    titleKey = Column(String)
     pinned = Column(Boolean, default=False, nullable=False)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
     updatedAt = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -110,6 +129,11 @@ class Note(Base):
     # 🔹 
     tags = relationship("Tag", secondary="note_tags", back_populates="notes")
 
+    __table_args__ = (
+        Index("ix_notes_user_created", "user_id", "createdAt", "id"),
+        Index("ix_notes_user_title_key", "user_id", "titleKey"),
+    )
+
     def __repr__(self):
         return f"<Note(title={self.title}, user_id={self.user_id}, pinned={self.pinned})>"
 
@@ -133,6 +157,8 @@ project_notes = Table(
     Column("project_id", String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
     Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
     Column("added_at", DateTime, default=datetime.utcnow, nullable=False),
+    # La PK (project_id, note_id) sert project → notes ; celui-ci sert note → projets
+    Index("ix_project_notes_note", "note_id", "project_id"),
 )
 
 area_notes = Table(
@@ -141,6 +167,7 @@ area_notes = Table(
     Column("area_id", String, ForeignKey("areas.id", ondelete="CASCADE"), primary_key=True),
     Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
     Column("added_at", DateTime, default=datetime.utcnow, nullable=False),
+    Index("ix_area_notes_note", "note_id", "area_id"),
 )
 
 note_tags = Table(
@@ -148,4 +175,233 @@ note_tags = Table(
     Base.metadata,
     Column("note_id", String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", String, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_note_tags_tag", "tag_id", "note_id"),
 )
+
+
+###############################################################
+# CONVERSATIONS (agent)
+###############################################################
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    # Clé fournie par conversation_services (ex. "<user>::proj::<project>")
+    id = Column(String, primary_key=True)
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    messages = relationship(
+        "ConversationMessage",
+        back_populates="conversation",
+        cascade="all, delete",
+        order_by="ConversationMessage.id",
+    )
+
+    def __repr__(self):
+        return f"<Conversation(id={self.id})>"
+
+
+class ConversationMessage(Base):
+    __tablename__ = "conversation_messages"
+
+    # Append-only : l'id croissant donne l'ordre et sert de curseur incrémental
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        Index("ix_conversation_messages_conv", "conversation_id", "id"),
+    )
+
+    def __repr__(self):
+        return f"<ConversationMessage(conversation_id={self.conversation_id}, role={self.role})>"
+
+
+###############################################################
+# RÉSULTATS DES AGENTS N8N (versionnés par projet)
+###############################################################
+class AgentResult(Base):
+    __tablename__ = "agent_results"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)  # todos, analysis, objectives, deadlines, advices
+    version = Column(Integer, nullable=False)  # 1, 2, ... par (projet, kind)
+    payload = Column(JSON, nullable=False)
+    receivedAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("project_id", "kind", "version", name="uq_agent_results_version"),
+        Index("ix_agent_results_kind_received", "kind", "receivedAt"),
+    )
+
+    def __repr__(self):
+        return f"<AgentResult(project_id={self.project_id}, kind={self.kind}, version={self.version})>"
+
+
+###############################################################
+# OUTBOX DES WEBHOOKS N8N
+###############################################################
+class N8nOutbox(Base):
+    __tablename__ = "n8n_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event = Column(String, nullable=False)
+    # Pas de FK : certains événements (ping) ne visent pas un vrai projet
+    project_id = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(
+        String,
+        CheckConstraint("status IN ('pending', 'sending', 'sent', 'dead')"),
+        default="pending",
+        nullable=False,
+    )
+    attempts = Column(Integer, default=0, nullable=False)
+    coalesced = Column(Integer, default=0, nullable=False)  # doublons absorbés
+    nextAttemptAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+    lastError = Column(Text)
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sentAt = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_n8n_outbox_due", "status", "nextAttemptAt"),
+        Index("ix_n8n_outbox_dedup", "project_id", "event", "createdAt"),
+    )
+
+    def __repr__(self):
+        return f"<N8nOutbox(id={self.id}, event={self.event}, status={self.status})>"
+
+
+###############################################################
+# SECTIONS DES NOTES (chunks) + EMBEDDINGS
+###############################################################
+class NoteChunk(Base):
+    __tablename__ = "note_chunks"
+
+    # Stable tant que le texte du chunk ne change pas (services/chunking.py)
+    id = Column(String(40), primary_key=True)
+    note_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    # Bornes dans Note.content : text == content[start:end]
+    start = Column(Integer, nullable=False)
+    end = Column(Integer, nullable=False)
+    heading = Column(String)  # chemin des titres, ex. "Budget > Salons"
+    text = Column(Text, nullable=False)
+    noteHash = Column(String(64))  # Note.contentHash au moment du découpage
+    # Empreinte du texte vectorisé (titre de la note + titres + texte)
+    embedHash = Column(String(64), nullable=False)
+    model = Column(String)  # embedder + dimension, ex. "hashing-512" ; NULL = à calculer
+    vector = Column(LargeBinary)  # float16, normalisé L2
+    embeddedAt = Column(DateTime)
+
+    __table_args__ = (
+        # Couvre le test de fraîcheur (chunks à jour de la version de la note)
+        Index("ix_note_chunks_note", "note_id", "noteHash"),
+        # Couvre la revalidation du cache (count / max(embeddedAt) par utilisateur)
+        Index("ix_note_chunks_user_model", "user_id", "model", "embeddedAt"),
+    )
+
+    def __repr__(self):
+        return f"<NoteChunk(id={self.id}, note_id={self.note_id}, position={self.position})>"
+
+
+###############################################################
+# JOURNAL DES MODIFICATIONS DE NOTES (index dérivés)
+###############################################################
+class NoteChange(Base):
+    __tablename__ = "note_changes"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    note_id = Column(String, nullable=False)  # pas de FK : les suppressions sont journalisées aussi
+    user_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # content, links, delete
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Réservation par un worker (bail expiré = ligne de nouveau disponible)
+    claimToken = Column(String)
+    claimedAt = Column(DateTime)
+    attempts = Column(Integer, default=0, nullable=False)
+    lastError = Column(Text)
+
+    __table_args__ = (
+        CheckConstraint("kind IN ('content', 'links', 'delete')"),
+        Index("ix_note_changes_claim", "claimedAt", "id"),
+        Index("ix_note_changes_token", "claimToken"),
+    )
+
+    def __repr__(self):
+        return f"<NoteChange(id={self.id}, note_id={self.note_id}, kind={self.kind})>"
+
+
+###############################################################
+# GRAPHE DE CONNAISSANCES (liens entre notes)
+###############################################################
+class NoteLink(Base):
+    __tablename__ = "note_links"
+
+    source_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    target_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    # wiki : [[lien]] explicite ; concept : tags / termes partagés, source →
+    # une de ses voisines les plus proches (services/graph_services.py)
+    kind = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    weight = Column(Float, default=1.0, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("kind IN ('wiki', 'concept')"),
+        # Rétroliens / parcours en sens inverse
+        Index("ix_note_links_target", "target_id", "kind", "source_id"),
+    )
+
+    def __repr__(self):
+        return f"<NoteLink({self.source_id} -> {self.target_id}, kind={self.kind})>"
+
+
+class NoteLinkRef(Base):
+    """Cibles [[...]] telles qu'écrites (titre normalisé), résolues ou non."""
+    __tablename__ = "note_link_refs"
+
+    source_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    target_key = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        # Résolution des liens entrants quand une note prend ce titre
+        Index("ix_note_link_refs_key", "user_id", "target_key", "source_id"),
+    )
+
+
+class NoteConcept(Base):
+    """Concepts d'une note : "tag:<id>" ou "term:<racine>"."""
+    __tablename__ = "note_concepts"
+
+    note_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    concept = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_note_concepts_user_concept", "user_id", "concept", "note_id"),
+    )
+
+
+###############################################################
+# COMPTEURS PAR UTILISATEUR (tableau de bord)
+###############################################################
+class UserCounter(Base):
+    """
+    Compteur maintenu dans la transaction de chaque écriture
+    (services/user_stats.py) : notes, pinned, words, areas, projects (ref_id =
+    statut), project_notes / area_notes / tag_notes (ref_id = id).
+    """
+    __tablename__ = "user_counters"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    counter = Column(String, primary_key=True)
+    ref_id = Column(String, primary_key=True, default="")
+    value = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<UserCounter(user_id={self.user_id}, {self.counter}[{self.ref_id}]={self.value})>"
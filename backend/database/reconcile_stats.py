@@ -0,0 +1,54 @@
+# backend/database/reconcile_stats.py
+"""
+Recalcule les compteurs du tableau de bord (user_counters) à partir des
+tables notes / projects / areas / liaisons, un utilisateur par transaction.
+
+Les compteurs sont maintenus à chaque écriture (services/user_stats.py) ;
+ce script corrige les écarts laissés par des écritures hors application
+(SQL direct, seed, restauration de sauvegarde). Il peut être relancé sans
+risque : seuls les utilisateurs en écart sont réécrits.
+
+Usage :
+    python -m database.reconcile_stats [--user <id>] [--dry-run]
+"""
+import argparse
+import time
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .models import User
+from services.user_stats import reconcile_user_stats
+
+
+def reconcile(user_ids=None, dry_run: bool = False) -> int:
+    if user_ids is None:
+        with SessionLocal() as db:
+            user_ids = db.scalars(select(User.id).order_by(User.id)).all()
+    drifted = 0
+    for user_id in user_ids:
+        with SessionLocal() as db:
+            drift = reconcile_user_stats(db, user_id, dry_run=dry_run)
+            db.commit()
+        if drift:
+            drifted += 1
+            print(f"[stats] {user_id} : {len(drift)} compteur(s) en écart")
+            for name, values in list(drift.items())[:10]:
+                print(f"   {name} : {values['stored']} → {values['actual']}")
+    return drifted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", action="append", help="limite à cet utilisateur (répétable)")
+    parser.add_argument("--dry-run", action="store_true", help="affiche les écarts sans corriger")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    drifted = reconcile(args.user, args.dry_run)
+    action = "détectés" if args.dry_run else "corrigés"
+    print(f"[stats] terminé : {drifted} utilisateur(s) en écart {action} en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from .database import SessionLocal, engine
 from .models import User, Project, Note, Area, Tag
 from sqlalchemy import text
+from services.user_stats import reconcile_user_stats
 
 TARGET_USER_ID = "87ffb41b-3efb-45b8-a411-2f714d074d67"
 
@@ -8,8 +9,9 @@ def reset_user_data():
     print("[reset_user] DB URL:", getattr(engine, "url", "unknown"))
     db = SessionLocal()
     try:
-        db.execute(text("PRAGMA foreign_keys = ON;"))
-        db.commit()
+        if engine.dialect.name == "sqlite":
+            db.execute(text("PRAGMA foreign_keys = ON;"))
+            db.commit()
 
         user = db.query(User).filter(User.id == TARGET_USER_ID).one_or_none()
         if not user:
@@ -38,6 +40,8 @@ def reset_user_data():
         db.execute(text("DELETE FROM notes WHERE user_id = :uid;"), {"uid": TARGET_USER_ID})
         db.execute(text("DELETE FROM projects WHERE user_id = :uid;"), {"uid": TARGET_USER_ID})
         db.execute(text("DELETE FROM areas WHERE user_id = :uid;"), {"uid": TARGET_USER_ID})
+        # Suppressions en SQL direct : compteurs du tableau de bord recalculés
+        reconcile_user_stats(db, TARGET_USER_ID)
 
         db.commit()
         print("✅ Données supprimées pour l'utilisateur spécifié (autres comptes intacts).")
@@ -0,0 +1,220 @@
+# backend/database/session.py
+"""
+Session async partagée par les routes (dépendance FastAPI `get_db`).
+
+Le moteur async pointe sur la même base que `database.engine` :
+    sqlite:///...            → sqlite+aiosqlite:///...
+    postgresql[+driver]://... → postgresql+asyncpg://...
+ASYNC_DATABASE_URL permet de forcer une autre URL (autre driver async).
+Le moteur sync reste utilisé par les migrations, les scripts et les services
+appelés en thread (conversations, import NDJSON...).
+
+ASYNC_SESSION_MODE choisit l'implémentation servie par get_db :
+    native   : AsyncSession SQLAlchemy sur le moteur async (défaut hors SQLite)
+    threaded : ThreadedSession, session sync dont chaque appel passe par le
+               threadpool (défaut SQLite)
+Avec aiosqlite, chaque requête SQL fait un aller-retour thread ↔ boucle : un
+COMMIT (INSERT + compteurs + file d'indexation) garde le verrou d'écriture
+SQLite pendant plusieurs tours de boucle et les autres écrivains attendent
+dans busy_timeout. ThreadedSession exécute get / flush + COMMIT / run_sync
+en un seul passage dans le threadpool, comme les anciennes routes sync
+(python -m database.bench_sessions compare les trois variantes).
+"""
+import asyncio
+import os
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Optional, Union
+
+import anyio
+from sqlalchemy.engine import CursorResult, Result, make_url
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from .database import SQLALCHEMY_DATABASE_URL, engine, engine_options, install_sqlite_profile
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    url_obj = make_url(url)
+    driver = _ASYNC_DRIVERS.get(url_obj.get_backend_name())
+    if driver is None:
+        raise ValueError(f"Pas de driver async connu pour {url_obj.get_backend_name()} : définir ASYNC_DATABASE_URL")
+    return url_obj.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+install_sqlite_profile(async_engine.sync_engine)
+
+ASYNC_SESSION_MODE = os.getenv(
+    "ASYNC_SESSION_MODE", "threaded" if engine.dialect.name == "sqlite" else "native"
+)
+if ASYNC_SESSION_MODE not in ("native", "threaded"):
+    raise ValueError(f"ASYNC_SESSION_MODE invalide : {ASYNC_SESSION_MODE} (native | threaded)")
+
+
+###############################################################
+# SESSION SYNC EXPOSÉE EN ASYNC
+###############################################################
+# Pool dédié : une session garde sa connexion entre deux await. Si les threads
+# du threadpool attendaient une connexion dans le pool (attente bloquante),
+# ils pourraient tous être occupés pendant que les détenteurs des connexions
+# attendent un thread pour terminer. L'attente se fait donc sur la boucle, via
+# un sémaphore de la taille du pool, avant la première requête de la session.
+_threaded_options = engine_options(SQLALCHEMY_DATABASE_URL)
+threaded_engine = create_engine(SQLALCHEMY_DATABASE_URL, **_threaded_options)
+install_sqlite_profile(threaded_engine)
+THREADED_SESSION_SLOTS = _threaded_options.get("pool_size", 1) + _threaded_options.get("max_overflow", 0)
+
+
+class _ConnectionSlots:
+    """Sémaphore recréé si la boucle asyncio change (un sémaphore est lié à sa boucle)."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def get(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self._size)
+        return self._semaphore
+
+
+_connection_slots = _ConnectionSlots(THREADED_SESSION_SLOTS)
+
+
+class ThreadedSession:
+    """
+    Sous-ensemble de l'API AsyncSession utilisé par les routes et services,
+    au-dessus d'une Session sync : chaque méthode awaitable s'exécute en un
+    seul passage dans le threadpool. Les résultats sont entièrement chargés
+    avant de revenir sur la boucle, comme avec AsyncSession.
+    """
+
+    def __init__(self, bind=threaded_engine):
+        self.sync_session: Session = Session(bind=bind, autoflush=False, expire_on_commit=False)
+        self._slot: Optional[asyncio.Semaphore] = None
+
+    async def _call(self, fn: Callable, *args, **kwargs):
+        if self._slot is None:
+            slot = _connection_slots.get()
+            await slot.acquire()
+            self._slot = slot
+        return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs))
+
+    # --- Lecture -------------------------------------------------------
+    async def get(self, entity, ident, **kwargs):
+        return await self._call(self.sync_session.get, entity, ident, **kwargs)
+
+    async def execute(self, statement, params=None, **kwargs) -> Result:
+        def run():
+            result = self.sync_session.execute(statement, params, **kwargs)
+            # UPDATE / DELETE : rien à charger, rowcount reste lisible
+            if isinstance(result, CursorResult) and not result.returns_rows:
+                return result
+            return result.freeze()
+        result = await self._call(run)
+        return result if isinstance(result, CursorResult) else result()
+
+    async def scalar(self, statement, params=None, **kwargs) -> Any:
+        return await self._call(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalars()
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await self._call(self.sync_session.refresh, instance, attribute_names)
+
+    async def run_sync(self, fn: Callable, *args, **kwargs):
+        return await self._call(fn, self.sync_session, *args, **kwargs)
+
+    # --- Écriture ------------------------------------------------------
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def delete(self, instance) -> None:
+        # Les cascades chargent les relations non chargées : SQL, donc threadpool
+        await self._call(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None) -> None:
+        await self._call(self.sync_session.flush, objects)
+
+    async def commit(self) -> None:
+        await self._call(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await self._call(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        if self._slot is None:
+            return  # aucune requête : pas de connexion à rendre
+        try:
+            # Sans transaction, ou sous SQLite (ROLLBACK local, sans E/S réseau),
+            # fermer sur la boucle évite un passage par le threadpool
+            if not self.sync_session.in_transaction() or self.get_bind().dialect.name == "sqlite":
+                self.sync_session.close()
+            else:
+                await anyio.to_thread.run_sync(self.sync_session.close)
+        finally:
+            self._slot.release()
+            self._slot = None
+
+    # --- État ----------------------------------------------------------
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    @property
+    def new(self):
+        return self.sync_session.new
+
+    @property
+    def dirty(self):
+        return self.sync_session.dirty
+
+    @property
+    def deleted(self):
+        return self.sync_session.deleted
+
+    def in_transaction(self) -> bool:
+        return self.sync_session.in_transaction()
+
+    def get_bind(self, *args, **kwargs):
+        return self.sync_session.get_bind(*args, **kwargs)
+
+    async def __aenter__(self) -> "ThreadedSession":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        # Même annulée, la requête rend sa connexion au pool
+        with anyio.CancelScope(shield=True):
+            await self.close()
+
+
+# expire_on_commit=False : les objets restent lisibles après commit sans
+# nouveau chargement (un lazy-load implicite est interdit en async).
+_native_sessions = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+def AsyncSessionLocal() -> Union[AsyncSession, ThreadedSession]:
+    """Fabrique de sessions selon ASYNC_SESSION_MODE (`async with AsyncSessionLocal() as db`)."""
+    if ASYNC_SESSION_MODE == "threaded":
+        return ThreadedSession()
+    return _native_sessions()
+
+
+async def get_db() -> AsyncIterator[Union[AsyncSession, ThreadedSession]]:
+    async with AsyncSessionLocal() as db:
+        yield db
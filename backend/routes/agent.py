@@ -1,11 +1,26 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
-from services.llm_services import get_llm_response
+import json
+from contextlib import aclosing
+from services.llm_services import (
+    aget_llm_response,
+    astream_llm_response,
+    LLMBusyError,
+)
+from services.llm_providers import get_provider, UnknownProviderError
+from services.llm_cache import response_cache_stats
+from services.agent_results import agent_result_cache_stats
+from services.embeddings import embedding_index_stats
+from services.context_window import build_context, summary_prompt
 from services.conversation_services import (
     get_or_create_conversation,
     get_conversation_history_with_project_context,
     add_message,
+    project_prompt_cache_stats,
+    get_project_llm_settings,
 )
 
 router = APIRouter(prefix="/api/agent", tags=["Agent"])
@@ -17,41 +32,157 @@ class ChatRequest(BaseModel):
     project_id: Optional[str] = None 
     project_context: Optional[dict] = None  
     message: str
+    max_context_tokens: Optional[int] = None  # budget de tokens (défaut AGENT_CONTEXT_TOKEN_BUDGET)
+    cache: Optional[bool] = None  # None = température 0 seulement, True = forcer, False = contourner
+    # Surcharge par requête ; sinon réglages du projet, puis défauts globaux
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    temperature: Optional[float] = None
 
 
-@router.post("/chat")
-def chat_with_agent(request: ChatRequest):
-    try:
-        conv_id = get_or_create_conversation(
+def _llm_settings(request: ChatRequest) -> dict:
+    """Requête > projet > défauts du fournisseur."""
+    project = get_project_llm_settings(request.project_id)
+    provider = request.provider or project.get("provider")
+    same_provider = provider == project.get("provider")
+    settings = {
+        "provider": provider,
+        "model": request.model or (project.get("model") if same_provider else None),
+        "temperature": request.temperature if request.temperature is not None else project.get("temperature"),
+    }
+    get_provider(settings["provider"])  # UnknownProviderError si invalide
+    return settings
+
+
+def _prepare_chat(request: ChatRequest):
+    """Conversation, historique (avec prompt projet) et réglages LLM."""
+    llm = _llm_settings(request)
+
+    conv_id = get_or_create_conversation(
+        user_id=request.user_id,
+        conversation_id=request.conversation_id,
+        project_id=request.project_id,  
+    )
+
+    history = get_conversation_history_with_project_context(conv_id, request.project_id, request.message)
+
+    if request.project_context:
+        ctx = request.project_context
+        project_info = (
+            f"Nom du projet : {ctx.get('name')}\n"
+            f"Description : {ctx.get('description')}\n"
+            f"Contexte : {ctx.get('context')}\n"
+            f"Priorité : {ctx.get('priority')}\n"
+            f"Statut : {ctx.get('status')}\n"
+        )
+        history.insert(1, {
+            "role": "system",
+            "content": f"Voici le contexte du projet sur lequel l'utilisateur travaille :\n{project_info}"
+        })
+    return conv_id, history, llm
+
+
+async def _chat_context(request: ChatRequest):
+    """Conversation, messages à envoyer (fenêtrés), stats de contexte et réglages LLM."""
+    conv_id, history, llm = await run_in_threadpool(_prepare_chat, request)
+
+    # Le résumé glissant passe par les mêmes créneaux (global + utilisateur),
+    # timeout et retries que la réponse elle-même
+    async def summarize(previous: str, turns: list) -> str:
+        return await aget_llm_response(
+            summary_prompt(previous, turns),
+            temperature=0,
             user_id=request.user_id,
-            conversation_id=request.conversation_id,
-            project_id=request.project_id,  
+            provider=llm["provider"],
+            model=llm["model"],
         )
 
-        history = get_conversation_history_with_project_context(conv_id, request.project_id)
+    messages, context_stats = await build_context(
+        conv_id,
+        history,
+        request.message,
+        budget=request.max_context_tokens,
+        summarize=summarize,
+    )
+    return conv_id, messages, context_stats, llm
 
-        if request.project_context:
-            ctx = request.project_context
-            project_info = (
-                f"Nom du projet : {ctx.get('name')}\n"
-                f"Description : {ctx.get('description')}\n"
-                f"Contexte : {ctx.get('context')}\n"
-                f"Priorité : {ctx.get('priority')}\n"
-                f"Statut : {ctx.get('status')}\n"
-            )
-            history.insert(1, {
-                "role": "system",
-                "content": f"Voici le contexte du projet sur lequel l'utilisateur travaille :\n{project_info}"
-            })
 
-        add_message(conv_id, "user", request.message)
+@router.post("/chat")
+async def chat_with_agent(request: ChatRequest):
+    try:
+        conv_id, messages, context_stats, llm = await _chat_context(request)
 
-        messages = history + [{"role": "user", "content": request.message}]
-        reply = get_llm_response(messages)
+        await run_in_threadpool(add_message, conv_id, "user", request.message)
 
-        add_message(conv_id, "assistant", reply)
+        reply = await aget_llm_response(messages, user_id=request.user_id, cache=request.cache, **llm)
 
-        return {"reply": reply, "conversation_id": conv_id}
+        await run_in_threadpool(add_message, conv_id, "assistant", reply)
 
+        return {"reply": reply, "conversation_id": conv_id, "context": context_stats}
+
+    except LLMBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except UnknownProviderError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_with_agent_stream(request: ChatRequest):
+    """
+    Même contrat que /chat mais en Server-Sent Events :
+    - event `meta`  : {conversation_id, context}
+    - data          : {"delta": "..."} pour chaque fragment
+    - event `done`  : {reply} une fois la réponse complète enregistrée
+    - event `error` : {detail} si le LLM échoue en cours de route
+    """
+    try:
+        conv_id, messages, context_stats, llm = await _chat_context(request)
+        await run_in_threadpool(add_message, conv_id, "user", request.message)
+    except UnknownProviderError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        yield _sse({"conversation_id": conv_id, "context": context_stats}, event="meta")
+        parts = []
+        # aclosing : si le client se déconnecte, le flux LLM est fermé tout de
+        # suite (connexion amont et créneau de concurrence rendus)
+        try:
+            async with aclosing(astream_llm_response(
+                messages, user_id=request.user_id, cache=request.cache, **llm
+            )) as stream:
+                async for delta in stream:
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+        except Exception as e:
+            yield _sse({"detail": str(e)}, event="error")
+            return
+
+        reply = "".join(parts).strip()
+        await run_in_threadpool(add_message, conv_id, "assistant", reply)
+        yield _sse({"reply": reply}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache/stats")
+def agent_cache_stats():
+    """Compteurs hit/miss des caches du chemin agent."""
+    return {
+        "project_prompt": project_prompt_cache_stats(),
+        "llm_response": response_cache_stats(),
+        "agent_results": agent_result_cache_stats(),
+        "embedding_index": embedding_index_stats(),
+    }
@@ -1,21 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database.database import SessionLocal
-from database.models import Area, User, Note
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.session import get_db
+from database.models import Area, User, Note, area_notes
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+from services.pagination import select_fields, keyset_page, paged_response
+from services.indexing import record_changes
+from services.user_stats import bump
 import uuid
 
 router = APIRouter(prefix="/areas", tags=["Areas"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class AreaCreate(BaseModel):
     user_id: str
     name: str
@@ -42,9 +39,33 @@ class AreaRead(BaseModel):
         orm_mode = True
 
 
+# Champs projetables par les listes (?fields=...)
+AREA_LIST_FIELDS = {
+    "id": Area.id,
+    "name": Area.name,
+    "description": Area.description,
+    "color": Area.color,
+    "user_id": Area.user_id,
+    "createdAt": Area.createdAt,
+    "updatedAt": Area.updatedAt,
+}
+AREA_READ_FIELDS = list(AREA_LIST_FIELDS)
+
+AREA_NOTE_FIELDS = {
+    "note_id": Note.id,
+    "title": Note.title,
+    "content": Note.content,
+    "summary": Note.summary,
+    "pinned": Note.pinned,
+    "createdAt": Note.createdAt,
+    "updatedAt": Note.updatedAt,
+}
+AREA_NOTE_DEFAULT_FIELDS = ["note_id", "title", "content", "createdAt"]
+
+
 @router.post("/", response_model=AreaRead, status_code=status.HTTP_201_CREATED)
-def create_area(payload: AreaCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == payload.user_id).first()
+async def create_area(payload: AreaCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, payload.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
@@ -59,32 +80,43 @@ def create_area(payload: AreaCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_area)
-    db.commit()
-    db.refresh(new_area)
+    await db.commit()
+    await db.refresh(new_area)
     return new_area
 
 
 @router.get("/user/{user_id}", response_model=List[AreaRead])
-def get_areas_by_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_areas_by_user(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    user = await db.scalar(select(User.id).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
-    areas = db.query(Area).filter(Area.user_id == user_id).order_by(Area.createdAt.desc()).all()
-    return areas
+    try:
+        cols = select_fields(fields, AREA_LIST_FIELDS, AREA_READ_FIELDS)
+        stmt = select(*[c.label(n) for n, c in cols.items()]).where(Area.user_id == user_id)
+        rows, next_cursor = await keyset_page(db, stmt, Area.createdAt, Area.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return paged_response(rows, cols, next_cursor)
 
 
 @router.get("/{area_id}", response_model=AreaRead)
-def get_area(area_id: str, db: Session = Depends(get_db)):
-    area = db.query(Area).filter(Area.id == area_id).first()
+async def get_area(area_id: str, db: AsyncSession = Depends(get_db)):
+    area = await db.get(Area, area_id)
     if not area:
         raise HTTPException(status_code=404, detail="Zone introuvable")
     return area
 
 
 @router.put("/{area_id}", response_model=AreaRead)
-def update_area(area_id: str, payload: AreaUpdate, db: Session = Depends(get_db)):
-    area = db.query(Area).filter(Area.id == area_id).first()
+async def update_area(area_id: str, payload: AreaUpdate, db: AsyncSession = Depends(get_db)):
+    area = await db.get(Area, area_id)
     if not area:
         raise HTTPException(status_code=404, detail="Zone introuvable")
 
@@ -92,26 +124,26 @@ def update_area(area_id: str, payload: AreaUpdate, db: Session = Depends(get_db)
         setattr(area, field, value)
 
     area.updatedAt = datetime.utcnow()
-    db.commit()
-    db.refresh(area)
+    await db.commit()
+    await db.refresh(area)
     return area
 
 
 @router.delete("/{area_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_area(area_id: str, db: Session = Depends(get_db)):
-    area = db.query(Area).filter(Area.id == area_id).first()
+async def delete_area(area_id: str, db: AsyncSession = Depends(get_db)):
+    area = await db.get(Area, area_id)
     if not area:
         raise HTTPException(status_code=404, detail="Zone introuvable")
 
-    db.delete(area)
-    db.commit()
+    await db.delete(area)
+    await db.commit()
     return {"message": "Zone supprimée"}
 
 
 @router.post("/{area_id}/notes/{note_id}")
-def attach_note_to_area(area_id: str, note_id: str, db: Session = Depends(get_db)):
-    area = db.query(Area).filter(Area.id == area_id).first()
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def attach_note_to_area(area_id: str, note_id: str, db: AsyncSession = Depends(get_db)):
+    area = await db.get(Area, area_id)
+    note = await db.get(Note, note_id)
 
     if not area:
         raise HTTPException(status_code=404, detail="Zone introuvable")
@@ -120,25 +152,39 @@ def attach_note_to_area(area_id: str, note_id: str, db: Session = Depends(get_db
     if area.user_id != note.user_id:
         raise HTTPException(status_code=403, detail="Zone et note n’appartiennent pas au même utilisateur")
 
-    if note not in area.notes:
-        area.notes.append(note)
-        db.commit()
+    linked = await db.scalar(
+        select(area_notes.c.note_id)
+        .where(area_notes.c.area_id == area_id, area_notes.c.note_id == note_id)
+    )
+    if not linked:
+        await db.execute(insert(area_notes).values(area_id=area_id, note_id=note_id))
+        bump(db, note.user_id, "area_notes", area_id)
+        record_changes(db, note.user_id, [note_id], "links")
+        await db.commit()
 
     return {"message": f"Note '{note.title}' liée à la zone '{area.name}'"}
 
 
 @router.get("/{area_id}/notes")
-def get_notes_in_area(area_id: str, db: Session = Depends(get_db)):
-    area = db.query(Area).filter(Area.id == area_id).first()
+async def get_notes_in_area(
+    area_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    area = await db.scalar(select(Area.id).where(Area.id == area_id))
     if not area:
         raise HTTPException(status_code=404, detail="Zone introuvable")
 
-    return [
-        {
-            "note_id": note.id,
-            "title": note.title,
-            "content": note.content,
-            "createdAt": note.createdAt,
-        }
-        for note in area.notes
-    ]
+    try:
+        cols = select_fields(fields, AREA_NOTE_FIELDS, AREA_NOTE_DEFAULT_FIELDS)
+        stmt = (
+            select(*[c.label(n) for n, c in cols.items()])
+            .join(area_notes, area_notes.c.note_id == Note.id)
+            .where(area_notes.c.area_id == area_id)
+        )
+        rows, next_cursor = await keyset_page(db, stmt, Note.createdAt, Note.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return paged_response(rows, cols, next_cursor)
@@ -1,28 +1,33 @@
 # backend/routes/note.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database.database import SessionLocal
-from database.models import Note, User, Project, Area, Tag
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from database.session import AsyncSessionLocal, get_db
+from database.models import Note, User, Project, Area, project_notes, area_notes
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-import services.n8n_notify
+from services.search_services import search_notes
+from services.embeddings import search_similar_notes
+from services.chunking import anchor_chunks, get_note_chunks
+from services.graph_services import LINK_KINDS, backlinks, concept_dependents, neighbors, subgraph
+from services.indexing import indexing_stats, pending_changes, record_changes, wait_until_indexed
+from services.note_processing import apply_content, derived_fields
+from services.pagination import select_fields, keyset_page, paged_response
+from services.conversation_services import invalidate_project_prompts
+from services.tag_services import resolve_tags
+from services.user_stats import bump
+from services.bulk_notes import (
+    IMPORT_BATCH_SIZE, IMPORT_MAX_LINE_BYTES, import_batch, export_notes, iter_ndjson_lines,
+)
 import uuid
 
 router = APIRouter(prefix="/notes", tags=["Notes"])
 
 
-###############################################################
-# DB SESSION
-###############################################################
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 ###############################################################
 # SCHEMAS (Pydantic)
 ###############################################################
@@ -52,6 +57,7 @@ class NoteRead(BaseModel):
     title: str
     content: str
     summary: Optional[str]
+    wordCount: Optional[int] = None
     pinned: bool
     user_id: str
     createdAt: datetime
@@ -60,9 +66,115 @@ class NoteRead(BaseModel):
     class Config:
         orm_mode = True
 
+
+class NoteChunkRef(BaseModel):
+    id: str
+    heading: Optional[str]
+    start: int
+    end: int
+
+    class Config:
+        orm_mode = True
+
+
+class NoteChunkRead(NoteChunkRef):
+    position: int
+    text: str
+
+
+class NoteSearchHit(BaseModel):
+    id: str
+    title: str
+    summary: Optional[str]
+    snippet: str
+    score: float
+    pinned: bool
+    createdAt: datetime
+    updatedAt: datetime
+    chunk: Optional[NoteChunkRef] = None  # section contenant le plus de termes recherchés
+
+
+class NoteSearchPage(BaseModel):
+    items: List[NoteSearchHit]
+    limit: int
+    offset: int
+    next_offset: Optional[int]
+
+
+class NoteSimilarHit(BaseModel):
+    id: str
+    title: str
+    summary: Optional[str]
+    score: float
+    chunk: NoteChunkRead  # passage le plus proche de la requête
+
+
+class NoteLinkHit(BaseModel):
+    id: str
+    title: str
+    summary: Optional[str]
+    updatedAt: datetime
+
+
+class NoteNeighbor(BaseModel):
+    id: str
+    title: str
+    summary: Optional[str]
+    kind: str       # "wiki" ou "concept"
+    direction: str  # "out", "in" (wiki) ou "both" (concept)
+    weight: float
+
+
+class NoteGraphNode(BaseModel):
+    id: str
+    title: str
+    depth: int
+
+
+class NoteGraphEdge(BaseModel):
+    source: str
+    target: str
+    kind: str
+    weight: float
+
+
+class NoteGraph(BaseModel):
+    nodes: List[NoteGraphNode]
+    edges: List[NoteGraphEdge]
+
+
+class NoteImportError(BaseModel):
+    line: int
+    error: str
+
+
+class NoteImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[NoteImportError]
+
+
+# Champs projetables par les listes (?fields=id,title,pinned,updatedAt)
+NOTE_LIST_FIELDS = {
+    "id": Note.id,
+    "title": Note.title,
+    "content": Note.content,
+    "summary": Note.summary,
+    "wordCount": Note.wordCount,
+    "pinned": Note.pinned,
+    "user_id": Note.user_id,
+    "createdAt": Note.createdAt,
+    "updatedAt": Note.updatedAt,
+}
+NOTE_READ_FIELDS = ["id", "title", "content", "summary", "wordCount", "pinned", "user_id", "createdAt", "updatedAt"]
+
+# Lectures des index dérivés : modifications journalisées pas encore indexées
+INDEX_PENDING_HEADER = "X-Index-Pending"
+
+
 @router.post("/", response_model=NoteRead, status_code=status.HTTP_201_CREATED)
-def create_note(payload: NoteCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == payload.user_id).first()
+async def create_note(payload: NoteCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, payload.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
@@ -71,115 +183,338 @@ def create_note(payload: NoteCreate, db: Session = Depends(get_db)):
         user_id=payload.user_id,
         title=payload.title,
         content=payload.content,
-        summary=payload.summary,
         pinned=payload.pinned or False,
         createdAt=datetime.utcnow(),
         updatedAt=datetime.utcnow(),
+        **derived_fields(payload.content, payload.summary),
     )
 
     if payload.project_ids:
-        projects = db.query(Project).filter(Project.id.in_(payload.project_ids)).all()
+        projects = (await db.scalars(select(Project).where(Project.id.in_(payload.project_ids)))).all()
         for p in projects:
             if p.user_id != payload.user_id:
                 raise HTTPException(status_code=403, detail="Projet n’appartient pas à l’utilisateur")
         new_note.projects = projects
 
     if payload.area_ids:
-        areas = db.query(Area).filter(Area.id.in_(payload.area_ids)).all()
+        areas = (await db.scalars(select(Area).where(Area.id.in_(payload.area_ids)))).all()
         for a in areas:
             if a.user_id != payload.user_id:
                 raise HTTPException(status_code=403, detail="Zone n’appartient pas à l’utilisateur")
         new_note.areas = areas
 
     if payload.tag_names:
-        tags = []
-        for name in payload.tag_names:
-            tag = db.query(Tag).filter(Tag.name == name).first()
-            if not tag:
-                tag = Tag(id=str(uuid.uuid4()), name=name)
-                db.add(tag)
-            tags.append(tag)
-        new_note.tags = tags
+        new_note.tags = await db.run_sync(resolve_tags, payload.tag_names)
 
     db.add(new_note)
-    db.commit()
-    db.refresh(new_note)
+    record_changes(db, payload.user_id, [new_note.id], "content")
+    await db.commit()
+    await db.refresh(new_note)
+    invalidate_project_prompts(payload.project_ids or [])
     return new_note
 
 
 @router.get("/user/{user_id}", response_model=List[NoteRead])
-def get_notes_by_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_notes_by_user(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Liste paginée par curseur : passer `limit`, puis renvoyer l'en-tête
+    `X-Next-Cursor` dans `cursor` pour la page suivante.
+    `fields` restreint les colonnes lues en SQL (ex. id,title,pinned,updatedAt).
+    """
+    user = await db.scalar(select(User.id).where(User.id == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+
+    try:
+        cols = select_fields(fields, NOTE_LIST_FIELDS, NOTE_READ_FIELDS)
+        stmt = select(*[c.label(n) for n, c in cols.items()]).where(Note.user_id == user_id)
+        rows, next_cursor = await keyset_page(db, stmt, Note.createdAt, Note.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return paged_response(rows, cols, next_cursor)
+
+
+@router.get("/search", response_model=NoteSearchPage)
+async def search_user_notes(
+    user_id: str,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Recherche plein texte (FTS5) dans titre, contenu, résumé et tags.
+    Ne renvoie que des extraits : jamais le contenu complet des notes.
+    """
+    rows = await db.run_sync(search_notes, user_id, q, limit=limit, offset=offset)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    anchors = await db.run_sync(anchor_chunks, [r["id"] for r in rows], q)
+    for r in rows:
+        r["chunk"] = anchors.get(r["id"])
+    return {
+        "items": rows,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None,
+    }
+
+
+@router.get("/similar", response_model=List[NoteSimilarHit])
+async def similar_user_notes(
+    user_id: str,
+    response: Response,
+    q: str = Query(..., min_length=1),
+    k: int = Query(10, ge=1, le=50),
+    project_id: Optional[str] = None,
+    wait: float = Query(0, ge=0, le=30),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Recherche sémantique : les `k` notes les plus proches de `q` (similarité
+    cosinus des embeddings de leurs chunks), éventuellement limitée aux notes
+    d'un projet. Chaque résultat porte son passage le plus proche.
+    Porte sur ce qui est déjà indexé : X-Index-Pending compte les
+    modifications de l'utilisateur pas encore vues ; `wait` (s) attend
+    l'indexation avant de chercher.
+    """
+    if wait:
+        await wait_until_indexed(wait)
+    response.headers[INDEX_PENDING_HEADER] = str(await db.run_sync(pending_changes, user_id))
+    return await db.run_sync(search_similar_notes, user_id, q, k=k, project_id=project_id)
+
+
+@router.post("/import/{user_id}", response_model=NoteImportResult)
+async def import_notes(
+    user_id: str,
+    request: Request,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+):
+    """
+    Import NDJSON (une note JSON par ligne, voir services/bulk_notes.py).
+    Le corps est lu en flux ; chaque lot de `batch_size` lignes est inséré
+    dans une seule transaction. Les lignes invalides (ou de plus de
+    IMPORT_MAX_LINE_BYTES octets) sont listées dans `errors` sans bloquer le
+    reste de l'import.
+    """
+    # Session courte : ne pas garder une connexion pendant toute la lecture du flux
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User.id).where(User.id == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+
+    imported, errors, touched = 0, [], set()
+
+    async def flush(batch):
+        nonlocal imported
+        count, batch_errors, projects = await run_in_threadpool(import_batch, user_id, batch)
+        imported += count
+        errors.extend(batch_errors)
+        touched.update(projects)
+
+    batch, buffer, line_no = [], b"", 0
+    async for chunk in request.stream():
+        lines, buffer = iter_ndjson_lines(buffer, chunk)
+        for raw in lines:
+            line_no += 1
+            if raw is None:
+                errors.append({"line": line_no, "error": f"Ligne trop longue (plus de {IMPORT_MAX_LINE_BYTES} octets)"})
+            elif raw.strip():
+                batch.append((line_no, raw))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if buffer and buffer.strip():
+        batch.append((line_no + 1, buffer))
+    if batch:
+        await flush(batch)
+
+    invalidate_project_prompts(touched)
+    errors.sort(key=lambda e: e["line"])
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+
+@router.get("/export/{user_id}")
+async def export_user_notes(user_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Export NDJSON en flux (une note par ligne, réimportable via /notes/import).
+    """
+    user = await db.scalar(select(User.id).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+    return StreamingResponse(
+        export_notes(user_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="notes-{user_id}.ndjson"'},
+    )
+
+
+@router.get("/indexing/status")
+async def get_indexing_status():
+    """Retard de l'indexation en tâche de fond (embeddings, champs dérivés)."""
+    return await run_in_threadpool(indexing_stats)
 
-    notes = db.query(Note).filter(Note.user_id == user_id).order_by(Note.createdAt.desc()).all()
-    return notes
+
+@router.post("/indexing/wait")
+async def wait_for_indexing(timeout: float = Query(10.0, gt=0, le=120)):
+    """Rend la main quand toutes les écritures déjà validées sont indexées (tests, scripts)."""
+    if not await wait_until_indexed(timeout):
+        raise HTTPException(status_code=504, detail="Indexation non terminée dans le délai imparti")
+    return await run_in_threadpool(indexing_stats)
 
 
 @router.get("/{note_id}", response_model=NoteRead)
-def get_note_by_id(note_id: str, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def get_note_by_id(note_id: str, db: AsyncSession = Depends(get_db)):
+    note = await db.get(Note, note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note introuvable")
     return note
 
 
+@router.get("/{note_id}/chunks", response_model=List[NoteChunkRead])
+async def get_note_chunks_by_id(
+    note_id: str,
+    response: Response,
+    wait: float = Query(0, ge=0, le=30),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Sections de la note (chunks) avec leurs bornes dans `content`, telles
+    qu'indexées. X-Index-Pending > 0 : une modification de la note n'est pas
+    encore indexée ; `wait` (s) attend l'indexation avant de répondre.
+    """
+    user_id = await db.scalar(select(Note.user_id).where(Note.id == note_id))
+    if not user_id:
+        raise HTTPException(status_code=404, detail="Note introuvable")
+    if wait:
+        await wait_until_indexed(wait)
+    response.headers[INDEX_PENDING_HEADER] = str(await db.run_sync(pending_changes, user_id, [note_id]))
+    return await db.run_sync(get_note_chunks, note_id)
+
+
+def _link_kinds(kinds: Optional[str]) -> List[str]:
+    if not kinds:
+        return list(LINK_KINDS)
+    wanted = [k.strip() for k in kinds.split(",") if k.strip()]
+    unknown = [k for k in wanted if k not in LINK_KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Type de lien inconnu : {', '.join(unknown)}")
+    return wanted
+
+
+@router.get("/{note_id}/backlinks", response_model=List[NoteLinkHit])
+async def get_note_backlinks(
+    note_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    """Notes contenant un lien [[Titre]] vers cette note."""
+    if not await db.scalar(select(Note.id).where(Note.id == note_id)):
+        raise HTTPException(status_code=404, detail="Note introuvable")
+    return await db.run_sync(backlinks, note_id, limit=limit)
+
+
+@router.get("/{note_id}/neighbors", response_model=List[NoteNeighbor])
+async def get_note_neighbors(
+    note_id: str,
+    kinds: Optional[str] = Query(None, description="wiki,concept"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    """Voisins directs dans le graphe : liens wiki (sortants et entrants) et notes liées par concept."""
+    link_kinds = _link_kinds(kinds)
+    if not await db.scalar(select(Note.id).where(Note.id == note_id)):
+        raise HTTPException(status_code=404, detail="Note introuvable")
+    return await db.run_sync(neighbors, note_id, link_kinds, limit=limit)
+
+
+@router.get("/{note_id}/graph", response_model=NoteGraph)
+async def get_note_graph(
+    note_id: str,
+    depth: int = Query(2, ge=1, le=4),
+    kinds: Optional[str] = Query(None, description="wiki,concept"),
+    limit: int = Query(200, ge=1, le=2000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Sous-graphe à `depth` sauts autour de la note (une seule requête récursive)."""
+    link_kinds = _link_kinds(kinds)
+    if not await db.scalar(select(Note.id).where(Note.id == note_id)):
+        raise HTTPException(status_code=404, detail="Note introuvable")
+    return await db.run_sync(subgraph, note_id, depth=depth, kinds=link_kinds, limit=limit)
+
+
 @router.put("/{note_id}", response_model=NoteRead)
-def update_note(note_id: str, payload: NoteUpdate, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def update_note(note_id: str, payload: NoteUpdate, db: AsyncSession = Depends(get_db)):
+    note = await db.scalar(
+        select(Note).where(Note.id == note_id)
+        .options(selectinload(Note.projects), selectinload(Note.areas), selectinload(Note.tags))
+    )
     if not note:
         raise HTTPException(status_code=404, detail="Note introuvable")
 
-    for field, value in payload.dict(exclude_unset=True).items():
-        if field not in ["project_ids", "area_ids", "tag_names"]:
+    touched_projects = {p.id for p in note.projects}
+
+    changes = payload.dict(exclude_unset=True)
+    for field, value in changes.items():
+        if field not in ["project_ids", "area_ids", "tag_names", "content", "summary"]:
             setattr(note, field, value)
+    # wordCount / résumé / empreinte : recalculés seulement si le contenu change
+    apply_content(note, changes.get("content"), changes.get("summary"), summary_set="summary" in changes)
 
     note.updatedAt = datetime.utcnow()
 
     if payload.project_ids is not None:
-        projects = db.query(Project).filter(Project.id.in_(payload.project_ids)).all()
+        projects = (await db.scalars(select(Project).where(Project.id.in_(payload.project_ids)))).all()
         for p in projects:
             if p.user_id != note.user_id:
                 raise HTTPException(status_code=403, detail="Projet n’appartient pas à l’utilisateur")
         note.projects = projects
 
     if payload.area_ids is not None:
-        areas = db.query(Area).filter(Area.id.in_(payload.area_ids)).all()
+        areas = (await db.scalars(select(Area).where(Area.id.in_(payload.area_ids)))).all()
         for a in areas:
             if a.user_id != note.user_id:
                 raise HTTPException(status_code=403, detail="Zone n’appartient pas à l’utilisateur")
         note.areas = areas
 
     if payload.tag_names is not None:
-        tags = []
-        for name in payload.tag_names:
-            tag = db.query(Tag).filter(Tag.name == name).first()
-            if not tag:
-                tag = Tag(id=str(uuid.uuid4()), name=name)
-                db.add(tag)
-            tags.append(tag)
-        note.tags = tags
-
-    db.commit()
-    db.refresh(note)
+        note.tags = await db.run_sync(resolve_tags, payload.tag_names)
+
+    touched_projects.update(p.id for p in note.projects)
+    link_fields = {"project_ids", "area_ids", "tag_names"}
+    record_changes(db, note.user_id, [note.id], "content" if changes.keys() - link_fields else "links")
+    await db.commit()
+    await db.refresh(note)
+    invalidate_project_prompts(touched_projects)
     return note
 
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_note(note_id: str, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def delete_note(note_id: str, db: AsyncSession = Depends(get_db)):
+    note = await db.scalar(select(Note).where(Note.id == note_id).options(selectinload(Note.projects)))
     if not note:
         raise HTTPException(status_code=404, detail="Note introuvable")
 
-    db.delete(note)
-    db.commit()
+    touched_projects = [p.id for p in note.projects]
+    # Notes partageant ses concepts : leurs voisines sont à recalculer
+    dependents = await db.run_sync(concept_dependents, note.user_id, [note.id])
+    await db.delete(note)
+    record_changes(db, note.user_id, [note.id], "delete")
+    record_changes(db, note.user_id, dependents, "links")
+    await db.commit()
+    invalidate_project_prompts(touched_projects)
     return {"message": "Note supprimée"}
 
 @router.post("/{note_id}/project/{project_id}")
-def attach_note_to_project(note_id: str, project_id: str, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def attach_note_to_project(note_id: str, project_id: str, db: AsyncSession = Depends(get_db)):
+    note = await db.get(Note, note_id)
+    project = await db.get(Project, project_id)
 
     if not note or not project:
         raise HTTPException(status_code=404, detail="Note ou projet introuvable")
@@ -187,15 +522,22 @@ def attach_note_to_project(note_id: str, project_id: str, db: Session = Depends(
     if note.user_id != project.user_id:
         raise HTTPException(status_code=403, detail="Les éléments n’appartiennent pas au même utilisateur")
 
-    if project not in note.projects:
-        note.projects.append(project)
-        db.commit()
+    linked = await db.scalar(
+        select(project_notes.c.note_id)
+        .where(project_notes.c.project_id == project_id, project_notes.c.note_id == note_id)
+    )
+    if not linked:
+        await db.execute(insert(project_notes).values(project_id=project_id, note_id=note_id))
+        bump(db, note.user_id, "project_notes", project_id)
+        record_changes(db, note.user_id, [note_id], "links")
+        await db.commit()
+        invalidate_project_prompts([project_id])
     return {"message": f"Note '{note.title}' liée au projet '{project.name}'"}
 
 @router.post("/{note_id}/area/{area_id}")
-def attach_note_to_area(note_id: str, area_id: str, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    area = db.query(Area).filter(Area.id == area_id).first()
+async def attach_note_to_area(note_id: str, area_id: str, db: AsyncSession = Depends(get_db)):
+    note = await db.get(Note, note_id)
+    area = await db.get(Area, area_id)
 
     if not note or not area:
         raise HTTPException(status_code=404, detail="Note ou zone introuvable")
@@ -203,7 +545,13 @@ def attach_note_to_area(note_id: str, area_id: str, db: Session = Depends(get_db
     if note.user_id != area.user_id:
         raise HTTPException(status_code=403, detail="Les éléments n’appartiennent pas au même utilisateur")
 
-    if area not in note.areas:
-        note.areas.append(area)
-        db.commit()
+    linked = await db.scalar(
+        select(area_notes.c.note_id)
+        .where(area_notes.c.area_id == area_id, area_notes.c.note_id == note_id)
+    )
+    if not linked:
+        await db.execute(insert(area_notes).values(area_id=area_id, note_id=note_id))
+        bump(db, note.user_id, "area_notes", area_id)
+        record_changes(db, note.user_id, [note_id], "links")
+        await db.commit()
     return {"message": f"Note '{note.title}' liée à la zone '{area.name}'"}
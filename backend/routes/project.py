@@ -1,28 +1,26 @@
 # backend/routes/project.py
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Body, Request
-from sqlalchemy.orm import Session
-from database.database import SessionLocal
-from database.models import Project, User, Note
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Body, Request
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.session import get_db
+from database.models import Project, User, Note, project_notes
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-from services.n8n_notify import notify_n8n
+from services.n8n_notify import enqueue_event, outbox_stats
+from services.pagination import select_fields, keyset_page, paged_response
+from services.conversation_services import invalidate_project_prompts
+from services.indexing import record_changes
+from services.user_stats import bump
+from services.llm_providers import PROVIDERS
+from services.agent_results import (
+    AGENT_KINDS, extract_payload, store_result, latest_result, result_history, invalidate_project_results,
+)
 import uuid
 
 router = APIRouter(prefix="/projects", tags=["Projects"])
 
 
-###############################################################
-# DB Session
-###############################################################
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 ###############################################################
 # SCHEMAS (Pydantic)
 ###############################################################
@@ -34,6 +32,9 @@ class ProjectCreate(BaseModel):
     color: Optional[str] = None
     priority: Optional[int] = 0
     plannedEndDate: Optional[datetime] = None
+    llmProvider: Optional[str] = None
+    llmModel: Optional[str] = None
+    llmTemperature: Optional[float] = None
 
 
 class ProjectRead(BaseModel):
@@ -47,6 +48,9 @@ class ProjectRead(BaseModel):
     user_id: str
     createdAt: datetime
     updatedAt: datetime
+    llmProvider: Optional[str] = None
+    llmModel: Optional[str] = None
+    llmTemperature: Optional[float] = None
 
     class Config:
         orm_mode = True
@@ -61,6 +65,39 @@ class ProjectUpdate(BaseModel):
     status: Optional[str] = None
     plannedEndDate: Optional[datetime] = None
     endDate: Optional[datetime] = None
+    llmProvider: Optional[str] = None
+    llmModel: Optional[str] = None
+    llmTemperature: Optional[float] = None
+
+
+# Champs projetables par les listes (?fields=...)
+PROJECT_LIST_FIELDS = {
+    "id": Project.id,
+    "name": Project.name,
+    "description": Project.description,
+    "context": Project.context,
+    "color": Project.color,
+    "priority": Project.priority,
+    "status": Project.status,
+    "user_id": Project.user_id,
+    "createdAt": Project.createdAt,
+    "updatedAt": Project.updatedAt,
+    "llmProvider": Project.llmProvider,
+    "llmModel": Project.llmModel,
+    "llmTemperature": Project.llmTemperature,
+}
+PROJECT_READ_FIELDS = list(PROJECT_LIST_FIELDS)
+
+PROJECT_NOTE_FIELDS = {
+    "note_id": Note.id,
+    "title": Note.title,
+    "content": Note.content,
+    "summary": Note.summary,
+    "pinned": Note.pinned,
+    "createdAt": Note.createdAt,
+    "updatedAt": Note.updatedAt,
+}
+PROJECT_NOTE_DEFAULT_FIELDS = ["note_id", "title", "content", "createdAt"]
 
 
 # --- Nouveau : payload optionnel depuis le bouton (pour le futur) ---
@@ -70,16 +107,22 @@ class AgentTrigger(BaseModel):
     dry_run: Optional[bool] = None      # idem
 
 
+def _check_llm_provider(name: Optional[str]) -> None:
+    if name and name not in PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"Fournisseur LLM inconnu : {name}")
+
+
 ###############################################################
 # ROUTES PROJETS
 ###############################################################
 
 # Créer un projet (❌ plus de notify ici)
 @router.post("/", response_model=ProjectRead, status_code=status.HTTP_201_CREATED)
-def create_project(payload: ProjectCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == payload.user_id).first()
+async def create_project(payload: ProjectCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, payload.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+    _check_llm_provider(payload.llmProvider)
 
     new_project = Project(
         id=str(uuid.uuid4()),
@@ -91,67 +134,85 @@ def create_project(payload: ProjectCreate, db: Session = Depends(get_db)):
         priority=payload.priority or 0,
         plannedEndDate=payload.plannedEndDate,
         status="ACTIVE",
+        llmProvider=payload.llmProvider,
+        llmModel=payload.llmModel,
+        llmTemperature=payload.llmTemperature,
     )
     db.add(new_project)
-    db.commit()
-    db.refresh(new_project)
+    await db.commit()
+    await db.refresh(new_project)
     return new_project
 
 
 @router.get("/user/{user_id}", response_model=List[ProjectRead])
-def get_projects_by_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_projects_by_user(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    user = await db.scalar(select(User.id).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
-    projects = (
-        db.query(Project)
-        .filter(Project.user_id == user_id)
-        .order_by(Project.createdAt.desc())
-        .all()
-    )
-    return projects
+    try:
+        cols = select_fields(fields, PROJECT_LIST_FIELDS, PROJECT_READ_FIELDS)
+        stmt = select(*[c.label(n) for n, c in cols.items()]).where(Project.user_id == user_id)
+        rows, next_cursor = await keyset_page(db, stmt, Project.createdAt, Project.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return paged_response(rows, cols, next_cursor)
 
 
 # Obtenir un projet
 @router.get("/{project_id}", response_model=ProjectRead)
-def get_project(project_id: str, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def get_project(project_id: str, db: AsyncSession = Depends(get_db)):
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
     return project
 
 
 @router.post("/_test-n8n")
-def test_n8n(background: BackgroundTasks):
+async def test_n8n(db: AsyncSession = Depends(get_db)):
     print("[TEST] /_test-n8n hit")
-    notify_n8n(event="ping", project_id="demo")
-    return {"ok": True}
+    outbox_id, coalesced = await enqueue_event(db, event="ping", project_id="demo")
+    return {"ok": True, "outbox_id": outbox_id, "coalesced": coalesced}
+
+
+@router.get("/_n8n/outbox")
+async def n8n_outbox_status(db: AsyncSession = Depends(get_db)):
+    return await outbox_stats(db)
 
 
 # Mettre à jour un projet (❌ plus de notify ici)
 @router.put("/{project_id}", response_model=ProjectRead)
-def update_project(project_id: str, payload: ProjectUpdate, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def update_project(project_id: str, payload: ProjectUpdate, db: AsyncSession = Depends(get_db)):
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
+    _check_llm_provider(payload.llmProvider)
 
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(project, field, value)
 
     project.updatedAt = datetime.utcnow()
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
+    invalidate_project_prompts([project_id])
     return project
 
 
 @router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_project(project_id: str, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def delete_project(project_id: str, db: AsyncSession = Depends(get_db)):
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
-    db.delete(project)
-    db.commit()
+    await db.delete(project)
+    await db.commit()
+    invalidate_project_prompts([project_id])
+    invalidate_project_results(project_id)
     return {"message": "Projet supprimé"}
 
 
@@ -161,9 +222,9 @@ def delete_project(project_id: str, db: Session = Depends(get_db)):
 
 # Lier une note à un projet (❌ plus de notify ici)
 @router.post("/{project_id}/notes/{note_id}")
-def attach_note_to_project(project_id: str, note_id: str, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def attach_note_to_project(project_id: str, note_id: str, db: AsyncSession = Depends(get_db)):
+    project = await db.get(Project, project_id)
+    note = await db.get(Note, note_id)
 
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
@@ -172,227 +233,127 @@ def attach_note_to_project(project_id: str, note_id: str, db: Session = Depends(
     if note.user_id != project.user_id:
         raise HTTPException(status_code=403, detail="Note et projet n’appartiennent pas au même utilisateur")
 
-    if note not in project.notes:
-        project.notes.append(note)
-        db.commit()
+    linked = await db.scalar(
+        select(project_notes.c.note_id)
+        .where(project_notes.c.project_id == project_id, project_notes.c.note_id == note_id)
+    )
+    if not linked:
+        await db.execute(insert(project_notes).values(project_id=project_id, note_id=note_id))
+        bump(db, note.user_id, "project_notes", project_id)
+        record_changes(db, note.user_id, [note_id], "links")
+        await db.commit()
+        invalidate_project_prompts([project_id])
     return {"message": f"Note '{note.title}' liée au projet '{project.name}'"}
 
 
 # Récupérer les notes du projet
 @router.get("/{project_id}/notes")
-def get_project_notes(project_id: str, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def get_project_notes(
+    project_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    project = await db.scalar(select(Project.id).where(Project.id == project_id))
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
 
-    return [
-        {
-            "note_id": note.id,
-            "title": note.title,
-            "content": note.content,
-            "createdAt": note.createdAt,
-        }
-        for note in project.notes
-    ]
+    try:
+        cols = select_fields(fields, PROJECT_NOTE_FIELDS, PROJECT_NOTE_DEFAULT_FIELDS)
+        stmt = (
+            select(*[c.label(n) for n, c in cols.items()])
+            .join(project_notes, project_notes.c.note_id == Note.id)
+            .where(project_notes.c.project_id == project_id)
+        )
+        rows, next_cursor = await keyset_page(db, stmt, Note.createdAt, Note.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return paged_response(rows, cols, next_cursor)
 
 
 ###############################################################
 # 🔔 Nouveau : bouton → déclencheur N8N
 ###############################################################
 @router.post("/{project_id}/trigger", status_code=202)
-def trigger_project_workflow(
+async def trigger_project_workflow(
     project_id: str,
     trigger: AgentTrigger = Body(default=AgentTrigger()),
-    background: BackgroundTasks = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Projet introuvable")
-
-    background.add_task(notify_n8n, event="project_button_pressed", project_id=project_id)
-    return {"ok": True, "queued": True, "project_id": project_id}
-
-
-###############################################################
-# RÉCEPTION DE LA TODO ENVOYÉE PAR N8N
-###############################################################
-last_agent_todo = None
-
-@router.post("/{project_id}/agent/todos/latest", status_code=status.HTTP_200_OK)
-async def receive_agent_todo(project_id: str, request: Request, db: Session = Depends(get_db)):
-    """
-    🔹 Reçoit depuis N8N la To-Do générée par l'agent Analyste.
-    """
-    global last_agent_todo
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Projet introuvable")
-
-    payload = await request.json()
-    last_agent_todo = {
-        "project_id": project_id,
-        "todos": payload.get("todos", payload),  # accepte {"todos": [...]} ou le JSON brut
-        "receivedAt": datetime.utcnow().isoformat()
-    }
-    print(f"📥 To-Do reçue pour le projet {project_id} :", last_agent_todo)
-    return {"ok": True, "stored": True, "project_id": project_id}
-
-
-@router.get("/agent/todos/latest", status_code=status.HTTP_200_OK)
-def get_last_agent_todo():
-    """
-    🔹 Permet de consulter la dernière To-Do reçue (tous projets confondus).
-    """
-    if not last_agent_todo:
-        raise HTTPException(status_code=404, detail="Aucune To-Do reçue de N8N pour le moment.")
-    return last_agent_todo
-
-###############################################################
-# RÉCEPTION DE L'ANALYSE ENVOYÉE PAR N8N
-###############################################################
-last_agent_analysis = None
-
-@router.post("/{project_id}/agent/analysis/latest", status_code=status.HTTP_200_OK)
-async def receive_agent_analysis(project_id: str, request: Request, db: Session = Depends(get_db)):
-    """
-    🔹 Reçoit depuis N8N l'analyse générée par l'agent Analyste.
-    """
-    global last_agent_analysis
-
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.scalar(select(Project.id).where(Project.id == project_id))
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
 
-    payload = await request.json()
-
-    last_agent_analysis = {
-        "project_id": project_id,
-        "analyse": payload.get("analyse", payload),  # accepte {"analysis": {...}} ou JSON brut
-        "receivedAt": datetime.utcnow().isoformat()
-    }
-
-    print(f"📥 Analyse reçue pour le projet {project_id} :", last_agent_analysis)
-    return {"ok": True, "stored": True, "project_id": project_id}
-
-
-@router.get("/agent/analysis/latest", status_code=status.HTTP_200_OK)
-def get_last_agent_analysis():
-    """
-    🔹 Permet de consulter la dernière analyse reçue (tous projets confondus).
-    """
-    if not last_agent_analysis:
-        raise HTTPException(status_code=404, detail="Aucune analyse reçue de N8N pour le moment.")
-    return last_agent_analysis
+    # Appuis répétés dans N8N_COALESCE_WINDOW → un seul webhook
+    outbox_id, coalesced = await enqueue_event(db, event="project_button_pressed", project_id=project_id)
+    return {"ok": True, "queued": True, "project_id": project_id, "outbox_id": outbox_id, "coalesced": coalesced}
 
 
 ###############################################################
-# RÉCEPTION DES OBJECTIFS ENVOYÉS PAR N8N
+# RÉSULTATS DES AGENTS N8N (todos, analysis, objectives, deadlines, advices)
 ###############################################################
-last_agent_objectives = None
+def _check_agent_kind(kind: str) -> None:
+    if kind not in AGENT_KINDS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Type de résultat inconnu : {kind} (attendu : {', '.join(AGENT_KINDS)})",
+        )
 
-@router.post("/{project_id}/agent/objectives/latest", status_code=status.HTTP_200_OK)
-async def receive_agent_objectives(project_id: str, request: Request, db: Session = Depends(get_db)):
-    """
-    🔹 Reçoit depuis N8N les objectifs générés par l'agent Objectives.
-    """
-    global last_agent_objectives
-
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Projet introuvable")
-
-    payload = await request.json()
 
-    last_agent_objectives = {
-        "project_id": project_id,
-        "objectives": payload.get("objectives", payload),
-        "receivedAt": datetime.utcnow().isoformat()
-    }
-
-    print(f"📥 Objectifs reçus pour le projet {project_id} :", last_agent_objectives)
-    return {"ok": True, "stored": True, "project_id": project_id}
-
-
-@router.get("/agent/objectives/latest", status_code=status.HTTP_200_OK)
-def get_last_agent_objectives():
+@router.post("/{project_id}/agent/{kind}/latest", status_code=status.HTTP_200_OK)
+async def receive_agent_result(project_id: str, kind: str, request: Request, db: AsyncSession = Depends(get_db)):
     """
-    🔹 Permet de consulter les derniers objectifs reçus (tous projets confondus).
+    🔹 Reçoit depuis N8N le résultat d'un agent et l'enregistre comme nouvelle
+    version pour ce projet. Accepte {"<clé>": ...} ou le JSON brut.
     """
-    if not last_agent_objectives:
-        raise HTTPException(status_code=404, detail="Aucun objectif reçu de N8N pour le moment.")
-    return last_agent_objectives
-
-###############################################################
-# RÉCEPTION DES DEADLINES ENVOYÉES PAR N8N
-###############################################################
-last_agent_deadlines = None
-
-@router.post("/{project_id}/agent/todos/latest", status_code=status.HTTP_200_OK)
-async def receive_agent_todos(project_id: str, request: Request, db: Session = Depends(get_db)):
-    """
-    🔹 Reçoit depuis N8N la To-Do list générée par l’agent Deadline.
-    """
-    global last_agent_deadlines
-
-    project = db.query(Project).filter(Project.id == project_id).first()
+    _check_agent_kind(kind)
+    project = await db.scalar(select(Project.id).where(Project.id == project_id))
     if not project:
         raise HTTPException(status_code=404, detail="Projet introuvable")
 
-    payload = await request.json()
-
-    last_agent_deadlines = {
-        "project_id": project_id,
-        "todos": payload.get("todos", payload),
-        "receivedAt": datetime.utcnow().isoformat()
-    }
+    payload = extract_payload(kind, await request.json())
+    stored = await store_result(db, project_id, kind, payload)
+    print(f"📥 Résultat '{kind}' v{stored['version']} reçu pour le projet {project_id}")
+    return {"ok": True, "stored": True, "project_id": project_id, "kind": kind, "version": stored["version"]}
 
-    print(f"📥 Deadlines reçues pour le projet {project_id} :", last_agent_deadlines)
-    return {"ok": True, "stored": True, "project_id": project_id}
 
-
-@router.get("/agent/todos/latest", status_code=status.HTTP_200_OK)
-def get_last_agent_todos():
+@router.get("/{project_id}/agent/{kind}/latest", status_code=status.HTTP_200_OK)
+async def get_project_agent_result(project_id: str, kind: str, db: AsyncSession = Depends(get_db)):
     """
-    🔹 Permet de consulter la dernière To-Do reçue (tous projets confondus).
+    🔹 Dernière version reçue pour ce projet.
     """
-    if not last_agent_deadlines:
-        raise HTTPException(status_code=404, detail="Aucune To-Do reçue pour le moment.")
-    return last_agent_deadlines
+    _check_agent_kind(kind)
+    result = await latest_result(db, project_id, kind)
+    if not result:
+        raise HTTPException(status_code=404, detail="Aucun résultat reçu de N8N pour ce projet.")
+    return result
 
-###############################################################
-# RÉCEPTION DES CONSEILS ENVOYÉS PAR N8N
-###############################################################
-last_agent_advices = None
 
-@router.post("/{project_id}/agent/advices/latest", status_code=status.HTTP_200_OK)
-async def receive_agent_advices(project_id: str, request: Request, db: Session = Depends(get_db)):
+@router.get("/{project_id}/agent/{kind}/history", status_code=status.HTTP_200_OK)
+async def get_project_agent_history(
+    project_id: str,
+    kind: str,
+    limit: int = Query(20, ge=1, le=100),
+    before_version: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    🔹 Reçoit depuis N8N les conseils générés par l'agent Advices.
+    🔹 Historique des versions (la plus récente d'abord) ; passer la plus
+    petite version reçue dans `before_version` pour la page suivante.
     """
-    global last_agent_advices
-
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Projet introuvable")
-
-    payload = await request.json()
-
-    last_agent_advices = {
-        "project_id": project_id,
-        "advices": payload.get("advices", payload),
-        "receivedAt": datetime.utcnow().isoformat()
-    }
-
-    print(f"📥 Conseils reçus pour le projet {project_id} :", last_agent_advices)
-    return {"ok": True, "stored": True, "project_id": project_id}
+    _check_agent_kind(kind)
+    return await result_history(db, project_id, kind, limit=limit, before_version=before_version)
 
 
-@router.get("/agent/advices/latest", status_code=status.HTTP_200_OK)
-def get_last_agent_advices():
+@router.get("/agent/{kind}/latest", status_code=status.HTTP_200_OK)
+async def get_last_agent_result(kind: str, db: AsyncSession = Depends(get_db)):
     """
-    🔹 Permet de consulter les derniers conseils reçus (tous projets confondus).
+    🔹 Dernier résultat reçu tous projets confondus (compatibilité avec les
+    anciennes routes /projects/agent/<kind>/latest).
     """
-    if not last_agent_advices:
-        raise HTTPException(status_code=404, detail="Aucun conseil reçu pour le moment.")
-    return last_agent_advices
+    _check_agent_kind(kind)
+    result = await latest_result(db, None, kind)
+    if not result:
+        raise HTTPException(status_code=404, detail="Aucun résultat reçu de N8N pour le moment.")
+    return result
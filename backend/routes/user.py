@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
-from database.database import SessionLocal
+from database.session import get_db
 from database.models import User
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
+from services.user_stats import reconcile_user_stats, user_stats
 from datetime import datetime
 import uuid
 
@@ -12,14 +15,6 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 class UserCreate(BaseModel):
     name: str
     email: EmailStr
@@ -45,16 +40,43 @@ class UserUpdate(BaseModel):
     avatarUrl: Optional[str] = None
     password: Optional[str] = None
 
+class ProjectNoteCount(BaseModel):
+    id: str
+    name: str
+    status: str
+    notes: int
+
+class NoteCount(BaseModel):
+    id: str
+    name: str
+    notes: int
+
+class UserStats(BaseModel):
+    notes: int
+    pinned: int
+    words: int
+    areas: int
+    projects: int
+    projects_by_status: Dict[str, int]
+    active_projects: int
+    completed_projects: int
+    notes_by_project: List[ProjectNoteCount]
+    notes_by_area: List[NoteCount]
+    notes_by_tag: List[NoteCount]
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
+# Le hachage (sha256_crypt, ~500k tours) est coûteux en CPU : toujours
+# l'appeler via run_in_threadpool depuis une route async.
+
 
 @router.post("/", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def create_user(payload: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == payload.email).first()
+async def create_user(payload: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = await db.scalar(select(User.id).where(User.email == payload.email))
     if existing:
         raise HTTPException(status_code=400, detail="Email déjà utilisé")
 
@@ -63,38 +85,58 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db)):
         name=payload.name,
         email=payload.email,
         avatarUrl=payload.avatarUrl,
-        passwordHash=hash_password(payload.password),
+        passwordHash=await run_in_threadpool(hash_password, payload.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post("/login")
-def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.passwordHash):
+async def login_user(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == credentials.email))
+    if not user or not await run_in_threadpool(verify_password, credentials.password, user.passwordHash):
         raise HTTPException(status_code=401, detail="Identifiants invalides")
     return {"message": "Connexion réussie ✅", "user_id": user.id, "name": user.name}
 
 
 @router.get("/", response_model=List[UserRead])
-def get_all_users(db: Session = Depends(get_db)):
-    return db.query(User).all()
+async def get_all_users(db: AsyncSession = Depends(get_db)):
+    return (await db.scalars(select(User))).all()
 
 
 @router.get("/{user_id}", response_model=UserRead)
-def get_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: str, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
     return user
 
 
+@router.get("/{user_id}/stats", response_model=UserStats)
+async def get_user_stats(user_id: str, db: AsyncSession = Depends(get_db)):
+    """Compteurs du tableau de bord (tenus à jour à chaque écriture, aucun parcours des notes)."""
+    user = await db.scalar(select(User.id).where(User.id == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+    return await db.run_sync(user_stats, user_id)
+
+
+@router.post("/{user_id}/stats/reconcile")
+async def reconcile_stats(user_id: str, dry_run: bool = False, db: AsyncSession = Depends(get_db)):
+    """Recalcule les compteurs à partir des tables ; retourne les écarts trouvés."""
+    user = await db.scalar(select(User.id).where(User.id == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+    drift = await db.run_sync(reconcile_user_stats, user_id, dry_run)
+    await db.commit()
+    return {"user_id": user_id, "fixed": not dry_run and bool(drift), "drift": drift}
+
+
 @router.put("/{user_id}", response_model=UserRead)
-def update_user(user_id: str, payload: UserUpdate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def update_user(user_id: str, payload: UserUpdate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
@@ -103,19 +145,19 @@ def update_user(user_id: str, payload: UserUpdate, db: Session = Depends(get_db)
     if payload.avatarUrl:
         user.avatarUrl = payload.avatarUrl
     if payload.password:
-        user.passwordHash = hash_password(payload.password)
+        user.passwordHash = await run_in_threadpool(hash_password, payload.password)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def delete_user(user_id: str, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
     return {"message": "Utilisateur supprimé"}
@@ -0,0 +1,125 @@
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import TTLCache
+
+from database.models import AgentResult
+
+###############################################################
+# RÉSULTATS DES AGENTS N8N
+###############################################################
+# Chaque POST n8n crée une nouvelle version (1, 2, ...) pour (projet, kind).
+# La dernière version est servie depuis un cache process invalidé à chaque
+# écriture ; le TTL (AGENT_RESULT_CACHE_TTL) couvre les écritures reçues par
+# un autre worker.
+
+# kind → clé du payload n8n (et de la réponse, pour compatibilité avec le front)
+AGENT_KINDS = {
+    "todos": "todos",
+    "analysis": "analyse",
+    "objectives": "objectives",
+    "deadlines": "todos",
+    "advices": "advices",
+}
+
+_latest_cache = TTLCache(
+    maxsize=int(os.getenv("AGENT_RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("AGENT_RESULT_CACHE_TTL", "60")),
+)
+
+# Clé de cache du dernier résultat tous projets confondus
+_ANY_PROJECT = "*"
+
+
+def agent_result_cache_stats() -> dict:
+    return _latest_cache.stats()
+
+
+def invalidate_project_results(project_id: str) -> None:
+    """À appeler après suppression d'un projet (ses résultats partent en cascade)."""
+    _latest_cache.invalidate(*[(project_id, k) for k in AGENT_KINDS], *[(_ANY_PROJECT, k) for k in AGENT_KINDS])
+
+
+def serialize(result: AgentResult) -> dict:
+    return {
+        "project_id": result.project_id,
+        "kind": result.kind,
+        "version": result.version,
+        AGENT_KINDS[result.kind]: result.payload,
+        "receivedAt": result.receivedAt.isoformat(),
+    }
+
+
+def extract_payload(kind: str, body) -> object:
+    """Accepte {"<clé>": ...} ou le JSON brut, comme les anciens récepteurs."""
+    if isinstance(body, dict):
+        return body.get(AGENT_KINDS[kind], body)
+    return body
+
+
+async def store_result(db: AsyncSession, project_id: str, kind: str, payload) -> dict:
+    """Enregistre une nouvelle version ; réessaie si un autre worker a pris le même numéro."""
+    for attempt in range(3):
+        version = await db.scalar(
+            select(func.coalesce(func.max(AgentResult.version), 0))
+            .where(AgentResult.project_id == project_id, AgentResult.kind == kind)
+        )
+        result = AgentResult(
+            project_id=project_id,
+            kind=kind,
+            version=version + 1,
+            payload=payload,
+            receivedAt=datetime.utcnow(),
+        )
+        db.add(result)
+        try:
+            await db.commit()
+            break
+        except IntegrityError:
+            await db.rollback()
+            if attempt == 2:
+                raise
+
+    _latest_cache.invalidate((project_id, kind), (_ANY_PROJECT, kind))
+    return serialize(result)
+
+
+async def latest_result(db: AsyncSession, project_id: Optional[str], kind: str) -> Optional[dict]:
+    """Dernière version pour un projet (ou tous projets si project_id=None)."""
+    key = (project_id or _ANY_PROJECT, kind)
+    cached = _latest_cache.get(key)
+    if cached is not None:
+        return cached
+
+    stmt = select(AgentResult).where(AgentResult.kind == kind)
+    if project_id:
+        stmt = stmt.where(AgentResult.project_id == project_id).order_by(AgentResult.version.desc())
+    else:
+        stmt = stmt.order_by(AgentResult.receivedAt.desc(), AgentResult.id.desc())
+    result = await db.scalar(stmt.limit(1))
+    if result is None:
+        return None
+
+    data = serialize(result)
+    _latest_cache.set(key, data)
+    return data
+
+
+async def result_history(
+    db: AsyncSession,
+    project_id: str,
+    kind: str,
+    limit: int = 20,
+    before_version: Optional[int] = None,
+) -> List[dict]:
+    """Versions décroissantes ; `before_version` pagine vers les plus anciennes."""
+    stmt = select(AgentResult).where(AgentResult.project_id == project_id, AgentResult.kind == kind)
+    if before_version is not None:
+        stmt = stmt.where(AgentResult.version < before_version)
+    rows = await db.scalars(stmt.order_by(AgentResult.version.desc()).limit(limit))
+    return [serialize(r) for r in rows]
@@ -0,0 +1,255 @@
+import json
+import os
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .indexing import change_rows, mark_pending
+from .note_processing import derived_fields
+from .tag_services import resolve_tag_ids
+from .user_stats import note_deltas, record_deltas
+
+from database.database import SessionLocal
+from database.models import Note, NoteChange, Project, Area, Tag, project_notes, area_notes, note_tags
+
+###############################################################
+# IMPORT / EXPORT NDJSON DES NOTES
+###############################################################
+# Une ligne = un objet JSON :
+# {"title", "content", "summary"?, "autoSummary"?, "pinned"?, "createdAt"?,
+#  "updatedAt"?, "project_ids"?, "area_ids"?, "tag_names"?}
+# L'export produit le même format (plus "id" et "wordCount"), il peut donc être
+# réimporté tel quel. Avec "autoSummary": true, le résumé est regénéré.
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 500
+# Au-delà, la ligne est rejetée sans être gardée en mémoire jusqu'à sa fin
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(4 * 1024 * 1024)))
+
+
+def _parse_dt(value, field: str) -> Optional[datetime]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f"{field} invalide : {value}")
+
+
+def _str_list(value, field: str) -> List[str]:
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{field} doit être une liste de chaînes")
+    return list(dict.fromkeys(value))
+
+
+def _bool(data: dict, field: str) -> bool:
+    value = data.get(field, False)
+    # Pas de bool("false") == True : seuls les booléens JSON sont acceptés
+    if not isinstance(value, bool):
+        raise ValueError(f"Champ '{field}' invalide : booléen attendu")
+    return value
+
+
+def parse_line(raw: bytes) -> dict:
+    """Valide une ligne NDJSON ; lève ValueError avec un message lisible."""
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"JSON invalide : {e}")
+    if not isinstance(data, dict):
+        raise ValueError("Chaque ligne doit être un objet JSON")
+    for field in ("title", "content"):
+        if not isinstance(data.get(field), str):
+            raise ValueError(f"Champ '{field}' manquant ou invalide")
+    return {
+        "title": data["title"],
+        "content": data["content"],
+        "summary": None if _bool(data, "autoSummary") else data.get("summary"),
+        "pinned": _bool(data, "pinned"),
+        "createdAt": _parse_dt(data.get("createdAt"), "createdAt"),
+        "updatedAt": _parse_dt(data.get("updatedAt"), "updatedAt"),
+        "project_ids": _str_list(data.get("project_ids"), "project_ids"),
+        "area_ids": _str_list(data.get("area_ids"), "area_ids"),
+        "tag_names": _str_list(data.get("tag_names"), "tag_names"),
+    }
+
+
+def import_batch(user_id: str, lines: List[Tuple[int, bytes]]) -> Tuple[int, List[dict], Set[str]]:
+    """
+    Importe un lot de lignes dans une seule transaction.
+    Retourne (nb importées, erreurs [{line, error}], projets touchés).
+    """
+    errors: List[dict] = []
+    records: List[Tuple[int, dict]] = []
+    for line_no, raw in lines:
+        try:
+            records.append((line_no, parse_line(raw)))
+        except ValueError as e:
+            errors.append({"line": line_no, "error": str(e)})
+    if not records:
+        return 0, errors, set()
+
+    db = SessionLocal()
+    try:
+        wanted_projects = {pid for _, r in records for pid in r["project_ids"]}
+        wanted_areas = {aid for _, r in records for aid in r["area_ids"]}
+        owned_projects = {
+            pid for (pid,) in db.query(Project.id)
+            .filter(Project.id.in_(wanted_projects), Project.user_id == user_id)
+        } if wanted_projects else set()
+        owned_areas = {
+            aid for (aid,) in db.query(Area.id)
+            .filter(Area.id.in_(wanted_areas), Area.user_id == user_id)
+        } if wanted_areas else set()
+
+        valid: List[Tuple[int, dict]] = []
+        for line_no, r in records:
+            bad_p = [p for p in r["project_ids"] if p not in owned_projects]
+            bad_a = [a for a in r["area_ids"] if a not in owned_areas]
+            if bad_p or bad_a:
+                errors.append({
+                    "line": line_no,
+                    "error": "Projet/zone introuvable ou n’appartient pas à l’utilisateur : "
+                             + ", ".join(bad_p + bad_a),
+                })
+                continue
+            valid.append((line_no, r))
+        if not valid:
+            return 0, errors, set()
+
+        tag_ids = resolve_tag_ids(db, (t for _, r in valid for t in r["tag_names"]))
+
+        now = datetime.utcnow()
+        note_rows, pn_rows, an_rows, nt_rows = [], [], [], []
+        for _, r in valid:
+            note_id = str(uuid.uuid4())
+            created = r["createdAt"] or now
+            note_rows.append({
+                "id": note_id,
+                "user_id": user_id,
+                "title": r["title"],
+                "content": r["content"],
+                "pinned": r["pinned"],
+                "createdAt": created,
+                "updatedAt": r["updatedAt"] or created,
+                **derived_fields(r["content"], r["summary"]),
+            })
+            pn_rows += [{"project_id": p, "note_id": note_id, "added_at": now} for p in r["project_ids"]]
+            an_rows += [{"area_id": a, "note_id": note_id, "added_at": now} for a in r["area_ids"]]
+            nt_rows += [{"note_id": note_id, "tag_id": tag_ids[t]} for t in r["tag_names"]]
+
+        db.execute(insert(Note.__table__), note_rows)
+        if pn_rows:
+            db.execute(insert(project_notes), pn_rows)
+        if an_rows:
+            db.execute(insert(area_notes), an_rows)
+        if nt_rows:
+            db.execute(insert(note_tags), nt_rows)
+        # INSERT directs : invisibles pour le suivi ORM des compteurs
+        deltas = Counter()
+        for n in note_rows:
+            deltas.update(note_deltas(n["pinned"], n["wordCount"]))
+        deltas.update(("project_notes", p["project_id"]) for p in pn_rows)
+        deltas.update(("area_notes", a["area_id"]) for a in an_rows)
+        deltas.update(("tag_notes", t["tag_id"]) for t in nt_rows)
+        record_deltas(db, user_id, deltas)
+        # Embeddings calculés en tâche de fond (services/indexing.py)
+        db.execute(insert(NoteChange), change_rows(user_id, [n["id"] for n in note_rows], "content"))
+        mark_pending(db)
+        db.commit()
+        return len(note_rows), errors, {p["project_id"] for p in pn_rows}
+    except SQLAlchemyError as e:
+        db.rollback()
+        errors += [{"line": line_no, "error": f"Erreur base de données : {e.__class__.__name__}"} for line_no, _ in records
+                   if not any(err["line"] == line_no for err in errors)]
+        return 0, errors, set()
+    finally:
+        db.close()
+
+
+def _links(db: Session, note_ids: List[str]):
+    projects, areas, tags = defaultdict(list), defaultdict(list), defaultdict(list)
+    for note_id, pid in db.query(project_notes.c.note_id, project_notes.c.project_id).filter(
+        project_notes.c.note_id.in_(note_ids)
+    ):
+        projects[note_id].append(pid)
+    for note_id, aid in db.query(area_notes.c.note_id, area_notes.c.area_id).filter(
+        area_notes.c.note_id.in_(note_ids)
+    ):
+        areas[note_id].append(aid)
+    for note_id, name in db.query(note_tags.c.note_id, Tag.name).join(Tag, Tag.id == note_tags.c.tag_id).filter(
+        note_tags.c.note_id.in_(note_ids)
+    ):
+        tags[note_id].append(name)
+    return projects, areas, tags
+
+
+def export_notes(user_id: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Génère les notes de l'utilisateur en NDJSON, par paquets de `chunk_size`
+    (pagination keyset sur (createdAt, id)) : la mémoire reste bornée.
+    """
+    db = SessionLocal()
+    try:
+        cursor = None
+        while True:
+            q = db.query(
+                Note.id, Note.title, Note.content, Note.summary, Note.autoSummary, Note.pinned,
+                Note.wordCount, Note.createdAt, Note.updatedAt,
+            ).filter(Note.user_id == user_id)
+            if cursor:
+                q = q.filter(tuple_(Note.createdAt, Note.id) > tuple_(*cursor))
+            rows = q.order_by(Note.createdAt, Note.id).limit(chunk_size).all()
+            if not rows:
+                break
+
+            projects, areas, tags = _links(db, [r.id for r in rows])
+            for r in rows:
+                yield json.dumps({
+                    "id": r.id,
+                    "title": r.title,
+                    "content": r.content,
+                    "summary": r.summary,
+                    "autoSummary": bool(r.autoSummary),
+                    "pinned": r.pinned,
+                    "wordCount": r.wordCount,
+                    "createdAt": r.createdAt.isoformat(),
+                    "updatedAt": r.updatedAt.isoformat(),
+                    "project_ids": projects.get(r.id, []),
+                    "area_ids": areas.get(r.id, []),
+                    "tag_names": tags.get(r.id, []),
+                }, ensure_ascii=False) + "\n"
+
+            cursor = (rows[-1].createdAt, rows[-1].id)
+            # Libère les objets du paquet précédent
+            db.expire_all()
+    finally:
+        db.close()
+
+
+def iter_ndjson_lines(
+    buffer: Optional[bytes], chunk: bytes, max_bytes: Optional[int] = None,
+) -> Tuple[List[Optional[bytes]], Optional[bytes]]:
+    """
+    Découpe le flux en lignes complètes ; renvoie (lignes, reste).
+    Une ligne plus longue que max_bytes est renvoyée comme None ; tant que
+    sa fin n'est pas arrivée, le reste vaut None et le flux est ignoré.
+    """
+    max_bytes = IMPORT_MAX_LINE_BYTES if max_bytes is None else max_bytes
+    if buffer is None:
+        end = chunk.find(b"\n")
+        if end < 0:
+            return [], None
+        buffer, chunk = b"", chunk[end + 1:]
+    *complete, rest = (buffer + chunk).split(b"\n")
+    lines = [line if len(line) <= max_bytes else None for line in complete]
+    if len(rest) > max_bytes:
+        return lines + [None], None
+    return lines, rest
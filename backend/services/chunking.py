@@ -0,0 +1,325 @@
+import hashlib
+import os
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, exists, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .note_processing import apply_content, content_hash
+
+from database.models import Note, NoteChunk
+
+###############################################################
+# DÉCOUPAGE DES NOTES EN SECTIONS (chunks)
+###############################################################
+# Une note est découpée selon ses titres markdown puis ses paragraphes
+# (les blocs de code ``` restent entiers) : chaque section est remplie de
+# paragraphes consécutifs jusqu'à CHUNK_MAX_CHARS, un paragraphe plus long est
+# coupé en fin de phrase. Un chunk ne chevauche jamais deux sections : une
+# modification ne touche que les chunks de sa section.
+#
+# Identifiant = empreinte (note, texte du chunk) : un chunk inchangé garde son
+# id et son vecteur, seules ses bornes (start/end) et sa position sont mises
+# à jour. Le découpage est refait hors requête (services/indexing.py), ou
+# avant une recherche pour les notes encore dans le journal note_changes.
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1200"))
+CHUNK_BATCH_SIZE = int(os.getenv("CHUNK_BATCH_SIZE", "200"))
+# Texte vectorisé tronqué (limite de contexte des modèles distants)
+EMBED_MAX_CHARS = int(os.getenv("EMBED_MAX_CHARS", "8000"))
+
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)[\s#]*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_BREAK_RE = re.compile(r"[.!?…](?=\s)")
+
+
+@dataclass
+class Chunk:
+    id: str
+    position: int
+    start: int
+    end: int
+    heading: Optional[str]
+    text: str
+
+
+def _blocks(content: str) -> List[Tuple[int, int, int, str]]:
+    """[(start, end, niveau, titre)] : niveau 0 = paragraphe ou bloc de code."""
+    blocks = []
+    current = None  # [start, end] du paragraphe en cours
+    fence = None
+    pos = 0
+    for line in content.splitlines(keepends=True):
+        start, pos = pos, pos + len(line)
+        end = start + len(line.rstrip())
+        if fence:
+            if line.strip():
+                current[1] = end
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+        if not line.strip():
+            if current:
+                blocks.append((current[0], current[1], 0, ""))
+                current = None
+            continue
+        heading = _HEADING_RE.match(line)
+        if heading:
+            if current:
+                blocks.append((current[0], current[1], 0, ""))
+                current = None
+            blocks.append((start, end, len(heading.group(1)), heading.group(2).strip()))
+            continue
+        fence_open = _FENCE_RE.match(line)
+        if fence_open:
+            fence = fence_open.group(1)
+        if current is None:
+            current = [start, end]
+        else:
+            current[1] = end
+    if current:
+        blocks.append((current[0], current[1], 0, ""))
+    return blocks
+
+
+def _split_long(content: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Coupe [start, end) en morceaux de max_chars au plus, en fin de phrase ou de mot."""
+    pieces = []
+    while end - start > max_chars:
+        window = content[start:start + max_chars]
+        cut = 0
+        for m in _BREAK_RE.finditer(window):
+            cut = m.end()
+        if cut < max_chars // 2:
+            cut = window.rfind(" ")
+        if cut < max_chars // 2:
+            cut = max_chars
+        pieces.append((start, start + len(window[:cut].rstrip())))
+        start += cut
+        while start < end and content[start].isspace():
+            start += 1
+    if start < end:
+        pieces.append((start, end))
+    return pieces
+
+
+def chunk_id(note_id: str, text: str, occurrence: int = 0) -> str:
+    digest = hashlib.sha1(f"{note_id}\0{text}".encode("utf-8")).hexdigest()[:32]
+    return f"{digest}-{occurrence}" if occurrence else digest
+
+
+def split_chunks(note_id: str, content: str, max_chars: int = CHUNK_MAX_CHARS) -> List[Chunk]:
+    """Chunks d'une note, dans l'ordre ; au moins un (éventuellement vide)."""
+    spans: List[Tuple[int, int, Optional[str]]] = []
+    path: List[Tuple[int, str]] = []
+    heading = None
+    start = end = None
+    has_body = False
+
+    def flush():
+        if start is not None and has_body:
+            spans.append((start, end, heading))
+
+    for b_start, b_end, level, title in _blocks(content):
+        if level:
+            flush()
+            path = [p for p in path if p[0] < level] + [(level, title)]
+            heading = " > ".join(t for _, t in path)
+            # Le titre fait partie du premier chunk de sa section
+            start, end, has_body = b_start, b_end, False
+            continue
+        if start is not None and has_body and b_end - start > max_chars:
+            flush()
+            start, has_body = None, False
+        if start is None:
+            start = b_start
+        if b_end - start > max_chars:
+            pieces = _split_long(content, b_start, b_end, max_chars)
+            pieces[0] = (start, pieces[0][1])
+            spans.extend((p_start, p_end, heading) for p_start, p_end in pieces[:-1])
+            # Le dernier morceau peut encore accueillir les paragraphes suivants
+            (start, end), has_body = pieces[-1], True
+            continue
+        end, has_body = b_end, True
+    flush()
+
+    if not spans:
+        # Note vide ou réduite à des titres : un seul chunk, le texte entier
+        stripped = content.strip()
+        offset = content.find(stripped) if stripped else 0
+        spans = [(offset, offset + len(stripped), heading)]
+
+    seen = Counter()
+    chunks = []
+    for position, (c_start, c_end, c_heading) in enumerate(spans):
+        text = content[c_start:c_end]
+        chunks.append(Chunk(chunk_id(note_id, text, seen[text]), position, c_start, c_end, c_heading, text))
+        seen[text] += 1
+    return chunks
+
+
+def embed_text(title: str, heading: Optional[str], text: str) -> str:
+    """Texte vectorisé : le titre de la note et le chemin des titres donnent le contexte."""
+    return "\n".join(part for part in (title, heading, text) if part)[:EMBED_MAX_CHARS]
+
+
+def embed_hash(title: str, heading: Optional[str], text: str) -> str:
+    return content_hash(embed_text(title, heading, text))
+
+
+###############################################################
+# SYNCHRONISATION DE note_chunks
+###############################################################
+def _existing_chunks(db: Session, note_ids: List[str]) -> Dict[str, dict]:
+    """note_id → {chunk_id: ligne} des chunks stockés."""
+    existing: Dict[str, dict] = {note_id: {} for note_id in note_ids}
+    rows = db.execute(
+        select(NoteChunk.id, NoteChunk.note_id, NoteChunk.position, NoteChunk.start, NoteChunk.end,
+               NoteChunk.embedHash, NoteChunk.noteHash)
+        .where(NoteChunk.note_id.in_(note_ids))
+    )
+    for r in rows:
+        existing[r.note_id][r.id] = r
+    return existing
+
+
+class _ChunkWrites:
+    """Écritures de note_chunks accumulées pour un lot de notes (un executemany par type)."""
+
+    def __init__(self):
+        self.inserts, self.moves, self.rehash, self.removed = [], [], [], []
+
+    def diff(self, note, existing: dict) -> None:
+        chunks = split_chunks(note.id, note.content)
+        wanted = {c.id for c in chunks}
+        self.removed += [cid for cid in existing if cid not in wanted]
+        for c in chunks:
+            e_hash = embed_hash(note.title, c.heading, c.text)
+            old = existing.get(c.id)
+            if old is None:
+                self.inserts.append({
+                    "id": c.id, "note_id": note.id, "user_id": note.user_id, "position": c.position,
+                    "start": c.start, "end": c.end, "heading": c.heading, "text": c.text,
+                    "noteHash": note.contentHash, "embedHash": e_hash,
+                })
+            elif old.embedHash != e_hash:
+                self.rehash.append({"b_id": c.id, "position": c.position, "start": c.start, "end": c.end,
+                                    "heading": c.heading, "noteHash": note.contentHash, "embedHash": e_hash})
+            elif (old.position, old.start, old.end, old.noteHash) != (c.position, c.start, c.end, note.contentHash):
+                self.moves.append({"b_id": c.id, "position": c.position, "start": c.start, "end": c.end,
+                                   "noteHash": note.contentHash})
+
+    def execute(self, db: Session) -> None:
+        table = NoteChunk.__table__
+        if self.removed:
+            db.execute(delete(table).where(table.c.id.in_(self.removed)))
+        if self.inserts:
+            db.execute(insert(table), self.inserts)
+        if self.moves:
+            db.execute(
+                update(table).where(table.c.id == bindparam("b_id"))
+                .values(position=bindparam("position"), start=bindparam("start"), end=bindparam("end"),
+                        noteHash=bindparam("noteHash")),
+                self.moves,
+            )
+        if self.rehash:
+            # Titre de la note ou de la section modifié : vecteur à recalculer
+            db.execute(
+                update(table).where(table.c.id == bindparam("b_id"))
+                .values(position=bindparam("position"), start=bindparam("start"), end=bindparam("end"),
+                        heading=bindparam("heading"), noteHash=bindparam("noteHash"),
+                        embedHash=bindparam("embedHash"), model=None, vector=None, embeddedAt=None),
+                self.rehash,
+            )
+
+
+def sync_note_chunks(db: Session, note) -> Tuple[int, int]:
+    """
+    Aligne les chunks stockés d'une note (id, user_id, title, content,
+    contentHash) sur son contenu. Seuls les chunks nouveaux ou modifiés perdent
+    leur vecteur. Retourne (ajoutés, supprimés) ; ne valide pas la transaction.
+    """
+    writes = _ChunkWrites()
+    writes.diff(note, _existing_chunks(db, [note.id])[note.id])
+    writes.execute(db)
+    return len(writes.inserts), len(writes.removed)
+
+
+def refresh_chunks(db: Session, user_id: str, note_ids: Optional[Iterable[str]] = None, force: bool = False) -> int:
+    """
+    Redécoupe les notes de l'utilisateur (toutes, ou `note_ids`) dont les
+    chunks manquent ou datent d'une autre version du contenu ; `force`
+    redécoupe sans condition (titre modifié). Retourne le nombre de notes
+    traitées ; ne valide pas la transaction.
+    """
+    stmt = select(Note.id).where(Note.user_id == user_id)
+    if note_ids is not None:
+        stmt = stmt.where(Note.id.in_(list(note_ids)))
+    if not force:
+        fresh = exists().where(NoteChunk.note_id == Note.id, NoteChunk.noteHash == Note.contentHash)
+        stmt = stmt.where(or_(Note.contentHash.is_(None), ~fresh))
+    stale = db.scalars(stmt).all()
+
+    for start in range(0, len(stale), CHUNK_BATCH_SIZE):
+        batch = stale[start:start + CHUNK_BATCH_SIZE]
+        try:
+            # Point de sauvegarde : un conflit n'annule que ce lot, pas le
+            # travail déjà fait dans la transaction de l'appelant
+            with db.begin_nested():
+                existing = _existing_chunks(db, batch)
+                writes = _ChunkWrites()
+                for note in db.scalars(select(Note).where(Note.id.in_(batch))):
+                    if note.contentHash is None:
+                        apply_content(note)  # note antérieure aux champs dérivés
+                    writes.diff(note, existing[note.id])
+                writes.execute(db)
+        except IntegrityError:
+            # Un autre worker a découpé ces notes en même temps : son résultat suffit
+            pass
+    return len(stale)
+
+
+def delete_note_chunks(db: Session, note_ids: Iterable[str]) -> None:
+    # Sans PRAGMA foreign_keys (SQLITE_TUNING=0), pas de suppression en cascade
+    db.execute(delete(NoteChunk).where(NoteChunk.note_id.in_(list(note_ids))))
+
+
+###############################################################
+# LECTURE
+###############################################################
+def get_note_chunks(db: Session, note_id: str) -> List[NoteChunk]:
+    """Chunks déjà indexés de la note (lecture seule : l'indexation les met à jour)."""
+    return db.scalars(select(NoteChunk).where(NoteChunk.note_id == note_id).order_by(NoteChunk.position)).all()
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def anchor_chunks(db: Session, note_ids: List[str], q: str) -> Dict[str, dict]:
+    """
+    Pour des résultats de recherche plein texte : note_id → chunk contenant le
+    plus d'occurrences des termes de `q` ({id, heading, start, end}). Les notes
+    dont seul le titre ou les tags correspondent sont absentes.
+    """
+    terms = re.findall(r"\w+", _fold(q))
+    if not note_ids or not terms:
+        return {}
+    best: Dict[str, Tuple[int, dict]] = {}
+    rows = db.execute(
+        select(NoteChunk.id, NoteChunk.note_id, NoteChunk.heading, NoteChunk.start, NoteChunk.end, NoteChunk.text)
+        .where(NoteChunk.note_id.in_(note_ids))
+        .order_by(NoteChunk.note_id, NoteChunk.position)
+    )
+    for r in rows:
+        folded = _fold(r.text)
+        score = sum(folded.count(t) for t in terms)
+        if score and score > best.get(r.note_id, (0, None))[0]:
+            best[r.note_id] = (score, {"id": r.id, "heading": r.heading, "start": r.start, "end": r.end})
+    return {note_id: anchor for note_id, (_, anchor) in best.items()}
@@ -0,0 +1,150 @@
+import os
+import zlib
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .static_assets import accepted_encodings
+
+try:  # optionnel : sans le paquet `brotli`, seul gzip est proposé
+    import brotli
+except ImportError:
+    brotli = None
+
+###############################################################
+# COMPRESSION DES RÉPONSES (brotli / gzip)
+###############################################################
+# Middleware ASGI : compresse les réponses d'au moins COMPRESSION_MIN_SIZE
+# octets selon Accept-Encoding (br si disponible, sinon gzip). Les réponses
+# déjà encodées (frontend précompressé), partielles ou en flux SSE passent
+# telles quelles ; les flux (export NDJSON) sont compressés morceau par morceau.
+#
+# COMPRESSION_MIN_SIZE : seuil en octets
+# GZIP_LEVEL           : niveau gzip (1-9) ; 1 par défaut, comme nginx : à la
+#                        volée, les niveaux hauts coûtent cher pour peu de gain
+# BROTLI_QUALITY       : qualité brotli (0-11) ; 4-5 = bon compromis à la volée
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "1"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Au-delà, la compression part dans un thread pour ne pas bloquer la boucle
+_THREAD_MIN_SIZE = 128 * 1024
+
+_EXCLUDED_TYPES = ("text/event-stream", "image/", "audio/", "video/", "font/", "application/zip", "application/gzip")
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def _run(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    async def compress(self, data: bytes, final: bool) -> bytes:
+        if len(data) >= _THREAD_MIN_SIZE:
+            return await anyio.to_thread.run_sync(self._run, data, final)
+        return self._run(data, final)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    """
+    Un ETag fort désigne des octets précis : la version compressée n'a pas
+    le droit de le réutiliser. Il devient faible (W/"..."), comme le fait
+    nginx ; If-None-Match se compare en mode faible, les 304 de l'app
+    restent donc valables (les variantes précompressées de static_assets
+    ont déjà leur propre ETag et ne passent pas par ici).
+    """
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+
+        start: Optional[Message] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or content_type.startswith(_EXCLUDED_TYPES)
+                )
+                if passthrough:
+                    etag = headers.get("etag")
+                    if message["status"] == 304 and etag and f"W/{etag}" in if_none_match:
+                        # Revalidation d'une réponse compressée ici : même ETag faible qu'au 200
+                        _weaken_etag(MutableHeaders(raw=message["headers"]))
+                    await send(message)
+                else:
+                    start = message  # envoyé avec le premier morceau du corps
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if len(body) < self.minimum_size and not more_body:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding)
+                body = await encoder.compress(body, final=not more_body)
+                headers["Content-Encoding"] = encoding
+                _weaken_etag(headers)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+            else:
+                body = await encoder.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
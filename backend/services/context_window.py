@@ -0,0 +1,177 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+###############################################################
+# FENÊTRE DE CONTEXTE (budget de tokens + résumé glissant)
+###############################################################
+# AGENT_CONTEXT_TOKEN_BUDGET : budget total envoyé au modèle (défaut 6000)
+# Les messages système et le nouveau message utilisateur sont toujours
+# envoyés ; les tours les plus récents remplissent le reste du budget et les
+# plus anciens sont repliés dans un résumé mis en cache par conversation.
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "6000"))
+SUMMARY_MAX_TOKENS = 400
+# Ne re-résume qu'après ce nombre de nouveaux messages sortis de la fenêtre,
+# pour ne pas payer un appel LLM supplémentaire à chaque tour.
+SUMMARY_BATCH = 6
+SUMMARY_CACHE_SIZE = 1024
+
+# Coût fixe approximatif d'un message au format chat (rôle, séparateurs)
+_MESSAGE_OVERHEAD = 4
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text or "", disallowed_special=()))
+except Exception:  # tiktoken absent : estimation ~4 caractères par token
+    def count_tokens(text: str) -> int:
+        return (len(text or "") + 3) // 4
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message.get("content", "")) + _MESSAGE_OVERHEAD
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[: max_tokens * 4].rsplit(" ", 1)[0] + "…"
+
+
+class _SummaryCache:
+    """LRU conv_id → (nb de messages couverts, résumé)."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._data: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conv_id: str) -> Tuple[int, str]:
+        with self._lock:
+            if conv_id not in self._data:
+                return 0, ""
+            self._data.move_to_end(conv_id)
+            return self._data[conv_id]
+
+    def set(self, conv_id: str, covered: int, summary: str) -> None:
+        with self._lock:
+            self._data[conv_id] = (covered, summary)
+            self._data.move_to_end(conv_id)
+            while len(self._data) > self._size:
+                self._data.popitem(last=False)
+
+
+_summaries = _SummaryCache(SUMMARY_CACHE_SIZE)
+
+
+# Replie les tours sortis de la fenêtre dans le résumé : appel LLM async
+# (créneaux de concurrence de llm_services, aucun thread bloqué)
+Summarizer = Callable[[str, List[dict]], Awaitable[str]]
+
+
+async def _rolling_summary(
+    conv_id: str,
+    dropped: List[dict],
+    summarize: Optional[Summarizer],
+) -> str:
+    covered, summary = _summaries.get(conv_id)
+    if covered > len(dropped):
+        # Historique plus court que le résumé (conversation réinitialisée)
+        covered, summary = 0, ""
+
+    pending = dropped[covered:]
+    if summarize is None or (len(pending) < SUMMARY_BATCH and summary):
+        return summary
+    if not pending:
+        return summary
+
+    try:
+        summary = _truncate((await summarize(summary, pending)).strip(), SUMMARY_MAX_TOKENS)
+    except Exception as e:
+        print(f"[context] résumé impossible, on garde le précédent : {e}")
+        return summary
+    _summaries.set(conv_id, len(dropped), summary)
+    return summary
+
+
+async def build_context(
+    conv_id: str,
+    history: List[dict],
+    user_message: str,
+    budget: Optional[int] = None,
+    summarize: Optional[Summarizer] = None,
+) -> Tuple[List[dict], dict]:
+    """
+    history : [messages système..., tours user/assistant...]
+    Retourne (messages à envoyer, stats).
+    """
+    budget = budget or DEFAULT_TOKEN_BUDGET
+
+    n_system = 0
+    while n_system < len(history) and history[n_system].get("role") == "system":
+        n_system += 1
+    system, turns = history[:n_system], history[n_system:]
+    new_msg = {"role": "user", "content": user_message}
+
+    fixed = sum(message_tokens(m) for m in system) + message_tokens(new_msg)
+    turn_costs = [message_tokens(m) for m in turns]
+
+    def fit(available: int) -> int:
+        """Nombre de tours récents qui tiennent dans `available`."""
+        kept, used = 0, 0
+        for cost in reversed(turn_costs):
+            if used + cost > available:
+                break
+            used += cost
+            kept += 1
+        return kept
+
+    kept = fit(budget - fixed)
+    summary = ""
+    if kept < len(turns):
+        # Réserve la place du résumé puis recalcule la fenêtre
+        kept = fit(budget - fixed - SUMMARY_MAX_TOKENS - _MESSAGE_OVERHEAD)
+        dropped = turns[: len(turns) - kept]
+        summary = await _rolling_summary(conv_id, dropped, summarize)
+
+    messages = list(system)
+    if summary:
+        messages.append({
+            "role": "system",
+            "content": f"Résumé des échanges précédents avec l'utilisateur :\n{summary}",
+        })
+    messages += turns[len(turns) - kept:] if kept else []
+    messages.append(new_msg)
+
+    stats = {
+        "budget": budget,
+        "tokens_sent": sum(message_tokens(m) for m in messages),
+        "tokens_full_history": fixed + sum(turn_costs),
+        "turns_kept": kept,
+        "turns_dropped": len(turns) - kept,
+        "summary_tokens": count_tokens(summary) if summary else 0,
+    }
+    return messages, stats
+
+
+def summary_prompt(previous: str, turns: List[dict]) -> List[dict]:
+    """Messages à envoyer au LLM pour replier `turns` dans le résumé."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Tu résumes une conversation pour la mémoire d'un assistant. "
+                "Conserve les faits, décisions, préférences et questions ouvertes. "
+                f"Réponds en moins de {SUMMARY_MAX_TOKENS // 2} mots."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"Résumé existant :\n{previous or '(aucun)'}\n\nNouveaux échanges :\n{transcript}",
+        },
+    ]
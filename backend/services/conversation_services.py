@@ -1,57 +1,161 @@
-from typing import List, Optional
+import os
+from typing import Iterable, List, Optional
 from datetime import datetime
 
+from sqlalchemy import func
+
 from .storage_services import (
     get_conversation,
     create_conversation,
     add_message as _add_message,
 )
 
+from .cache import TTLCache
+from .embeddings import similar_chunks
+
 from database.database import SessionLocal
-from database.models import Project, Note, project_notes
+from database.models import Project, Note, NoteChunk, project_notes
 
 DEFAULT_SYSTEM_PROMPT = "Tu es un assistant utile, concis et amical."
 
-def _build_project_system_prompt(project_id: Optional[str]) -> str:
+# Passages injectés dans le prompt projet : les k chunks les plus proches du
+# message, au plus CONTEXT_CHUNKS_PER_NOTE par note
+# (CONTEXT_NOTES_SEMANTIC=0 pour revenir à « épinglées puis récentes »)
+CONTEXT_NOTES_K = int(os.getenv("CONTEXT_NOTES_K", "5"))
+CONTEXT_CHUNKS_PER_NOTE = int(os.getenv("CONTEXT_CHUNKS_PER_NOTE", "2"))
+CONTEXT_NOTES_SEMANTIC = os.getenv("CONTEXT_NOTES_SEMANTIC", "1") not in ("0", "false", "False")
+
+# Prompt système par projet. Invalidé par routes/note.py et routes/project.py
+# après chaque écriture ; le TTL couvre les écritures faites par un autre worker.
+_project_prompt_cache = TTLCache(
+    maxsize=int(os.getenv("PROJECT_PROMPT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("PROJECT_PROMPT_CACHE_TTL", "300")),
+)
+
+
+def invalidate_project_prompts(project_ids: Iterable[Optional[str]]) -> None:
+    _project_prompt_cache.invalidate(*[pid for pid in project_ids if pid])
+
+
+def project_prompt_cache_stats() -> dict:
+    return _project_prompt_cache.stats()
+
+
+def _project_agent_entry(project_id: str) -> dict:
+    """{"prompt": str, "llm": {...}} pour un projet, via le cache."""
+    entry = _project_prompt_cache.get(project_id)
+    if entry is None:
+        entry = _render_project_agent_entry(project_id)
+        _project_prompt_cache.set(project_id, entry)
+    return entry
+
+
+def _build_project_system_prompt(project_id: Optional[str], query: Optional[str] = None) -> str:
+    """
+    Sans `query` : notes épinglées puis récentes (prompt en cache).
+    Avec `query` (message courant) : les passages des notes du projet les plus
+    proches du message (recherche sémantique par chunk), sinon le même repli.
+    """
     if not project_id:
         return DEFAULT_SYSTEM_PROMPT
+    entry = _project_agent_entry(project_id)
+    if query and CONTEXT_NOTES_SEMANTIC and "header" in entry:
+        notes_text = _relevant_notes_text(project_id, entry["user_id"], query)
+        if notes_text:
+            return _compose_prompt(entry["header"], "Extraits des notes du projet les plus pertinents pour la demande", notes_text)
+    return entry["prompt"]
+
+
+def get_project_llm_settings(project_id: Optional[str]) -> dict:
+    """Réglages LLM du projet (provider, model, temperature ; None = défaut)."""
+    if not project_id:
+        return {}
+    return _project_agent_entry(project_id)["llm"]
 
+
+def _render_project_agent_entry(project_id: str) -> dict:
     db = SessionLocal()
     try:
         proj = db.query(Project).filter(Project.id == project_id).first()
         if not proj:
-            return DEFAULT_SYSTEM_PROMPT
+            return {"prompt": DEFAULT_SYSTEM_PROMPT, "llm": {}}
 
+        # Résumé précalculé à l'écriture ; le début du contenu ne sert que pour
+        # les notes pas encore traitées (voir database/backfill_notes.py)
         notes_q = (
-            db.query(Note)
+            db.query(Note.title, _note_preview())
             .join(project_notes, Note.id == project_notes.c.note_id)
             .filter(project_notes.c.project_id == project_id)
             .order_by(Note.pinned.desc(), Note.updatedAt.desc())
             .limit(8)
         )
-        notes = notes_q.all()
-
-        notes_block = []
-        for n in notes:
-            preview = (n.summary or (n.content or "")[:300]).replace("\n", " ").strip()
-            notes_block.append(f"- {n.title}: {preview}")
-
-        notes_text = "\n".join(notes_block) if notes_block else "Aucune note liée."
+        notes_text = _notes_block(notes_q.all()) or "Aucune note liée."
         ctx = (proj.context or "").strip()
         desc = (proj.description or "").strip()
 
-        return (
+        header = (
             f"Tu es l'agent du projet '{proj.name}'.\n"
             f"Description: {desc or '(non renseignée)'}\n"
             f"Contexte: {ctx or '(non renseigné)'}\n"
             f"Priorité: {proj.priority}\n"
             f"Consigne: réponds uniquement à propos de CE projet.\n"
-            f"Notes liées (pinned d'abord, puis récentes):\n{notes_text}\n"
-            f"Si l'utilisateur s'éloigne du sujet, recentre vers le projet."
         )
+        prompt = _compose_prompt(header, "Notes liées (pinned d'abord, puis récentes)", notes_text)
+        llm = {
+            "provider": proj.llmProvider,
+            "model": proj.llmModel,
+            "temperature": proj.llmTemperature,
+        }
+        return {"prompt": prompt, "header": header, "user_id": proj.user_id, "llm": llm}
+    finally:
+        db.close()
+
+
+def _note_preview():
+    return func.coalesce(func.nullif(Note.summary, ""), func.substr(Note.content, 1, 300)).label("preview")
+
+
+def _notes_block(notes) -> str:
+    lines = []
+    for n in notes:
+        preview = (n.preview or "").replace("\n", " ").strip()
+        lines.append(f"- {n.title}: {preview}")
+    return "\n".join(lines)
+
+
+def _compose_prompt(header: str, notes_label: str, notes_text: str) -> str:
+    return (
+        f"{header}"
+        f"{notes_label}:\n{notes_text}\n"
+        f"Si l'utilisateur s'éloigne du sujet, recentre vers le projet."
+    )
+
+
+def _relevant_notes_text(project_id: str, user_id: str, query: str) -> str:
+    """Les passages (chunks) des notes du projet les plus proches du message ("" si aucun)."""
+    db = SessionLocal()
+    try:
+        note_ids = [nid for (nid,) in db.query(project_notes.c.note_id).filter(project_notes.c.project_id == project_id)]
+        hits = similar_chunks(db, user_id, query, k=CONTEXT_NOTES_K, note_ids=note_ids, per_note=CONTEXT_CHUNKS_PER_NOTE)
+        if not hits:
+            return ""
+        rows = {
+            r.id: r for r in db.query(NoteChunk.id, NoteChunk.heading, NoteChunk.text, Note.title)
+            .join(Note, Note.id == NoteChunk.note_id)
+            .filter(NoteChunk.id.in_([chunk_id for chunk_id, _, _ in hits]))
+        }
+        lines = []
+        for chunk_id, _, _ in hits:
+            r = rows.get(chunk_id)
+            if r is None:
+                continue
+            source = f"{r.title} › {r.heading}" if r.heading else r.title
+            lines.append(f"- {source}: {' '.join(r.text.split())}")
+        return "\n".join(lines)
     finally:
         db.close()
 
+
 def get_or_create_conversation(
     user_id: str,
     conversation_id: Optional[str],
@@ -73,9 +177,10 @@ def get_or_create_conversation(
 def get_conversation_history_with_project_context(
     conv_id: str,
     project_id: Optional[str],
+    query: Optional[str] = None,
 ) -> List[dict]:
     history = get_conversation(conv_id)
-    system = _build_project_system_prompt(project_id)
+    system = _build_project_system_prompt(project_id, query)
 
     if not history or history[0].get("role") != "system":
         return [{"role": "system", "content": system}] + history
@@ -0,0 +1,382 @@
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from .chunking import embed_text, refresh_chunks
+
+from database.models import Note, NoteChunk, project_notes
+
+###############################################################
+# EMBEDDINGS DES CHUNKS + RECHERCHE PAR SIMILARITÉ
+###############################################################
+# EMBEDDER : "hashing" (défaut, local, sans réseau) ou "openai"
+#            (OPENAI_EMBEDDING_MODEL, via OPENAI_API_KEY / OPENAI_BASE_URL)
+#
+# Un vecteur par chunk (services/chunking.py : titre de la note + titres de
+# section + texte), normalisé L2, stocké en float16 dans `note_chunks`. Seuls
+# les chunks nouveaux ou modifiés sont recalculés, par l'indexation en tâche de
+# fond ; une recherche ne lit que ce qui est déjà indexé (après un changement
+# d'EMBEDDER : python -m database.backfill_notes --embeddings). Pour la
+# recherche, les vecteurs d'un utilisateur sont chargés en une matrice float32
+# (cache process ; float16 ne sert qu'au stockage, la conversion coûterait plus
+# cher que le calcul), triée par note : top-k = un produit matrice-vecteur. La
+# matrice en cache est revalidée à chaque recherche par (nombre de vecteurs,
+# dernier embeddedAt) : un recalcul fait par un autre worker est donc vu.
+
+EMBED_DIM = int(os.getenv("EMBED_DIM", "512"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# En dessous, une note n'est pas considérée comme pertinente
+EMBED_MIN_SCORE = float(os.getenv("EMBED_MIN_SCORE", "0.1"))
+
+_user_index = TTLCache(
+    maxsize=int(os.getenv("EMBED_INDEX_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("EMBED_INDEX_CACHE_TTL", "600")),
+)
+
+
+class UnknownEmbedderError(ValueError):
+    pass
+
+
+class Embedder:
+    name = ""
+    dim = 0
+
+    @property
+    def model_id(self) -> str:
+        """Identifiant stocké avec les vecteurs : changer d'embedder invalide l'index."""
+        return f"{self.name}-{self.dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Matrice (len(texts), dim) float32, lignes normalisées L2."""
+        raise NotImplementedError
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "le la les un une des du de d l et ou en au aux ce ces cet cette est sont a à "
+    "pour par sur dans avec sans que qui quoi ne pas plus se sa son ses leur leurs "
+    "je tu il elle on nous vous ils elles me te y the a an of to in and or for on "
+    "with is are be this that it as at by from".split()
+)
+
+
+# Racinisation grossière par préfixe : « sauvegardes » / « sauvegarde »,
+# « recruter » / « recrutement », « postgres » / « postgresql »
+_STEM_LENGTH = 6
+
+
+@lru_cache(maxsize=65536)
+def _fold(token: str) -> str:
+    token = unicodedata.normalize("NFKD", token)
+    return "".join(ch for ch in token if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    # Minuscules sans accents : « Réunion » et « reunion » partagent le même jeton.
+    # Accents retirés par jeton (en cache) : le vocabulaire d'un utilisateur se répète
+    tokens = []
+    for t in _TOKEN_RE.findall(unicodedata.normalize("NFC", text.lower())):
+        if not t.isascii():
+            t = _fold(t)
+        if t not in _STOPWORDS and len(t) > 1:
+            tokens.append(t[:_STEM_LENGTH])
+    return tokens
+
+
+class HashingEmbedder(Embedder):
+    """
+    Sac de mots et de bigrammes hachés (crc32 signé) dans `dim` cases,
+    pondération tf sous-linéaire. Sans état ni réseau : un vecteur ne dépend
+    que de son texte, le calcul est donc incrémental par note.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> Counter:
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return features
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            n = len(features)
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=n)
+            weights = 1.0 + np.log(np.fromiter(features.values(), dtype=np.float32, count=n))
+            # bigrammes : signal d'appoint
+            weights[np.fromiter((" " in f for f in features), dtype=bool, count=n)] *= 0.5
+            weights[(hashes & 0x80000000) == 0] *= -1
+            np.add.at(matrix[row], hashes % self.dim, weights)
+        return _normalize(matrix)
+
+
+class OpenAIEmbedder(Embedder):
+    name = "openai"
+
+    def __init__(self, model: str = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"),
+                 dim: int = int(os.getenv("OPENAI_EMBEDDING_DIM", "512"))):
+        self.model = model
+        self.dim = dim
+        self._client = None
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model}-{self.dim}"
+
+    def embed(self, texts):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+            )
+        resp = self._client.embeddings.create(model=self.model, input=texts, dimensions=self.dim)
+        matrix = np.array([d.embedding for d in sorted(resp.data, key=lambda d: d.index)], dtype=np.float32)
+        return _normalize(matrix)
+
+
+EMBEDDERS: Dict[str, Embedder] = {
+    "hashing": HashingEmbedder(),
+    "openai": OpenAIEmbedder(),
+}
+
+DEFAULT_EMBEDDER = os.getenv("EMBEDDER", "hashing")
+
+
+def register_embedder(embedder: Embedder) -> None:
+    EMBEDDERS[embedder.name] = embedder
+
+
+def get_embedder(name: Optional[str] = None) -> Embedder:
+    name = name or DEFAULT_EMBEDDER
+    try:
+        return EMBEDDERS[name]
+    except KeyError:
+        raise UnknownEmbedderError(f"Embedder inconnu : {name}")
+
+
+def embedding_index_stats() -> dict:
+    return {"embedder": get_embedder().model_id, **_user_index.stats()}
+
+
+def invalidate_user_index(user_id: str) -> None:
+    _user_index.invalidate(user_id)
+
+
+###############################################################
+# CALCUL INCRÉMENTAL
+###############################################################
+def _embed_stale(db: Session, user_id: str, note_ids: Optional[List[str]] = None) -> int:
+    """Calcule les vecteurs des chunks sans vecteur ou d'un autre embedder (sans valider)."""
+    embedder = get_embedder()
+    stmt = (
+        select(NoteChunk.id, NoteChunk.heading, NoteChunk.text, Note.title)
+        .join(Note, Note.id == NoteChunk.note_id)
+        .where(NoteChunk.user_id == user_id, _unembedded(embedder.model_id))
+    )
+    if note_ids is not None:
+        stmt = stmt.where(NoteChunk.note_id.in_(note_ids))
+    stale = db.execute(stmt).all()
+    if not stale:
+        return 0
+
+    table = NoteChunk.__table__
+    store = (
+        update(table).where(table.c.id == bindparam("b_id"))
+        .values(model=bindparam("model"), vector=bindparam("vector"), embeddedAt=bindparam("embeddedAt"))
+    )
+    for start in range(0, len(stale), EMBED_BATCH_SIZE):
+        batch = stale[start:start + EMBED_BATCH_SIZE]
+        vectors = embedder.embed([embed_text(r.title, r.heading, r.text) for r in batch]).astype(np.float16)
+        now = datetime.utcnow()
+        # Un chunk supprimé entre-temps (note modifiée) n'est simplement pas mis à jour
+        db.execute(store, [
+            {"b_id": r.id, "model": embedder.model_id, "vector": vec.tobytes(), "embeddedAt": now}
+            for r, vec in zip(batch, vectors)
+        ])
+    _user_index.invalidate(user_id)
+    return len(stale)
+
+
+def _unembedded(model_id: str):
+    return or_(NoteChunk.model.is_(None), NoteChunk.model != model_id)
+
+
+def refresh_embeddings(db: Session, user_id: str, note_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Redécoupe si besoin les notes de l'utilisateur (toutes, ou `note_ids`) puis
+    calcule les vecteurs manquants ou d'un autre embedder. Retourne le nombre
+    de chunks recalculés ; ne valide pas la transaction.
+    """
+    note_ids = None if note_ids is None else list(note_ids)
+    refresh_chunks(db, user_id, note_ids)
+    return _embed_stale(db, user_id, note_ids)
+
+
+###############################################################
+# RECHERCHE
+###############################################################
+def _load_index(db: Session, user_id: str) -> tuple:
+    """
+    (signature, ids des chunks, note de chaque chunk, note_id → (début, fin)
+    des lignes, matrice float32) des vecteurs de l'utilisateur.
+    """
+    model_id = get_embedder().model_id
+    in_scope = (NoteChunk.user_id == user_id, NoteChunk.model == model_id)
+    count, last_update = db.execute(
+        select(func.count(), func.max(NoteChunk.embeddedAt)).where(*in_scope)
+    ).one()
+    signature = (model_id, count, last_update)
+    index = _user_index.get(user_id)
+    if index is not None and index[0] == signature:
+        return index
+
+    rows = db.execute(
+        select(NoteChunk.id, NoteChunk.note_id, NoteChunk.vector)
+        .where(*in_scope)
+        .order_by(NoteChunk.note_id, NoteChunk.position)
+    ).all()
+    chunk_ids = [r.id for r in rows]
+    chunk_notes = [r.note_id for r in rows]
+    segments: Dict[str, Tuple[int, int]] = {}
+    for i, note_id in enumerate(chunk_notes):
+        first, _ = segments.get(note_id, (i, i))
+        segments[note_id] = (first, i + 1)
+    dim = get_embedder().dim
+    matrix = (
+        np.frombuffer(b"".join(r.vector for r in rows), dtype=np.float16).reshape(len(rows), dim).astype(np.float32)
+        if rows else np.zeros((0, dim), dtype=np.float32)
+    )
+    index = (signature, chunk_ids, chunk_notes, segments, matrix)
+    _user_index.set(user_id, index)
+    return index
+
+
+def _ranked(scores: np.ndarray, m: int) -> np.ndarray:
+    """Indices des `m` meilleurs scores, décroissants."""
+    if scores.size <= m:
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, m)[:m]
+    return top[np.argsort(-scores[top])]
+
+
+def similar_chunks(
+    db: Session,
+    user_id: str,
+    query: str,
+    k: int = 5,
+    note_ids: Optional[Iterable[str]] = None,
+    min_score: float = EMBED_MIN_SCORE,
+    per_note: Optional[int] = None,
+) -> List[Tuple[str, str, float]]:
+    """
+    Les `k` chunks les plus proches de `query` : [(chunk_id, note_id, score
+    cosinus)], score décroissant. `note_ids` restreint la recherche (notes
+    d'un projet), `per_note` limite le nombre de chunks d'une même note.
+    """
+    candidates = None if note_ids is None else list(note_ids)
+    if candidates == []:
+        return []
+
+    _, chunk_ids, chunk_notes, segments, matrix = _load_index(db, user_id)
+    if candidates is not None:
+        spans = [segments[n] for n in candidates if n in segments]
+        rows = np.concatenate([np.arange(a, b) for a, b in spans]) if spans else np.zeros(0, dtype=np.int64)
+        matrix = matrix[rows]
+    else:
+        rows = np.arange(len(chunk_ids))
+    if rows.size == 0:
+        return []
+
+    q = get_embedder().embed([query])[0]
+    scores = matrix @ q
+    # Avec `per_note`, des chunks d'une même note peuvent être écartés :
+    # on élargit la sélection tant qu'il manque des résultats
+    m = k if per_note is None else k * 4
+    while True:
+        picked, taken = [], Counter()
+        order = _ranked(scores, m)
+        for i in order:
+            if scores[i] < min_score or len(picked) == k:
+                break
+            note_id = chunk_notes[rows[i]]
+            if per_note is not None and taken[note_id] >= per_note:
+                continue
+            taken[note_id] += 1
+            picked.append((chunk_ids[rows[i]], note_id, float(scores[i])))
+        if len(picked) == k or m >= scores.size or scores[order[-1]] < min_score:
+            return picked
+        m *= 4
+
+
+def similar_notes(
+    db: Session,
+    user_id: str,
+    query: str,
+    k: int = 5,
+    note_ids: Optional[Iterable[str]] = None,
+    min_score: float = EMBED_MIN_SCORE,
+) -> List[Tuple[str, str, float]]:
+    """Les `k` notes les plus proches : [(note_id, id du meilleur chunk, score)]."""
+    hits = similar_chunks(db, user_id, query, k=k, note_ids=note_ids, min_score=min_score, per_note=1)
+    return [(note_id, chunk_id, score) for chunk_id, note_id, score in hits]
+
+
+def search_similar_notes(
+    db: Session,
+    user_id: str,
+    query: str,
+    k: int = 10,
+    project_id: Optional[str] = None,
+) -> List[dict]:
+    """Recherche sémantique pour l'API : [{id, title, summary, score, chunk}] (chunk = passage le plus proche)."""
+    note_ids = None
+    if project_id:
+        note_ids = db.scalars(
+            select(project_notes.c.note_id).where(project_notes.c.project_id == project_id)
+        ).all()
+    hits = similar_notes(db, user_id, query, k=k, note_ids=note_ids)
+    if not hits:
+        return []
+    notes = {
+        r.id: r for r in db.execute(
+            select(Note.id, Note.title, Note.summary)
+            .where(Note.id.in_([note_id for note_id, _, _ in hits]), Note.user_id == user_id)
+        )
+    }
+    chunks = {
+        c.id: c for c in db.scalars(select(NoteChunk).where(NoteChunk.id.in_([chunk_id for _, chunk_id, _ in hits])))
+    }
+    return [
+        {
+            "id": note_id,
+            "title": notes[note_id].title,
+            "summary": notes[note_id].summary,
+            "score": round(score, 4),
+            "chunk": chunks[chunk_id],
+        }
+        for note_id, chunk_id, score in hits if note_id in notes and chunk_id in chunks
+    ]
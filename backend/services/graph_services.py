@@ -0,0 +1,355 @@
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Sequence, Set
+
+from sqlalchemy import bindparam, delete, func, insert, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from .embeddings import tokenize
+
+from database.models import Note, NoteConcept, NoteLink, NoteLinkRef, note_tags
+
+###############################################################
+# GRAPHE DE CONNAISSANCES ENTRE NOTES
+###############################################################
+# Deux sortes de liens dans `note_links`, recalculés par l'indexation en
+# tâche de fond (services/indexing.py) à chaque écriture d'une note :
+#   wiki    : [[Titre]] ou [[Titre|alias]] dans le contenu, résolu sur le titre
+#             normalisé (Note.titleKey) des notes de l'utilisateur. Les cibles
+#             écrites sont gardées dans `note_link_refs` : une note créée ou
+#             renommée plus tard récupère ses liens entrants.
+#   concept : notes partageant des tags ou des termes saillants
+#             (`note_concepts`). Un concept présent dans plus de
+#             CONCEPT_MAX_NOTES notes ne relie rien (trop général, et
+#             quadratique). Lien orienté A → B : B est parmi les
+#             CONCEPT_LINKS_PER_NOTE voisines les plus proches de A ; chaque
+#             note ne réécrit que ses propres liens, et les notes dont le
+#             classement dépend des concepts modifiés sont recalculées avec
+#             elle. Lus sans orientation (voisins, sous-graphe).
+# Les parcours (voisins, sous-graphe à k sauts) sont des requêtes SQL uniques
+# (CTE récursive), jamais des boucles Python sur les relations ORM.
+
+CONCEPT_MAX_NOTES = int(os.getenv("CONCEPT_MAX_NOTES", "100"))
+CONCEPT_LINKS_PER_NOTE = int(os.getenv("CONCEPT_LINKS_PER_NOTE", "10"))
+# Termes saillants retenus par note (racines d'au moins 5 lettres, répétées)
+CONCEPT_TERMS = int(os.getenv("CONCEPT_TERMS", "5"))
+# Borne du parcours récursif (lignes visitées, SQLite) : le parcours est en
+# largeur, les lignes coupées sont les plus éloignées
+GRAPH_MAX_VISITS = int(os.getenv("GRAPH_MAX_VISITS", "5000"))
+
+LINK_KINDS = ("wiki", "concept")
+
+_WIKI_LINK_RE = re.compile(r"\[\[([^\[\]|#]+)(?:#[^\[\]|]*)?(?:\|[^\[\]]*)?\]\]")
+
+
+def title_key(title: str) -> str:
+    """Titre normalisé : casse et espaces ignorés."""
+    return " ".join(title.casefold().split())
+
+
+def wiki_targets(content: str) -> Set[str]:
+    return {key for key in (title_key(m.group(1)) for m in _WIKI_LINK_RE.finditer(content)) if key}
+
+
+def note_terms(title: str, content: str, limit: int = CONCEPT_TERMS) -> List[str]:
+    counts = Counter(t for t in tokenize(f"{title}\n{content}") if len(t) >= 5)
+    return [t for t, n in counts.most_common(limit) if n >= 2]
+
+
+###############################################################
+# MISE À JOUR (indexation en tâche de fond)
+###############################################################
+def refresh_links(db: Session, user_id: str, note_ids: Iterable[str]) -> None:
+    """
+    Recalcule titre normalisé, cibles [[...]], concepts et liens des notes
+    `note_ids` (liens entrants compris, et liens concept des notes dont le
+    classement dépend de leurs concepts). Idempotent ; ne valide pas la transaction.
+    """
+    notes = db.execute(
+        select(Note.id, Note.title, Note.content, Note.titleKey)
+        .where(Note.id.in_(list(note_ids)), Note.user_id == user_id)
+    ).all()
+    if not notes:
+        return
+    ids = [n.id for n in notes]
+    keys = {n.id: title_key(n.title) for n in notes}
+
+    renamed = [{"b_id": n.id, "titleKey": keys[n.id]} for n in notes if n.titleKey != keys[n.id]]
+    if renamed:
+        table = Note.__table__
+        db.execute(update(table).where(table.c.id == bindparam("b_id")).values(titleKey=bindparam("titleKey")), renamed)
+
+    refs = {n.id: wiki_targets(n.content) for n in notes}
+    db.execute(delete(NoteLinkRef).where(NoteLinkRef.source_id.in_(ids)))
+    ref_rows = [{"source_id": nid, "target_key": key, "user_id": user_id} for nid, targets in refs.items() for key in targets]
+    if ref_rows:
+        db.execute(insert(NoteLinkRef), ref_rows)
+
+    concepts: Dict[str, Set[str]] = {n.id: {f"term:{t}" for t in note_terms(n.title, n.content)} for n in notes}
+    for note_id, tag_id in db.execute(select(note_tags.c.note_id, note_tags.c.tag_id).where(note_tags.c.note_id.in_(ids))):
+        concepts[note_id].add(f"tag:{tag_id}")
+    previous = defaultdict(set)
+    for note_id, concept in db.execute(select(NoteConcept.note_id, NoteConcept.concept).where(NoteConcept.note_id.in_(ids))):
+        previous[note_id].add(concept)
+    changed = set().union(*(concepts[nid] ^ previous[nid] for nid in ids))
+    db.execute(delete(NoteConcept).where(NoteConcept.note_id.in_(ids)))
+    concept_rows = [{"note_id": nid, "concept": c, "user_id": user_id} for nid, cs in concepts.items() for c in cs]
+    if concept_rows:
+        db.execute(insert(NoteConcept), concept_rows)
+
+    _refresh_wiki_links(db, user_id, ids, keys, refs)
+    _refresh_concept_links(db, user_id, set(ids) | _concept_members(db, user_id, changed))
+
+
+def _refresh_wiki_links(db: Session, user_id: str, ids: List[str], keys: Dict[str, str], refs: Dict[str, Set[str]]) -> None:
+    db.execute(delete(NoteLink).where(
+        NoteLink.kind == "wiki",
+        or_(NoteLink.source_id.in_(ids), NoteLink.target_id.in_(ids)),
+    ))
+    links = set()
+    # Sortants : cibles [[...]] des notes traitées
+    wanted = set().union(*refs.values())
+    if wanted:
+        by_key = defaultdict(list)
+        for target_id, key in db.execute(
+            select(Note.id, Note.titleKey).where(Note.user_id == user_id, Note.titleKey.in_(wanted))
+        ):
+            by_key[key].append(target_id)
+        # Les notes du lot renommées ne sont pas encore visibles sous leur nouveau titre
+        for note_id, key in keys.items():
+            if key in wanted and note_id not in by_key[key]:
+                by_key[key].append(note_id)
+        for source_id, targets in refs.items():
+            links.update((source_id, target_id) for key in targets for target_id in by_key[key])
+    # Entrants : notes (hors lot) qui citent le titre d'une note traitée
+    ids_by_key = defaultdict(list)
+    for note_id, key in keys.items():
+        ids_by_key[key].append(note_id)
+    for source_id, key in db.execute(
+        select(NoteLinkRef.source_id, NoteLinkRef.target_key)
+        .where(NoteLinkRef.user_id == user_id, NoteLinkRef.target_key.in_(list(ids_by_key)),
+               NoteLinkRef.source_id.notin_(ids))
+    ):
+        links.update((source_id, target_id) for target_id in ids_by_key[key])
+
+    rows = [{"source_id": s, "target_id": t, "kind": "wiki", "user_id": user_id, "weight": 1.0}
+            for s, t in links if s != t]
+    if rows:
+        db.execute(insert(NoteLink), rows)
+
+
+def _concept_members(db: Session, user_id: str, concepts: Set[str]) -> Set[str]:
+    """
+    Notes dont le classement des voisines change quand `concepts` gagnent ou
+    perdent une note (poids modifié, ou concept qui passe le seuil
+    CONCEPT_MAX_NOTES).
+    """
+    if not concepts:
+        return set()
+    counts = db.execute(
+        select(NoteConcept.concept, func.count())
+        .where(NoteConcept.user_id == user_id, NoteConcept.concept.in_(list(concepts)))
+        .group_by(NoteConcept.concept)
+    ).all()
+    # Au-delà de CONCEPT_MAX_NOTES + 1 notes, le concept ne reliait rien avant non plus
+    live = [c for c, n in counts if n <= CONCEPT_MAX_NOTES + 1]
+    if not live:
+        return set()
+    return set(db.scalars(
+        select(NoteConcept.note_id).where(NoteConcept.user_id == user_id, NoteConcept.concept.in_(live))
+    ))
+
+
+def _refresh_concept_links(db: Session, user_id: str, ids: Set[str]) -> None:
+    """Remplace les liens concept sortants de `ids` par leurs voisines les plus proches."""
+    ids = list(ids)
+    if not ids:
+        return
+    db.execute(delete(NoteLink).where(NoteLink.kind == "concept", NoteLink.source_id.in_(ids)))
+    concepts = defaultdict(set)
+    for note_id, concept in db.execute(select(NoteConcept.note_id, NoteConcept.concept).where(NoteConcept.note_id.in_(ids))):
+        concepts[note_id].add(concept)
+    all_concepts = set().union(*concepts.values())
+    if not all_concepts:
+        return
+    df = dict(db.execute(
+        select(NoteConcept.concept, func.count())
+        .where(NoteConcept.user_id == user_id, NoteConcept.concept.in_(all_concepts))
+        .group_by(NoteConcept.concept)
+    ).all())
+    # Concept rare = lien fort ; un tag (choix explicite) compte double
+    weights = {
+        c: (2.0 if c.startswith("tag:") else 1.0) / math.log(1 + n)
+        for c, n in df.items() if 2 <= n <= CONCEPT_MAX_NOTES
+    }
+    if not weights:
+        return
+    members = defaultdict(list)
+    for note_id, concept in db.execute(
+        select(NoteConcept.note_id, NoteConcept.concept)
+        .where(NoteConcept.user_id == user_id, NoteConcept.concept.in_(list(weights)))
+    ):
+        members[concept].append(note_id)
+
+    rows = []
+    for note_id, cs in concepts.items():
+        scores = Counter()
+        for c in cs:
+            if c in weights:
+                for other in members[c]:
+                    if other != note_id:
+                        scores[other] += weights[c]
+        # Égalités départagées par id : le résultat ne dépend pas de l'ordre de lecture
+        ranked = sorted((-round(score, 4), other) for other, score in scores.items())
+        rows.extend(
+            {"source_id": note_id, "target_id": other, "kind": "concept", "user_id": user_id, "weight": -score}
+            for score, other in ranked[:CONCEPT_LINKS_PER_NOTE]
+        )
+    if rows:
+        db.execute(insert(NoteLink), rows)
+
+
+def concept_dependents(db: Session, user_id: str, note_ids: Iterable[str]) -> Set[str]:
+    """
+    Autres notes dont les liens concept changent si `note_ids` sont supprimées :
+    à journaliser AVANT la suppression (concepts et liens partent en cascade).
+    """
+    ids = list(note_ids)
+    concepts = set(db.scalars(select(NoteConcept.concept).where(NoteConcept.note_id.in_(ids))))
+    return _concept_members(db, user_id, concepts) - set(ids)
+
+
+def delete_note_links(db: Session, note_ids: Iterable[str]) -> None:
+    # Sans PRAGMA foreign_keys (SQLITE_TUNING=0), pas de suppression en cascade
+    ids = list(note_ids)
+    db.execute(delete(NoteLink).where(or_(NoteLink.source_id.in_(ids), NoteLink.target_id.in_(ids))))
+    db.execute(delete(NoteLinkRef).where(NoteLinkRef.source_id.in_(ids)))
+    db.execute(delete(NoteConcept).where(NoteConcept.note_id.in_(ids)))
+
+
+###############################################################
+# LECTURE
+###############################################################
+def _kinds_filter(kinds: Sequence[str]) -> str:
+    # Valeurs contrôlées par l'appelant (LINK_KINDS) : pas d'injection possible
+    return ", ".join(f"'{k}'" for k in kinds if k in LINK_KINDS) or "''"
+
+
+def backlinks(db: Session, note_id: str, limit: int = 50) -> List[dict]:
+    """Notes contenant un [[lien]] vers `note_id`."""
+    rows = db.execute(
+        text("""
+            SELECT n.id, n.title, n.summary, n."updatedAt"
+            FROM note_links l
+            JOIN notes n ON n.id = l.source_id
+            WHERE l.target_id = :id AND l.kind = 'wiki'
+            ORDER BY n."updatedAt" DESC
+            LIMIT :limit
+        """),
+        {"id": note_id, "limit": limit},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def neighbors(db: Session, note_id: str, kinds: Sequence[str] = LINK_KINDS, limit: int = 50) -> List[dict]:
+    """
+    Voisins directs : liens sortants, [[liens]] entrants et notes liées par
+    concept ; direction "out" / "in" / "both" (concept).
+    """
+    kinds_sql = _kinds_filter(kinds)
+    rows = db.execute(
+        text(f"""
+            SELECT n.id, n.title, n.summary, e.kind, e.direction, e.weight
+            FROM (
+                SELECT target_id AS id, kind, 'out' AS direction, weight
+                FROM note_links WHERE source_id = :id AND kind = 'wiki' AND 'wiki' IN ({kinds_sql})
+                UNION ALL
+                SELECT source_id, kind, 'in', weight
+                FROM note_links WHERE target_id = :id AND kind = 'wiki' AND 'wiki' IN ({kinds_sql})
+                UNION ALL
+                -- Liens concept orientés (voisines retenues par chaque note) : une ligne par voisine
+                SELECT c.id, 'concept', 'both', MAX(c.weight)
+                FROM (
+                    SELECT target_id AS id, weight
+                    FROM note_links WHERE source_id = :id AND kind = 'concept'
+                    UNION ALL
+                    SELECT source_id, weight
+                    FROM note_links WHERE target_id = :id AND kind = 'concept'
+                ) c
+                WHERE 'concept' IN ({kinds_sql})
+                GROUP BY c.id
+            ) e
+            JOIN notes n ON n.id = e.id
+            ORDER BY e.kind DESC, e.weight DESC, n.title
+            LIMIT :limit
+        """),
+        {"id": note_id, "limit": limit},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def subgraph(db: Session, note_id: str, depth: int = 2, kinds: Sequence[str] = LINK_KINDS, limit: int = 200) -> dict:
+    """
+    Sous-graphe à `depth` sauts autour de `note_id` (liens parcourus dans les
+    deux sens) : {"nodes": [{id, title, depth}], "edges": [{source, target, kind, weight}]}.
+    Les `limit` nœuds les plus proches sont gardés.
+    """
+    kinds_sql = _kinds_filter(kinds)
+    # Plafond du parcours (graphe dense) : PostgreSQL n'évalue une CTE
+    # récursive qu'au fil des lignes lues, le LIMIT de `visited` l'arrête donc ;
+    # SQLite matérialise la CTE et ne s'arrête qu'avec un LIMIT dans la partie
+    # récursive (interdit sous PostgreSQL)
+    visit_limit = "LIMIT :max_visits" if db.get_bind().dialect.name == "sqlite" else ""
+    nodes = db.execute(
+        text(f"""
+            WITH RECURSIVE walk(id, depth) AS (
+                SELECT CAST(:id AS VARCHAR), 0
+                UNION
+                SELECT CASE WHEN l.source_id = w.id THEN l.target_id ELSE l.source_id END, w.depth + 1
+                FROM walk w
+                JOIN note_links l
+                  ON (l.source_id = w.id AND l.kind IN ({kinds_sql}))
+                  OR (l.target_id = w.id AND l.kind IN ({kinds_sql}))
+                WHERE w.depth < :depth
+                {visit_limit}
+            ),
+            visited AS (
+                SELECT id, depth FROM walk LIMIT :max_visits
+            )
+            SELECT n.id, n.title, MIN(v.depth) AS depth
+            FROM visited v
+            JOIN notes n ON n.id = v.id
+            GROUP BY n.id, n.title
+            ORDER BY depth, n.title
+            LIMIT :limit
+        """),
+        {"id": note_id, "depth": depth, "limit": limit, "max_visits": GRAPH_MAX_VISITS},
+    ).mappings().all()
+    ids = [n["id"] for n in nodes]
+    if not ids:
+        return {"nodes": [], "edges": []}
+
+    # Liens sortants seulement (clé primaire) ; cible filtrée ici plutôt qu'un
+    # double IN qui multiplie les recherches d'index
+    node_ids = set(ids)
+    edges = {}
+    for source, target, kind, weight in db.execute(
+        select(NoteLink.source_id, NoteLink.target_id, NoteLink.kind, NoteLink.weight)
+        .where(NoteLink.source_id.in_(ids), NoteLink.kind.in_(list(kinds)))
+    ):
+        if target not in node_ids:
+            continue
+        if kind == "concept":
+            # Lien concept présent dans un sens ou dans les deux : une seule arête
+            source, target = min(source, target), max(source, target)
+            weight = max(weight, edges.get((source, target, kind), weight))
+        edges[(source, target, kind)] = weight
+    return {
+        "nodes": [dict(n) for n in nodes],
+        "edges": [
+            {"source": source, "target": target, "kind": kind, "weight": weight}
+            for (source, target, kind), weight in edges.items()
+        ],
+    }
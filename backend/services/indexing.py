@@ -0,0 +1,377 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, event, func, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .chunking import delete_note_chunks, refresh_chunks
+from .embeddings import invalidate_user_index, refresh_embeddings
+from .graph_services import delete_note_links, refresh_links
+from .note_processing import apply_content
+
+from database.database import SessionLocal
+from database.models import Note, NoteChange
+
+###############################################################
+# INDEXATION INCRÉMENTALE EN TÂCHE DE FOND
+###############################################################
+# Chaque écriture sur une note ajoute une ligne à `note_changes` dans SA
+# transaction (record_changes) : le journal est donc exactement aussi durable
+# que la modification. Des workers asyncio (lancés par app.py) réservent les
+# lignes par lots, appellent les indexeurs enregistrés (INDEXERS) dans un
+# thread (une transaction par utilisateur, rejouée note par note en cas
+# d'échec), puis suppriment les lignes traitées. Les indexeurs recalculent à
+# partir de l'état courant des notes : retraiter une ligne est sans effet.
+#
+# INDEXER_ENABLED      : 0 pour ne pas lancer les workers dans ce process
+# INDEXER_WORKERS      : nombre de workers
+# INDEXER_BATCH_SIZE   : lignes du journal par lot
+# INDEXER_POLL_INTERVAL: scrutation (s) quand aucun commit local ne réveille les workers
+# INDEXER_LEASE        : durée (s) d'une réservation ; au-delà (worker tué,
+#                        lot en échec) les lignes sont reprises
+# INDEXER_MAX_ATTEMPTS : échecs avant abandon (lignes gardées, comptées en `failed`)
+
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "1") not in ("0", "false", "False")
+INDEXER_WORKERS = int(os.getenv("INDEXER_WORKERS", "2"))
+INDEXER_BATCH_SIZE = int(os.getenv("INDEXER_BATCH_SIZE", "200"))
+INDEXER_POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", "1"))
+INDEXER_LEASE = timedelta(seconds=float(os.getenv("INDEXER_LEASE", "60")))
+INDEXER_MAX_ATTEMPTS = int(os.getenv("INDEXER_MAX_ATTEMPTS", "5"))
+
+_PENDING_KEY = "note_changes_pending"
+
+# nom → fn(db, user_id, changed_ids, deleted_ids) ; doit être idempotente
+INDEXERS: Dict[str, Callable[[Session, str, Set[str], Set[str]], None]] = {}
+
+
+def register_indexer(name: str, fn: Callable[[Session, str, Set[str], Set[str]], None]) -> None:
+    INDEXERS[name] = fn
+
+
+###############################################################
+# CAPTURE DES MODIFICATIONS
+###############################################################
+def change_rows(user_id: str, note_ids: Iterable[str], kind: str) -> List[dict]:
+    now = datetime.utcnow()
+    return [{"note_id": nid, "user_id": user_id, "kind": kind, "createdAt": now} for nid in note_ids]
+
+
+def record_changes(db, user_id: str, note_ids: Iterable[str], kind: str) -> None:
+    """
+    Journalise des notes modifiées dans la transaction de `db` (Session ou
+    AsyncSession) ; les workers sont réveillés au commit.
+    kind : "content" (création / contenu), "links" (projets, zones, tags), "delete".
+    """
+    db.add_all([NoteChange(**row) for row in change_rows(user_id, note_ids, kind)])
+    db.info[_PENDING_KEY] = True
+
+
+def mark_pending(db: Session) -> None:
+    """À appeler après un INSERT direct dans note_changes (import en masse)."""
+    db.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop(_PENDING_KEY, False):
+        workers.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+###############################################################
+# INDEXEURS
+###############################################################
+def _index_derived_fields(db: Session, user_id: str, changed: Set[str], deleted: Set[str]) -> None:
+    # Notes écrites sans passer par note_processing (anciens chemins, SQL direct)
+    if changed:
+        for note in db.scalars(select(Note).where(Note.id.in_(changed), Note.contentHash.is_(None))):
+            apply_content(note)
+
+
+def _index_chunks(db: Session, user_id: str, changed: Set[str], deleted: Set[str]) -> None:
+    if changed:
+        # Forcé : un changement de titre modifie le texte vectorisé des chunks
+        refresh_chunks(db, user_id, changed, force=True)
+    if deleted:
+        delete_note_chunks(db, deleted)
+
+
+def _index_embeddings(db: Session, user_id: str, changed: Set[str], deleted: Set[str]) -> None:
+    if changed:
+        refresh_embeddings(db, user_id, changed)
+    if deleted:
+        invalidate_user_index(user_id)
+
+
+def _index_links(db: Session, user_id: str, changed: Set[str], deleted: Set[str]) -> None:
+    if deleted:
+        delete_note_links(db, deleted)
+    if changed:
+        refresh_links(db, user_id, changed)
+
+
+register_indexer("derived_fields", _index_derived_fields)
+register_indexer("chunks", _index_chunks)
+register_indexer("embeddings", _index_embeddings)
+register_indexer("links", _index_links)
+
+
+###############################################################
+# TRAITEMENT D'UN LOT
+###############################################################
+_metrics_lock = threading.Lock()
+_metrics = {"processed": 0, "batches": 0, "failed_batches": 0, "last_batch_ms": None, "last_error": None}
+# Délai écriture → indexation des dernières lignes traitées (s)
+_lags: deque = deque(maxlen=1000)
+
+
+def _claim(batch_size: int) -> Optional[str]:
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    available = or_(NoteChange.claimedAt.is_(None), NoteChange.claimedAt < now - INDEXER_LEASE)
+    with SessionLocal() as db:
+        ids = db.scalars(
+            select(NoteChange.id)
+            .where(available, NoteChange.attempts < INDEXER_MAX_ATTEMPTS)
+            .order_by(NoteChange.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return None
+        # Conditionnel : un autre worker a pu réserver une partie du lot entre-temps
+        claimed = db.execute(
+            update(NoteChange)
+            .where(NoteChange.id.in_(ids), available)
+            .values(claimToken=token, claimedAt=now)
+        ).rowcount
+        db.commit()
+    return token if claimed else None
+
+
+def _index_user(user_id: str, changed: Set[str], deleted: Set[str]) -> Optional[str]:
+    """Passe les indexeurs sur des notes d'un utilisateur, dans une transaction ; renvoie l'erreur éventuelle."""
+    try:
+        with SessionLocal() as db:
+            for indexer in INDEXERS.values():
+                indexer(db, user_id, changed, deleted)
+            db.commit()
+    except Exception as e:
+        return f"{e.__class__.__name__}: {e}"
+    return None
+
+
+def process_batch(batch_size: int = INDEXER_BATCH_SIZE) -> int:
+    """Réserve et traite un lot du journal ; retourne le nombre de lignes traitées."""
+    token = _claim(batch_size)
+    if token is None:
+        return 0
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        changes = db.execute(
+            select(NoteChange.note_id, NoteChange.user_id, NoteChange.kind, NoteChange.createdAt)
+            .where(NoteChange.claimToken == token)
+            .order_by(NoteChange.id)
+        ).all()
+
+    by_user: Dict[str, tuple] = defaultdict(lambda: (set(), set()))
+    for change in changes:
+        changed, deleted = by_user[change.user_id]
+        if change.kind == "delete":
+            changed.discard(change.note_id)
+            deleted.add(change.note_id)
+        else:
+            changed.add(change.note_id)
+
+    # note_id → erreur : seules les lignes de ces notes comptent un échec
+    failed: Dict[str, str] = {}
+    for user_id, (changed, deleted) in by_user.items():
+        if _index_user(user_id, changed, deleted) is None:
+            continue
+        # Une note en échec ne doit pas bloquer les autres : on rejoue les
+        # notes de l'utilisateur une par une pour l'isoler
+        for note_id in changed | deleted:
+            error = _index_user(user_id, changed & {note_id}, deleted & {note_id})
+            if error is not None:
+                failed[note_id] = error
+                print(f"[INDEX] Échec de l'indexation de la note {note_id} : {error}")
+
+    with SessionLocal() as db:
+        for note_id, error in failed.items():
+            # Lignes reprises à l'expiration du bail (claimedAt conservé)
+            db.execute(
+                update(NoteChange)
+                .where(NoteChange.claimToken == token, NoteChange.note_id == note_id)
+                .values(claimToken=None, attempts=NoteChange.attempts + 1, lastError=error[:500])
+            )
+        db.execute(delete(NoteChange).where(NoteChange.claimToken == token))
+        db.commit()
+
+    now = datetime.utcnow()
+    indexed = [c for c in changes if c.note_id not in failed]
+    with _metrics_lock:
+        _metrics["batches"] += 1
+        _metrics["last_batch_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _metrics["processed"] += len(indexed)
+        _lags.extend((now - c.createdAt).total_seconds() for c in indexed)
+        if failed:
+            _metrics["failed_batches"] += 1
+            _metrics["last_error"] = next(iter(failed.values()))
+    return len(changes)
+
+
+def drain(batch_size: int = INDEXER_BATCH_SIZE) -> int:
+    """Traite le journal jusqu'à épuisement, dans le thread appelant (scripts, tests)."""
+    total = 0
+    while True:
+        done = process_batch(batch_size)
+        if not done:
+            return total
+        total += done
+
+
+###############################################################
+# MÉTRIQUES / ATTENTE
+###############################################################
+def _pending_up_to(max_id: Optional[int]) -> int:
+    with SessionLocal() as db:
+        stmt = select(func.count()).select_from(NoteChange).where(NoteChange.attempts < INDEXER_MAX_ATTEMPTS)
+        if max_id is not None:
+            stmt = stmt.where(NoteChange.id <= max_id)
+        return db.scalar(stmt)
+
+
+def pending_changes(db: Session, user_id: str, note_ids: Optional[Iterable[str]] = None) -> int:
+    """Modifications de l'utilisateur (ou de `note_ids`) journalisées mais pas encore indexées."""
+    stmt = (
+        select(func.count()).select_from(NoteChange)
+        .where(NoteChange.user_id == user_id, NoteChange.attempts < INDEXER_MAX_ATTEMPTS)
+    )
+    if note_ids is not None:
+        stmt = stmt.where(NoteChange.note_id.in_(list(note_ids)))
+    return db.scalar(stmt)
+
+
+def indexing_stats() -> dict:
+    """Retard de l'indexation : file en attente, âge de la plus ancienne ligne, délais observés."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        pending, oldest = db.execute(
+            select(func.count(), func.min(NoteChange.createdAt))
+            .where(NoteChange.attempts < INDEXER_MAX_ATTEMPTS)
+        ).one()
+        failed = db.scalar(
+            select(func.count()).select_from(NoteChange).where(NoteChange.attempts >= INDEXER_MAX_ATTEMPTS)
+        )
+    with _metrics_lock:
+        lags = sorted(_lags)
+        metrics = dict(_metrics)
+
+    def pct(p: float) -> Optional[float]:
+        return round(lags[min(len(lags) - 1, int(len(lags) * p))], 3) if lags else None
+
+    return {
+        "workers": workers.running,
+        "indexers": list(INDEXERS),
+        "pending": pending,
+        "failed": failed,
+        "lag_seconds": round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+        "recent_lag_p50": pct(0.5),
+        "recent_lag_p95": pct(0.95),
+        **metrics,
+    }
+
+
+async def wait_until_indexed(timeout: float = 10.0) -> bool:
+    """
+    Attend que toutes les modifications journalisées avant l'appel soient
+    indexées (les lignes abandonnées ne comptent pas). Sans workers dans ce
+    process, le journal est traité directement. False si `timeout` est atteint.
+    """
+    with SessionLocal() as db:
+        target = db.scalar(select(func.max(NoteChange.id)))
+    if target is None:
+        return True
+
+    deadline = time.monotonic() + timeout
+    workers.wake()
+    while await run_in_threadpool(_pending_up_to, target):
+        if time.monotonic() >= deadline:
+            return False
+        if not workers.running:
+            await run_in_threadpool(process_batch)
+        # Même sans worker : des lignes réservées ailleurs ne se libèrent qu'à
+        # l'expiration de leur bail, inutile de boucler sans pause
+        await asyncio.sleep(0.02)
+    return True
+
+
+###############################################################
+# WORKERS
+###############################################################
+class IndexWorkers:
+    """Pool de workers asyncio ; le travail d'indexation (sync) part en thread."""
+
+    def __init__(self, count: int = INDEXER_WORKERS):
+        self.count = count
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> int:
+        return sum(1 for t in self._tasks if not t.done())
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.count)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._loop = None
+
+    def wake(self) -> None:
+        # Appelé depuis un thread (commit dans le threadpool) ou depuis la boucle
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                done = await run_in_threadpool(process_batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[INDEX] Erreur du worker : {e}")
+                done = 0
+            if done:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), INDEXER_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+workers = IndexWorkers()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from .cache import TTLCache
+
+###############################################################
+# CACHE DES RÉPONSES LLM
+###############################################################
+# Clé = sha256(modèle, température, messages normalisés).
+# LLM_CACHE_ENABLED   : 0 pour désactiver complètement (défaut 1)
+# LLM_CACHE_SIZE      : entrées gardées en mémoire (LRU)
+# LLM_CACHE_TTL       : durée de vie en secondes (mémoire et disque)
+# LLM_CACHE_DB        : chemin d'un fichier SQLite pour le tier disque (optionnel)
+# Par défaut seules les requêtes à température 0 sont mises en cache ; une
+# requête peut forcer (cache=True) ou contourner (cache=False) le cache.
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def cache_key(model: str, temperature: float, messages: List[dict]) -> str:
+    payload = {
+        "model": model,
+        "temperature": round(float(temperature), 3),
+        "messages": [[m.get("role"), _normalize(m.get("content", ""))] for m in messages],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _DiskTier:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            with self._lock:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+            return None
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+
+class LLMResponseCache:
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 86400, disk_path: Optional[str] = None):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._disk = _DiskTier(disk_path) if disk_path else None
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @property
+    def has_disk(self) -> bool:
+        return self._disk is not None
+
+    @staticmethod
+    def should_cache(temperature: float, flag: Optional[bool]) -> bool:
+        if flag is not None:
+            return flag
+        return float(temperature) == 0.0
+
+    def note_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._memory.set(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        if not value:
+            return
+        self._memory.set(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value, self.ttl)
+
+    def stats(self) -> dict:
+        memory = self._memory.stats()
+        with self._lock:
+            lookups = memory["hits"] + self.disk_hits + self.misses
+            return {
+                "memory": memory,
+                "disk_enabled": self.has_disk,
+                "memory_hits": memory["hits"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round((memory["hits"] + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _cache_from_env() -> Optional[LLMResponseCache]:
+    if os.getenv("LLM_CACHE_ENABLED", "1") in ("0", "false", "False"):
+        return None
+    ttl = float(os.getenv("LLM_CACHE_TTL", "86400"))
+    return LLMResponseCache(
+        maxsize=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+        ttl=ttl or None,
+        disk_path=os.getenv("LLM_CACHE_DB") or None,
+    )
+
+
+response_cache: Optional[LLMResponseCache] = _cache_from_env()
+
+
+def response_cache_stats() -> dict:
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
@@ -0,0 +1,236 @@
+import asyncio
+import os
+import random
+import re
+import time
+import weakref
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+###############################################################
+# FOURNISSEURS LLM
+###############################################################
+# LLM_PROVIDER : fournisseur par défaut ("openai" ou "echo")
+# Le fournisseur, le modèle et la température peuvent aussi être choisis par
+# requête (ChatRequest) ou par projet (Project.llmProvider/llmModel/...).
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_POOL_SIZE = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+
+class UnknownProviderError(ValueError):
+    pass
+
+
+class LLMProvider:
+    name = ""
+    default_model = ""
+
+    def complete(self, messages: list[dict], model: str, temperature: float) -> str:
+        raise NotImplementedError
+
+    def stream(self, messages: list[dict], model: str, temperature: float) -> Iterator[str]:
+        raise NotImplementedError
+
+    async def acomplete(self, messages: list[dict], model: str, temperature: float) -> str:
+        raise NotImplementedError
+
+    def astream(self, messages: list[dict], model: str, temperature: float) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Libère les connexions ouvertes par le chemin async."""
+
+
+def _backoff(attempt: int) -> float:
+    # Exponentiel avec « full jitter »
+    return random.uniform(0, LLM_BACKOFF_BASE * (2 ** attempt))
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    API OpenAI (ou compatible via OPENAI_BASE_URL). Les clients sont créés à
+    la première utilisation ; un client async (et son pool httpx) par boucle
+    asyncio, fermé par aclose() sur sa boucle (arrêt de l'application).
+    """
+    name = "openai"
+    default_model = "gpt-4o-mini"
+
+    def __init__(self):
+        self._client = None
+        # Boucle → client : l'entrée disparaît avec sa boucle
+        self._aclients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def _sync_client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+            )
+        return self._client
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+            # Clients de boucles fermées sans aclose() : abandonnés, leurs
+            # sockets ne peuvent plus être fermés depuis une autre boucle
+            for stale in [l for l in self._aclients if l.is_closed()]:
+                del self._aclients[stale]
+            client = self._aclients[loop] = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                max_retries=0,  # retries gérés ici (backoff + jitter)
+                timeout=LLM_TIMEOUT,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_POOL_SIZE,
+                        max_keepalive_connections=LLM_POOL_SIZE,
+                    ),
+                    timeout=LLM_TIMEOUT,
+                ),
+            )
+        return client
+
+    async def aclose(self) -> None:
+        """Ferme le client de la boucle courante."""
+        client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    @staticmethod
+    def _retryable():
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+        return (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+    def complete(self, messages, model, temperature):
+        resp = self._sync_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        return (resp.choices[0].message.content or "").strip()
+
+    def stream(self, messages, model, temperature):
+        stream = self._sync_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            stream.close()
+
+    async def _acreate(self, **kwargs):
+        client = self._async_client()
+        retryable = self._retryable()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                return await client.chat.completions.create(**kwargs)
+            except retryable:
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+
+    async def acomplete(self, messages, model, temperature):
+        resp = await self._acreate(model=model, messages=messages, temperature=temperature)
+        return (resp.choices[0].message.content or "").strip()
+
+    async def astream(self, messages, model, temperature):
+        # Les retries ne s'appliquent qu'à l'ouverture du flux
+        stream = await self._acreate(model=model, messages=messages, temperature=temperature, stream=True)
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            await stream.close()
+
+
+class EchoProvider(LLMProvider):
+    """
+    Fournisseur local déterministe pour les benchmarks hors-ligne : renvoie le
+    dernier message utilisateur, après `latency_ms` puis au rythme de
+    `tokens_per_sec` (0 = instantané).
+    ECHO_LATENCY_MS / ECHO_TOKENS_PER_SEC configurent l'instance par défaut.
+    """
+    name = "echo"
+    default_model = "echo-1"
+
+    def __init__(self, latency_ms: float = 0.0, tokens_per_sec: float = 0.0):
+        self.latency_ms = latency_ms
+        self.tokens_per_sec = tokens_per_sec
+
+    def _tokens(self, messages, model):
+        last = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        return re.findall(r"\S+\s*", f"[{model}] {last}")
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def complete(self, messages, model, temperature):
+        return "".join(self.stream(messages, model, temperature)).strip()
+
+    def stream(self, messages, model, temperature):
+        time.sleep(self.latency_ms / 1000)
+        delay = self._token_delay()
+        for tok in self._tokens(messages, model):
+            if delay:
+                time.sleep(delay)
+            yield tok
+
+    async def acomplete(self, messages, model, temperature):
+        parts = [tok async for tok in self.astream(messages, model, temperature)]
+        return "".join(parts).strip()
+
+    async def astream(self, messages, model, temperature):
+        await asyncio.sleep(self.latency_ms / 1000)
+        delay = self._token_delay()
+        for tok in self._tokens(messages, model):
+            if delay:
+                await asyncio.sleep(delay)
+            yield tok
+
+
+PROVIDERS: Dict[str, LLMProvider] = {
+    "openai": OpenAIProvider(),
+    "echo": EchoProvider(
+        latency_ms=float(os.getenv("ECHO_LATENCY_MS", "0")),
+        tokens_per_sec=float(os.getenv("ECHO_TOKENS_PER_SEC", "0")),
+    ),
+}
+
+DEFAULT_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+
+
+def register_provider(provider: LLMProvider) -> None:
+    PROVIDERS[provider.name] = provider
+
+
+async def aclose_providers() -> None:
+    """À appeler avant l'arrêt de la boucle (lifespan de l'app)."""
+    for provider in PROVIDERS.values():
+        await provider.aclose()
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    name = name or DEFAULT_PROVIDER
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise UnknownProviderError(f"Fournisseur LLM inconnu : {name}")
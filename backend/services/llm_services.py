@@ -1,16 +1,229 @@
+import asyncio
 import os
-from openai import OpenAI
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from .llm_cache import cache_key, response_cache
+from .llm_providers import LLMProvider, get_provider
 
-def get_llm_response(messages: list[dict], model: str = "gpt-4o-mini", temperature: float = 0.7) -> str:
+DEFAULT_TEMPERATURE = 0.7
+
+# OPENAI_BASE_URL permet de pointer vers un serveur compatible OpenAI local
+# (fake server de test, vLLM, Ollama...). LLM_PROVIDER=echo permet de tout
+# faire tourner hors-ligne (voir llm_providers.py).
+
+
+def _resolve(provider: Optional[str], model: Optional[str], temperature: Optional[float]):
+    p = get_provider(provider)
+    return p, model or p.default_model, DEFAULT_TEMPERATURE if temperature is None else temperature
+
+
+def _cache_lookup(
+    p: LLMProvider, messages: list[dict], model: str, temperature: float, cache: Optional[bool]
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Retourne (clé, réponse en cache). clé=None si la requête n'est pas
+    cacheable (cache désactivé, température > 0 sans opt-in, ou cache=False).
+    """
+    if response_cache is None:
+        return None, None
+    if not response_cache.should_cache(temperature, cache):
+        response_cache.note_bypass()
+        return None, None
+    key = cache_key(f"{p.name}:{model}", temperature, messages)
+    return key, response_cache.get(key)
+
+
+def get_llm_response(
+    messages: list[dict],
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    cache: Optional[bool] = None,
+    provider: Optional[str] = None,
+) -> str:
     """
     messages: liste de dicts au format OpenAI
     Retourne le texte de la réponse de l'assistant
+    cache: None = politique par défaut (température 0), True = forcer, False = contourner
+    provider/model/temperature: défauts du fournisseur si None
+    """
+    p, model, temperature = _resolve(provider, model, temperature)
+    key, cached = _cache_lookup(p, messages, model, temperature, cache)
+    if cached is not None:
+        return cached
+
+    reply = p.complete(messages, model, temperature)
+    if key:
+        response_cache.set(key, reply)
+    return reply
+
+
+def stream_llm_response(
+    messages: list[dict],
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    provider: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Variante streaming : produit les fragments de texte au fil de l'eau.
+    """
+    p, model, temperature = _resolve(provider, model, temperature)
+    yield from p.stream(messages, model, temperature)
+
+
+###############################################################
+# CHEMIN ASYNCHRONE (limites de concurrence)
+###############################################################
+# LLM_MAX_CONCURRENCY          : appels LLM simultanés max (tous users)
+# LLM_MAX_CONCURRENCY_PER_USER : appels simultanés max par utilisateur
+# LLM_QUEUE_TIMEOUT            : attente max d'un créneau (s) avant LLMBusyError
+# Timeout / retries / pool HTTP : voir llm_providers.OpenAIProvider
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONCURRENCY_PER_USER = int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER", "2"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+
+class LLMBusyError(Exception):
+    """Aucun créneau LLM libéré dans le délai LLM_QUEUE_TIMEOUT."""
+
+
+class _SlotPool:
     """
-    resp = _client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-    )
-    return (resp.choices[0].message.content or "").strip()
+    Sémaphores globaux et par utilisateur, recréés si la boucle asyncio
+    change (un sémaphore est lié à sa boucle).
+    """
+
+    def __init__(self):
+        self._loop = None
+        self.global_slots: Optional[asyncio.Semaphore] = None
+        self.user_slots: Dict[str, List] = {}  # user_id → [Semaphore, nb d'utilisateurs]
+
+    def ensure(self) -> "_SlotPool":
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.global_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+            self.user_slots = {}
+        return self
+
+
+_pool = _SlotPool()
+
+
+class _slot:
+    """Réserve un créneau global + un créneau utilisateur (async with)."""
+
+    def __init__(self, user_id: Optional[str]):
+        self.user_id = user_id
+        self.user_entry = None
+
+    async def __aenter__(self):
+        pool = _pool.ensure()
+        if self.user_id:
+            entry = pool.user_slots.get(self.user_id)
+            if entry is None:
+                entry = pool.user_slots[self.user_id] = [asyncio.Semaphore(LLM_MAX_CONCURRENCY_PER_USER), 0]
+            entry[1] += 1
+            self.user_entry = entry
+        try:
+            if self.user_entry:
+                await asyncio.wait_for(self.user_entry[0].acquire(), LLM_QUEUE_TIMEOUT)
+            try:
+                await asyncio.wait_for(pool.global_slots.acquire(), LLM_QUEUE_TIMEOUT)
+            except BaseException:
+                if self.user_entry:
+                    self.user_entry[0].release()
+                raise
+        except asyncio.TimeoutError:
+            self._forget_user()
+            raise LLMBusyError("Trop de requêtes LLM en cours, réessaie dans un instant.")
+        except BaseException:
+            self._forget_user()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def release(self):
+        # Synchrone : utilisable dans le finally d'un générateur qu'on ferme
+        _pool.global_slots.release()
+        if self.user_entry:
+            self.user_entry[0].release()
+        self._forget_user()
+
+    def _forget_user(self):
+        if not self.user_entry:
+            return
+        self.user_entry[1] -= 1
+        if self.user_entry[1] == 0 and _pool.user_slots.get(self.user_id) is self.user_entry:
+            del _pool.user_slots[self.user_id]
+
+
+async def _acache_lookup(
+    p: LLMProvider, messages: list[dict], model: str, temperature: float, cache: Optional[bool]
+) -> Tuple[Optional[str], Optional[str]]:
+    if response_cache is not None and response_cache.has_disk:
+        return await asyncio.to_thread(_cache_lookup, p, messages, model, temperature, cache)
+    return _cache_lookup(p, messages, model, temperature, cache)
+
+
+async def _acache_store(key: Optional[str], reply: str) -> None:
+    if not key:
+        return
+    if response_cache.has_disk:
+        await asyncio.to_thread(response_cache.set, key, reply)
+    else:
+        response_cache.set(key, reply)
+
+
+async def aget_llm_response(
+    messages: list[dict],
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    user_id: Optional[str] = None,
+    cache: Optional[bool] = None,
+    provider: Optional[str] = None,
+) -> str:
+    """Version async de get_llm_response (ne bloque pas de thread)."""
+    p, model, temperature = _resolve(provider, model, temperature)
+    key, cached = await _acache_lookup(p, messages, model, temperature, cache)
+    if cached is not None:
+        return cached
+
+    async with _slot(user_id):
+        reply = await p.acomplete(messages, model, temperature)
+
+    await _acache_store(key, reply)
+    return reply
+
+
+async def astream_llm_response(
+    messages: list[dict],
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    user_id: Optional[str] = None,
+    cache: Optional[bool] = None,
+    provider: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Version async de stream_llm_response.
+    Une réponse en cache est renvoyée en un seul fragment.
+    """
+    p, model, temperature = _resolve(provider, model, temperature)
+    key, cached = await _acache_lookup(p, messages, model, temperature, cache)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    # Créneau tenu pendant tout le flux, rendu même si le consommateur ferme
+    # le générateur entre deux fragments (client SSE déconnecté)
+    slot = await _slot(user_id).__aenter__()
+    try:
+        async for delta in p.astream(messages, model, temperature):
+            parts.append(delta)
+            yield delta
+    finally:
+        slot.release()
+
+    await _acache_store(key, "".join(parts).strip())
@@ -1,15 +1,244 @@
-import requests
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
 
-N8N_WEBHOOK_URL = "https://jabran-ellaoui.app.n8n.cloud/webhook/project-orchestrator"
+import httpx
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-def notify_n8n(event: str, project_id: str):
-    payload = {"event": event, "project_id": project_id}
-    print(f"[N8N] Attempting webhook → {N8N_WEBHOOK_URL}")
-    print(f"[N8N] Payload: {payload}")
+from database.models import N8nOutbox
+from database.session import AsyncSessionLocal
 
-    try:
-        response = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=10)
-        print(f"[N8N] Status: {response.status_code}")
-        print(f"[N8N] Response: {response.text}")
-    except Exception as e:
-        print(f"[N8N] Erreur d’envoi du webhook : {e}")
+###############################################################
+# OUTBOX DES WEBHOOKS N8N
+###############################################################
+# Les routes n'appellent plus n8n : elles écrivent une ligne dans `n8n_outbox`
+# (durable, survit à un redémarrage) et un dispatcher asyncio, lancé au
+# démarrage de l'app, envoie les lignes dues avec un client HTTP poolé.
+# Échec → nouvel essai avec backoff ; après N8N_MAX_ATTEMPTS → 'dead'.
+#
+# N8N_WEBHOOK_URL          : URL du webhook (un stub HTTP local pour les tests)
+# N8N_TIMEOUT              : timeout d'un envoi (s)
+# N8N_MAX_ATTEMPTS         : tentatives avant passage en 'dead'
+# N8N_BACKOFF_BASE         : base du backoff exponentiel avec jitter (s)
+# N8N_COALESCE_WINDOW      : un même (événement, projet) reçu dans cette fenêtre
+#                            (s) est fusionné avec la ligne existante
+# N8N_POLL_INTERVAL        : période de scrutation de l'outbox (s)
+# N8N_BATCH_SIZE           : lignes envoyées en parallèle par tour
+# N8N_SENT_RETENTION       : durée de conservation des lignes 'sent' (h) ;
+#                            purge faite par le dispatcher une fois par heure
+# N8N_DISPATCHER_ENABLED   : 0 pour ne pas lancer le dispatcher dans ce process
+
+N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "https://jabran-ellaoui.app.n8n.cloud/webhook/project-orchestrator")
+N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", "10"))
+N8N_MAX_ATTEMPTS = int(os.getenv("N8N_MAX_ATTEMPTS", "6"))
+N8N_BACKOFF_BASE = float(os.getenv("N8N_BACKOFF_BASE", "2"))
+N8N_COALESCE_WINDOW = float(os.getenv("N8N_COALESCE_WINDOW", "30"))
+N8N_POLL_INTERVAL = float(os.getenv("N8N_POLL_INTERVAL", "1"))
+N8N_BATCH_SIZE = int(os.getenv("N8N_BATCH_SIZE", "20"))
+N8N_SENT_RETENTION = float(os.getenv("N8N_SENT_RETENTION", "168"))
+N8N_DISPATCHER_ENABLED = os.getenv("N8N_DISPATCHER_ENABLED", "1") not in ("0", "false", "False")
+
+# Une ligne restée 'sending' plus longtemps (process tué pendant l'envoi)
+# est remise en file.
+_STALE_SENDING = timedelta(seconds=max(60.0, N8N_TIMEOUT * 3))
+_PURGE_INTERVAL = 3600.0
+
+
+def _backoff(attempts: int) -> float:
+    return random.uniform(0, N8N_BACKOFF_BASE * (2 ** (attempts - 1)))
+
+
+async def enqueue_event(
+    db: AsyncSession,
+    event: str,
+    project_id: str,
+    payload: Optional[dict] = None,
+) -> Tuple[int, bool]:
+    """
+    Ajoute un événement à l'outbox et valide la transaction.
+    Retourne (id de la ligne, True si fusionné avec un doublon récent).
+    """
+    now = datetime.utcnow()
+    duplicate = await db.scalar(
+        select(N8nOutbox.id)
+        .where(
+            N8nOutbox.project_id == project_id,
+            N8nOutbox.event == event,
+            N8nOutbox.createdAt >= now - timedelta(seconds=N8N_COALESCE_WINDOW),
+            # Une ligne déjà réservée ('sending') ou envoyée ne repartira pas :
+            # fusionner dedans perdrait l'événement
+            N8nOutbox.status == "pending",
+        )
+        .order_by(N8nOutbox.createdAt.desc())
+        .limit(1)
+    )
+    if duplicate is not None:
+        # UPDATE conditionnel : si le dispatcher a réservé la ligne entre-temps,
+        # rien n'est fusionné et l'événement a sa propre ligne
+        res = await db.execute(
+            update(N8nOutbox)
+            .where(N8nOutbox.id == duplicate, N8nOutbox.status == "pending")
+            .values(coalesced=N8nOutbox.coalesced + 1)
+        )
+        if res.rowcount:
+            await db.commit()
+            return duplicate, True
+
+    row = N8nOutbox(
+        event=event,
+        project_id=project_id,
+        payload={"event": event, "project_id": project_id, **(payload or {})},
+        status="pending",
+        nextAttemptAt=now,
+        createdAt=now,
+    )
+    db.add(row)
+    await db.commit()
+    dispatcher.wake()
+    return row.id, False
+
+
+async def outbox_stats(db: AsyncSession) -> dict:
+    rows = await db.execute(select(N8nOutbox.status, func.count()).group_by(N8nOutbox.status))
+    return {"url": N8N_WEBHOOK_URL, **{status: count for status, count in rows}}
+
+
+class OutboxDispatcher:
+    """Boucle d'envoi de l'outbox (une tâche asyncio par process)."""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._next_purge = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._client = httpx.AsyncClient(
+                timeout=N8N_TIMEOUT,
+                limits=httpx.Limits(max_connections=N8N_BATCH_SIZE, max_keepalive_connections=N8N_BATCH_SIZE),
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if time.monotonic() >= self._next_purge:
+                    await self.purge_sent()
+                    self._next_purge = time.monotonic() + _PURGE_INTERVAL
+                sent = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[N8N] Erreur du dispatcher : {e}")
+                sent = 0
+            if sent:
+                continue  # d'autres lignes sont peut-être dues
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), N8N_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> list:
+        """
+        Remet en file les envois abandonnés, puis réserve les lignes dues
+        (UPDATE conditionnel : sûr entre plusieurs workers). Le rattrapage
+        a lieu à chaque tour : un worker tué pendant un envoi n'est pas
+        forcément suivi d'un redémarrage de ce process.
+        """
+        now = datetime.utcnow()
+        async with self._session_factory() as db:
+            await db.execute(
+                update(N8nOutbox)
+                .where(N8nOutbox.status == "sending", N8nOutbox.nextAttemptAt < now - _STALE_SENDING)
+                .values(status="pending")
+            )
+            due = (await db.execute(
+                select(N8nOutbox.id, N8nOutbox.payload)
+                .where(N8nOutbox.status == "pending", N8nOutbox.nextAttemptAt <= now)
+                .order_by(N8nOutbox.nextAttemptAt)
+                .limit(N8N_BATCH_SIZE)
+            )).all()
+            claimed = []
+            for row_id, payload in due:
+                res = await db.execute(
+                    update(N8nOutbox)
+                    .where(N8nOutbox.id == row_id, N8nOutbox.status == "pending")
+                    .values(status="sending", nextAttemptAt=now)
+                )
+                if res.rowcount:
+                    claimed.append((row_id, payload))
+            await db.commit()
+        return claimed
+
+    async def purge_sent(self) -> int:
+        """Supprime les lignes envoyées depuis plus de N8N_SENT_RETENTION heures."""
+        cutoff = datetime.utcnow() - timedelta(hours=N8N_SENT_RETENTION)
+        async with self._session_factory() as db:
+            res = await db.execute(
+                delete(N8nOutbox).where(N8nOutbox.status == "sent", N8nOutbox.sentAt < cutoff)
+            )
+            await db.commit()
+        return res.rowcount
+
+    async def _send(self, row_id: int, payload: dict) -> Tuple[int, Optional[str]]:
+        try:
+            resp = await self._client.post(N8N_WEBHOOK_URL, json=payload)
+            if resp.status_code < 300:
+                return row_id, None
+            return row_id, f"HTTP {resp.status_code}: {resp.text[:200]}"
+        except Exception as e:
+            # Toute erreur (URL invalide, payload non sérialisable...) est
+            # enregistrée sur sa ligne : elle ne doit pas faire échouer le lot
+            # ni laisser les autres lignes en 'sending'
+            return row_id, f"{e.__class__.__name__}: {e}"
+
+    async def dispatch_once(self) -> int:
+        """Envoie un lot de lignes dues ; retourne le nombre de lignes traitées."""
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+
+        results = await asyncio.gather(*(self._send(row_id, payload) for row_id, payload in claimed))
+        now = datetime.utcnow()
+        async with self._session_factory() as db:
+            for row_id, error in results:
+                row = await db.get(N8nOutbox, row_id)
+                row.attempts += 1
+                if error is None:
+                    row.status, row.sentAt, row.lastError = "sent", now, None
+                    print(f"[N8N] Envoyé : {row.event} (projet {row.project_id})")
+                elif row.attempts >= N8N_MAX_ATTEMPTS:
+                    row.status, row.lastError = "dead", error
+                    print(f"[N8N] Abandon après {row.attempts} tentatives : {row.event} (projet {row.project_id}) — {error}")
+                else:
+                    row.status, row.lastError = "pending", error
+                    row.nextAttemptAt = now + timedelta(seconds=_backoff(row.attempts))
+            await db.commit()
+        return len(claimed)
+
+
+dispatcher = OutboxDispatcher()
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import re
+from typing import Optional
+
+from database.models import Note
+
+###############################################################
+# CHAMPS DÉRIVÉS DU CONTENU D'UNE NOTE
+###############################################################
+# wordCount, résumé extractif et empreinte (contentHash) sont calculés à
+# l'écriture, une seule fois par version du contenu : si l'empreinte ne
+# change pas, rien n'est recalculé. Un résumé fourni par l'utilisateur est
+# conservé (autoSummary=False) ; sinon le résumé est généré (autoSummary=True)
+# et suit les modifications du contenu.
+
+SUMMARY_MAX_CHARS = int(os.getenv("NOTE_SUMMARY_MAX_CHARS", "300"))
+
+# Marqueurs markdown en début de ligne : listes, citations, cases à cocher
+_HEADING_RE = re.compile(r"^\s*#{1,6}\s+")
+_LINE_MARKUP_RE = re.compile(r"^\s*(?:[-*+]\s+(?:\[[ xX]\]\s+)?|\d+[.)]\s+|>\s*)")
+_INLINE_MARKUP_RE = re.compile(r"(\*\*|__|`|~~)")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def word_count(content: str) -> int:
+    return len(content.split())
+
+
+def extractive_summary(content: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Premières phrases du texte (sans balisage markdown), dans la limite de `max_chars`."""
+    lines = [line for line in content.splitlines() if line.strip()]
+    # Les titres répètent souvent le titre de la note : ignorés s'il y a du texte
+    body = [line for line in lines if not _HEADING_RE.match(line)] or [_HEADING_RE.sub("", line) for line in lines]
+    text = _INLINE_MARKUP_RE.sub("", " ".join(_LINE_MARKUP_RE.sub("", line).strip() for line in body))
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= max_chars:
+        return text
+
+    summary = ""
+    for sentence in _SENTENCE_END_RE.split(text):
+        candidate = f"{summary} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        summary = candidate
+    if summary:
+        return summary
+    # Première phrase trop longue : coupe au dernier mot entier
+    return text[:max_chars].rsplit(" ", 1)[0].rstrip(",;:") + "…"
+
+
+def derived_fields(content: str, summary: Optional[str] = None) -> dict:
+    """Colonnes dérivées pour une insertion (résumé utilisateur prioritaire)."""
+    return {
+        "contentHash": content_hash(content),
+        "wordCount": word_count(content),
+        "summary": summary if summary else extractive_summary(content),
+        "autoSummary": not summary,
+    }
+
+
+def apply_content(note: Note, content: Optional[str] = None, summary: Optional[str] = None, summary_set: bool = False) -> bool:
+    """
+    Met à jour le contenu / résumé d'une note et ses champs dérivés.
+    `summary_set` indique que le client a envoyé `summary` (None ou "" =
+    revenir au résumé automatique). Retourne False si rien n'a été recalculé.
+    """
+    if content is not None:
+        note.content = content
+    if summary_set:
+        note.autoSummary = not summary
+        note.summary = summary or None
+
+    digest = content_hash(note.content)
+    changed = digest != note.contentHash
+    if changed:
+        note.contentHash = digest
+        note.wordCount = word_count(note.content)
+    # Lignes antérieures (autoSummary NULL) : un résumé existant vient de l'utilisateur
+    if note.autoSummary is None:
+        note.autoSummary = not note.summary
+    if note.autoSummary and (changed or not note.summary):
+        note.summary = extractive_summary(note.content)
+        return True
+    return changed
@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .responses import FastJSONResponse
+
+###############################################################
+# PAGINATION PAR CURSEUR (keyset) + PROJECTION DE CHAMPS
+###############################################################
+# Le curseur encode (createdAt, id) de la dernière ligne renvoyée ; la page
+# suivante filtre `(createdAt, id) < curseur` sur l'ordre décroissant, ce qui
+# reste en O(limit) quelle que soit la profondeur (pas d'OFFSET).
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_CURSOR_CREATED = "_cursor_created"
+_CURSOR_ID = "_cursor_id"
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created), str(row_id)
+    except Exception:
+        raise ValueError("Curseur invalide")
+
+
+def select_fields(
+    fields: Optional[str],
+    available: Dict[str, Any],
+    default: Sequence[str],
+) -> Dict[str, Any]:
+    """
+    `fields` = "id,title,pinned" → colonnes SQLAlchemy correspondantes.
+    Lève ValueError si un champ demandé n'existe pas.
+    """
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(default)
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        raise ValueError(f"Champs inconnus : {', '.join(unknown)}")
+    return {n: available[n] for n in dict.fromkeys(names)}
+
+
+def keyset_statement(stmt: Select, created_col, id_col, cursor: Optional[str], limit: Optional[int]) -> Select:
+    """
+    Applique tri (createdAt DESC, id DESC), curseur et limite (+1 pour
+    détecter la page suivante) à un select() de colonnes.
+    """
+    stmt = stmt.add_columns(created_col.label(_CURSOR_CREATED), id_col.label(_CURSOR_ID))
+    if cursor:
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(*decode_cursor(cursor)))
+    stmt = stmt.order_by(created_col.desc(), id_col.desc())
+    if limit:
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+def split_page(rows: Sequence, limit: Optional[int]) -> Tuple[list, Optional[str]]:
+    """(lignes de la page, curseur_suivant) à partir des `limit + 1` lignes lues."""
+    rows = list(rows)
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, _CURSOR_CREATED), getattr(last, _CURSOR_ID))
+    return rows, next_cursor
+
+
+async def keyset_page(
+    db: AsyncSession,
+    stmt: Select,
+    created_col,
+    id_col,
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> Tuple[list, Optional[str]]:
+    """Exécute la requête paginée ; retourne (lignes, curseur_suivant)."""
+    result = await db.execute(keyset_statement(stmt, created_col, id_col, cursor, limit))
+    return split_page(result.all(), limit)
+
+
+def paged_response(rows: list, fields: Dict[str, Any], next_cursor: Optional[str]) -> FastJSONResponse:
+    items: List[dict] = [{name: getattr(r, name) for name in fields} for r in rows]
+    resp = FastJSONResponse(items)
+    if next_cursor:
+        resp.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return resp
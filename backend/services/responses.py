@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+###############################################################
+# RÉPONSE JSON RAPIDE (orjson)
+###############################################################
+# Pour les listes construites à la main (dicts de colonnes SQL) : orjson
+# sérialise directement str / int / bool / None / datetime, sans le passage
+# par jsonable_encoder. Les dates sortent au même format ISO 8601 qu'avant.
+
+
+def _fallback(value: Any) -> Any:
+    # Types inconnus d'orjson (Decimal, modèles Pydantic...) : encodeur FastAPI
+    return jsonable_encoder(value)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_fallback, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,153 @@
+import re
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+###############################################################
+# INDEX FTS5 DES NOTES
+###############################################################
+# La table virtuelle `notes_fts` est tenue à jour par des triggers SQL créés
+# par la migration 0014 (database/migrations.py) : les écritures ORM comme le
+# SQL brut (seed, reset_user_data) restent synchronisées sans code applicatif.
+# `notes` a une clé TEXT : son rowid implicite peut être renuméroté par un
+# VACUUM. Le rowid FTS est donc une clé entière stable (`notes_fts_keys`,
+# INTEGER PRIMARY KEY) et chaque ligne porte aussi `note_id`, colonne de
+# jointure vers `notes`. `user_id` est indexé pour que MATCH ne retienne que
+# les notes de l'utilisateur avant le classement bm25.
+# Sur PostgreSQL, search_notes() interroge la colonne tsvector
+# notes."searchVector" (index GIN, triggers de la migration 0015).
+
+FTS_TABLE = "notes_fts"
+FTS_KEYS_TABLE = "notes_fts_keys"
+
+# Colonnes cherchées par la saisie utilisateur
+FTS_TEXT_COLUMNS = ("title", "content", "summary", "tags")
+
+# Poids bm25 par colonne : title, content, summary, tags, user_id (filtre,
+# hors score)
+BM25_WEIGHTS = (10.0, 1.0, 3.0, 5.0, 0.0)
+
+_TAGS_OF_NOTE = (
+    "SELECT COALESCE(group_concat(t.name, ' '), '') "
+    "FROM note_tags nt JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id = {ref}"
+)
+
+
+def rebuild_notes_fts(engine: Engine) -> None:
+    """Reconstruit entièrement l'index (corruption, import hors triggers)."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+        _fill(conn)
+
+
+def _fill(conn) -> None:
+    """Même remplissage que la migration 0014."""
+    conn.exec_driver_sql(f"""
+        INSERT OR IGNORE INTO {FTS_KEYS_TABLE}(note_id) SELECT id FROM notes
+    """)
+    conn.exec_driver_sql(f"""
+        DELETE FROM {FTS_KEYS_TABLE}
+        WHERE note_id NOT IN (SELECT id FROM notes)
+    """)
+    conn.exec_driver_sql(f"""
+        INSERT INTO {FTS_TABLE}(rowid, title, content, summary, tags, user_id, note_id)
+        SELECT k.id, n.title, n.content, COALESCE(n.summary, ''),
+               ({_TAGS_OF_NOTE.format(ref="n.id")}), n.user_id, n.id
+        FROM notes n JOIN {FTS_KEYS_TABLE} k ON k.note_id = n.id
+    """)
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    Transforme la saisie utilisateur en requête FTS5 sûre :
+    chaque mot devient une phrase entre guillemets (pas d'injection de
+    syntaxe FTS), le dernier mot est en préfixe pour la recherche « à la frappe ».
+    """
+    terms = [t for t in q.split() if t.strip('"')]
+    if not terms:
+        return None
+    quoted = [_fts_phrase(t) for t in terms]
+    quoted[-1] += "*"
+    return "{" + " ".join(FTS_TEXT_COLUMNS) + "} : (" + " ".join(quoted) + ")"
+
+
+def user_match_query(user_id: str, match: str) -> str:
+    """Restreint une requête de build_match_query aux notes de `user_id`."""
+    return f"user_id : {_fts_phrase(user_id)} AND {match}"
+
+
+def search_notes(
+    db: Session,
+    user_id: str,
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[dict]:
+    """
+    Recherche classée (bm25) dans les notes d'un utilisateur.
+    Retourne au plus `limit + 1` lignes pour permettre à l'appelant de savoir
+    s'il existe une page suivante sans COUNT(*).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_notes_pg(db, user_id, q, limit, offset)
+
+    match = build_match_query(q)
+    if match is None:
+        return []
+
+    w = ", ".join(str(x) for x in BM25_WEIGHTS)
+    rows = db.execute(
+        text(f"""
+            SELECT n.id, n.title, n.summary, n.pinned, n."createdAt", n."updatedAt",
+                   snippet({FTS_TABLE}, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+                   bm25({FTS_TABLE}, {w}) AS score
+            FROM {FTS_TABLE}
+            JOIN notes n ON n.id = {FTS_TABLE}.note_id
+            WHERE {FTS_TABLE} MATCH :match AND n.user_id = :uid
+            ORDER BY score
+            LIMIT :limit OFFSET :offset
+        """),
+        {"match": user_match_query(user_id, match), "uid": user_id, "limit": limit + 1, "offset": offset},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+###############################################################
+# POSTGRESQL
+###############################################################
+def build_tsquery(q: str) -> Optional[str]:
+    """Équivalent tsquery de build_match_query : mots en ET, dernier en préfixe."""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    terms[-1] += ":*"
+    return " & ".join(terms)
+
+
+def _search_notes_pg(db: Session, user_id: str, q: str, limit: int, offset: int) -> List[dict]:
+    tsq = build_tsquery(q)
+    if tsq is None:
+        return []
+
+    # notes."searchVector" (migration 0015) : poids A-D = titre, tags, résumé,
+    # contenu, dans l'ordre de BM25_WEIGHTS ; index GIN ix_notes_search_vector.
+    # score = -ts_rank pour garder « plus petit = plus pertinent » comme bm25.
+    rows = db.execute(
+        text("""
+            SELECT n.id, n.title, n.summary, n.pinned, n."createdAt", n."updatedAt",
+                   ts_headline('simple', n.content, query,
+                               'StartSel=<mark>, StopSel=</mark>, MaxWords=16, MinWords=4') AS snippet,
+                   -ts_rank(n."searchVector", query) AS score
+            FROM notes n, to_tsquery('simple', unaccent(:tsq)) AS query
+            WHERE n.user_id = :uid AND n."searchVector" @@ query
+            ORDER BY score, n.id
+            LIMIT :limit OFFSET :offset
+        """),
+        {"tsq": tsq, "uid": user_id, "limit": limit + 1, "offset": offset},
+    ).mappings().all()
+    return [dict(r) for r in rows]
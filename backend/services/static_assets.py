@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+try:  # optionnel : sans le paquet `brotli`, seules les variantes .gz sont produites
+    import brotli
+except ImportError:
+    brotli = None
+
+###############################################################
+# FRONTEND STATIQUE (export Next.js dans frontend_dist)
+###############################################################
+# Au build (build_frontend.py), chaque fichier texte reçoit ses variantes
+# précompressées `.br` / `.gz`. Au démarrage, StaticManifest parcourt une seule
+# fois frontend_dist : chemin URL → fichier, stat, ETag et variantes. Une
+# requête ne touche plus le disque avant l'envoi du fichier choisi.
+#
+# Cache-Control :
+#   _next/static/, assets/ : noms hashés → immutable, un an
+#   le reste (HTML, manifestes) : no-cache → revalidation par ETag (304)
+# Fichier absent : index.html (fallback SPA), sauf sous NO_FALLBACK_PREFIXES
+# où une page HTML à la place d'un script ou d'une image serait un piège → 404
+
+COMPRESSIBLE_SUFFIXES = {
+    ".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".xml",
+    ".map", ".ico", ".webmanifest", ".rsc",
+}
+COMPRESS_MIN_SIZE = 512
+# Une variante n'est gardée que si elle fait gagner au moins 10 %
+COMPRESS_MAX_RATIO = 0.9
+
+IMMUTABLE_PREFIXES = ("_next/static/", "assets/")
+NO_FALLBACK_PREFIXES = IMMUTABLE_PREFIXES + ("static/",)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Content-Encoding → suffixe du fichier précompressé, par ordre de préférence
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def precompress_dir(root: Path) -> Dict[str, int]:
+    """Écrit les variantes .br/.gz à côté des fichiers compressibles de `root`."""
+    written = {"gzip": 0, "br": 0, "skipped": 0}
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if len(data) < COMPRESS_MIN_SIZE:
+            written["skipped"] += 1
+            continue
+
+        variants = {"gzip": (".gz", gzip.compress(data, compresslevel=9, mtime=0))}
+        if brotli is not None:
+            variants["br"] = (".br", brotli.compress(data, quality=11))
+        for encoding, (suffix, blob) in variants.items():
+            target = path.with_name(path.name + suffix)
+            if len(blob) <= len(data) * COMPRESS_MAX_RATIO:
+                target.write_bytes(blob)
+                written[encoding] += 1
+            elif target.exists():
+                target.unlink()
+    return written
+
+
+def accepted_encodings(header: str) -> set:
+    """Encodages acceptés d'un en-tête Accept-Encoding (q=0 exclu)."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "").lower()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+@dataclass
+class StaticFile:
+    path: Path
+    stat: os.stat_result
+    etag: str
+    media_type: str
+    cache_control: str
+    # Content-Encoding → (fichier, stat)
+    variants: Dict[str, tuple] = field(default_factory=dict)
+
+
+class StaticManifest:
+    """Index en mémoire de frontend_dist, construit une fois au démarrage."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.files: Dict[str, StaticFile] = {}
+        self.index: Optional[StaticFile] = None
+        self._scan()
+
+    def _scan(self) -> None:
+        if not self.root.is_dir():
+            return
+        compressed_suffixes = tuple(suffix for _, suffix in _ENCODINGS)
+        for path in self.root.rglob("*"):
+            if not path.is_file():
+                continue
+            # foo.js.gz n'est qu'une variante si foo.js existe
+            if path.name.endswith(compressed_suffixes) and path.with_suffix("").is_file():
+                continue
+            rel = path.relative_to(self.root).as_posix()
+            self.files[rel] = self._entry(path, rel)
+
+        # Mêmes résolutions que l'ancien fallback : dossier → dossier/index.html
+        for rel, entry in list(self.files.items()):
+            if rel.endswith("/index.html"):
+                self.files.setdefault(rel[: -len("/index.html")], entry)
+        self.index = self.files.get("index.html")
+
+    def _entry(self, path: Path, rel: str) -> StaticFile:
+        stat = path.stat()
+        digest = hashlib.md5(path.read_bytes(), usedforsecurity=False).hexdigest()[:16]
+        immutable = rel.startswith(IMMUTABLE_PREFIXES)
+        entry = StaticFile(
+            path=path,
+            stat=stat,
+            etag=f'"{digest}"',
+            media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            cache_control=IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        )
+        for encoding, suffix in _ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                variant_stat = variant.stat()
+                # Variante plus ancienne que la source : build partiel, on l'ignore
+                if variant_stat.st_mtime >= stat.st_mtime:
+                    entry.variants[encoding] = (variant, variant_stat)
+        return entry
+
+    def lookup(self, url_path: str) -> Optional[StaticFile]:
+        return self.files.get(url_path.strip("/"))
+
+    def response(self, request: Request, url_path: str) -> Optional[Response]:
+        """Réponse pour `url_path` (index.html en fallback SPA) ; None si rien à servir."""
+        entry = self.lookup(url_path)
+        if entry is None and not url_path.lstrip("/").startswith(NO_FALLBACK_PREFIXES):
+            # Un asset absent reste un 404 (comme l'ancien montage StaticFiles)
+            entry = self.index
+        if entry is None:
+            return None
+
+        encoding = None
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for candidate, _ in _ENCODINGS:
+            if candidate in entry.variants and candidate in accepted:
+                encoding = candidate
+                break
+
+        etag = entry.etag if encoding is None else f'{entry.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": entry.cache_control}
+        if entry.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+            return Response(status_code=304, headers=headers)
+
+        path, stat = (entry.path, entry.stat) if encoding is None else entry.variants[encoding]
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return FileResponse(path, headers=headers, media_type=entry.media_type, stat_result=stat)
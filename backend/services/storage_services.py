@@ -1,14 +1,152 @@
-from typing import Dict, List
-_conversations: Dict[str, List[dict]] = {}
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database.database import SessionLocal
+from database.models import Conversation, ConversationMessage
+
+###############################################################
+# BACKENDS DE CONVERSATION
+###############################################################
+# CONVERSATION_STORE=sql (défaut) : persistant, partagé entre workers.
+# CONVERSATION_STORE=memory       : dict en process (dev / tests).
+# CONVERSATION_CACHE_SIZE         : nb de conversations gardées en LRU.
+
+
+class ConversationStore:
+    def get(self, conv_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    def create(self, conv_id: str) -> None:
+        raise NotImplementedError
+
+    def append(self, conv_id: str, role: str, content: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryConversationStore(ConversationStore):
+    def __init__(self):
+        self._conversations: Dict[str, List[dict]] = {}
+
+    def get(self, conv_id: str) -> List[dict]:
+        return list(self._conversations.get(conv_id, []))
+
+    def create(self, conv_id: str) -> None:
+        self._conversations.setdefault(conv_id, [])
+
+    def append(self, conv_id: str, role: str, content: str) -> None:
+        self._conversations.setdefault(conv_id, []).append({"role": role, "content": content})
+
+
+class _CachedConversation:
+    __slots__ = ("messages", "last_id")
+
+    def __init__(self):
+        self.messages: List[dict] = []
+        self.last_id = 0
+
+
+class SQLConversationStore(ConversationStore):
+    """
+    Messages stockés en lignes append-only (`conversation_messages`).
+    Les conversations chaudes sont gardées dans un LRU borné ; chaque lecture
+    ne va chercher en base que les messages d'id > dernier id connu, ce qui
+    garde le cache cohérent avec les écritures des autres workers.
+    """
+
+    def __init__(self, session_factory=SessionLocal, cache_size: int = 256):
+        self._session_factory = session_factory
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[str, _CachedConversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, conv_id: str) -> Optional[_CachedConversation]:
+        with self._lock:
+            entry = self._cache.get(conv_id)
+            if entry is not None:
+                self._cache.move_to_end(conv_id)
+            return entry
+
+    def _remember(self, conv_id: str, entry: _CachedConversation) -> None:
+        with self._lock:
+            self._cache[conv_id] = entry
+            self._cache.move_to_end(conv_id)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, conv_id: str) -> List[dict]:
+        entry = self._cached(conv_id) or _CachedConversation()
+        db = self._session_factory()
+        try:
+            rows = (
+                db.query(ConversationMessage.id, ConversationMessage.role, ConversationMessage.content)
+                .filter(
+                    ConversationMessage.conversation_id == conv_id,
+                    ConversationMessage.id > entry.last_id,
+                )
+                .order_by(ConversationMessage.id)
+                .all()
+            )
+        finally:
+            db.close()
+
+        with self._lock:
+            for row in rows:
+                if row.id > entry.last_id:
+                    entry.messages.append({"role": row.role, "content": row.content})
+                    entry.last_id = row.id
+            messages = list(entry.messages)
+        self._remember(conv_id, entry)
+        return messages
+
+    def create(self, conv_id: str) -> None:
+        if self._cached(conv_id) is not None:
+            return
+        db = self._session_factory()
+        try:
+            if db.get(Conversation, conv_id) is None:
+                db.add(Conversation(id=conv_id))
+                db.commit()
+        except IntegrityError:
+            # Créée en parallèle par un autre worker
+            db.rollback()
+        finally:
+            db.close()
+        self._remember(conv_id, _CachedConversation())
+
+    def append(self, conv_id: str, role: str, content: str) -> None:
+        self.create(conv_id)
+        db = self._session_factory()
+        try:
+            db.add(ConversationMessage(conversation_id=conv_id, role=role, content=content))
+            db.commit()
+        finally:
+            db.close()
+
+
+def _store_from_env() -> ConversationStore:
+    kind = os.getenv("CONVERSATION_STORE", "sql").lower()
+    if kind == "memory":
+        return MemoryConversationStore()
+    return SQLConversationStore(cache_size=int(os.getenv("CONVERSATION_CACHE_SIZE", "256")))
+
+
+_store: ConversationStore = _store_from_env()
+
+
+def set_conversation_store(store: ConversationStore) -> None:
+    global _store
+    _store = store
+
 
 def get_conversation(conv_id: str) -> List[dict]:
-    return _conversations.get(conv_id, [])
+    return _store.get(conv_id)
 
 def create_conversation(conv_id: str) -> None:
-    if conv_id not in _conversations:
-        _conversations[conv_id] = []
+    _store.create(conv_id)
 
 def add_message(conv_id: str, role: str, content: str) -> None:
-    if conv_id not in _conversations:
-        _conversations[conv_id] = []
-    _conversations[conv_id].append({"role": role, "content": content})
+    _store.append(conv_id, role, content)
@@ -0,0 +1,161 @@
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import event, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+
+from database.models import Tag
+
+###############################################################
+# RÉSOLUTION DES TAGS (nom → id)
+###############################################################
+# Les tags sont globaux et changent peu : un lot de noms est résolu en une
+# requête IN, les manquants sont créés en un INSERT groupé. Deux écrivains
+# qui créent le même tag en même temps ne provoquent pas d'erreur : le
+# conflit sur le nom unique est ignoré puis le gagnant est relu.
+#
+# Cache nom → id par process (TAG_CACHE_SIZE / TAG_CACHE_TTL). Il n'est
+# alimenté qu'au commit de la session, pour ne jamais exposer l'id d'un tag
+# créé dans une transaction annulée. Les tags ne sont supprimés que par les
+# scripts de maintenance (reset / seed) : le TTL borne la durée pendant
+# laquelle un id supprimé peut encore être servi par resolve_tag_ids ;
+# resolve_tags, lui, revalide toujours les ids en base.
+
+_tag_id_cache = TTLCache(
+    maxsize=int(os.getenv("TAG_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("TAG_CACHE_TTL", "600")),
+)
+
+_PENDING_KEY = "tag_cache_pending"
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    for name, tag_id in session.info.pop(_PENDING_KEY, {}).items():
+        _tag_id_cache.set(name, tag_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def tag_cache_stats() -> dict:
+    return _tag_id_cache.stats()
+
+
+def clear_tag_cache() -> None:
+    _tag_id_cache.clear()
+
+
+def _unique(names: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(n for n in names if n))
+
+
+def _insert_missing(db: Session, names: List[str]) -> None:
+    """INSERT groupé ; un nom déjà créé par un autre écrivain est ignoré."""
+    now = datetime.utcnow()
+    rows = [{"id": str(uuid.uuid4()), "name": n, "createdAt": now} for n in names]
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        db.execute(dialect_insert(Tag.__table__).on_conflict_do_nothing(index_elements=["name"]), rows)
+        return
+
+    # Autres moteurs : savepoint, puis ligne par ligne en cas de conflit
+    try:
+        with db.begin_nested():
+            db.execute(insert(Tag.__table__), rows)
+    except IntegrityError:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(Tag.__table__), [row])
+            except IntegrityError:
+                pass
+
+
+def _lookup(db: Session, names: List[str]) -> Dict[str, str]:
+    if not names:
+        return {}
+    return dict(db.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all())
+
+
+def _remember(db: Session, resolved: Dict[str, str]) -> None:
+    db.info.setdefault(_PENDING_KEY, {}).update(resolved)
+
+
+def resolve_tag_ids(db: Session, names: Iterable[str]) -> Dict[str, str]:
+    """
+    name → id pour tous les noms, en créant les manquants.
+    0 requête si tout est en cache, sinon 1 SELECT (+ 1 INSERT et 1 SELECT
+    si des tags doivent être créés).
+    """
+    names = _unique(names)
+    resolved: Dict[str, str] = {}
+    unknown = []
+    for name in names:
+        tag_id = _tag_id_cache.get(name)
+        if tag_id is None:
+            unknown.append(name)
+        else:
+            resolved[name] = tag_id
+
+    found = _lookup(db, unknown)
+    missing = [n for n in unknown if n not in found]
+    if missing:
+        _insert_missing(db, missing)
+        found.update(_lookup(db, missing))
+
+    _remember(db, found)
+    resolved.update(found)
+    return resolved
+
+
+def resolve_tags(db: Session, names: Iterable[str]) -> List[Tag]:
+    """
+    Objets Tag pour `names` (dans l'ordre, sans doublons), créés si besoin.
+    Les ids venant du cache sont revalidés dans la même requête que la
+    recherche par nom.
+    """
+    names = _unique(names)
+    if not names:
+        return []
+
+    cached = {}
+    unknown = []
+    for name in names:
+        tag_id = _tag_id_cache.get(name)
+        if tag_id is None:
+            unknown.append(name)
+        else:
+            cached[name] = tag_id
+
+    conds = []
+    if cached:
+        conds.append(Tag.id.in_(list(cached.values())))
+    if unknown:
+        conds.append(Tag.name.in_(unknown))
+    by_name = {t.name: t for t in db.query(Tag).filter(or_(*conds)).all()}
+
+    # Ids en cache qui ne correspondent plus (tag supprimé ou renommé)
+    stale = [n for n, tag_id in cached.items() if by_name.get(n) is None or by_name[n].id != tag_id]
+    if stale:
+        _tag_id_cache.invalidate(*stale)
+
+    missing = [n for n in names if n not in by_name]
+    if missing:
+        _insert_missing(db, missing)
+        by_name.update({t.name: t for t in db.query(Tag).filter(Tag.name.in_(missing)).all()})
+
+    _remember(db, {n: t.id for n, t in by_name.items()})
+    return [by_name[n] for n in names]
@@ -0,0 +1,320 @@
+from collections import Counter
+from typing import Dict, Iterable, Set, Tuple
+
+from sqlalchemy import case, delete, event, func, insert, inspect, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from database.models import Area, Note, Project, Tag, User, UserCounter, area_notes, note_tags, project_notes
+
+###############################################################
+# COMPTEURS DU TABLEAU DE BORD
+###############################################################
+# Une ligne de `user_counters` par (utilisateur, compteur, ref_id) :
+#   notes, pinned, words, areas        ref_id = ""
+#   projects                           ref_id = statut (ACTIVE, PAUSED, COMPLETED)
+#   project_notes, area_notes,         ref_id = id du projet / de la zone / du tag
+#   tag_notes
+#
+# Les variations sont calculées sans requête supplémentaire :
+#   - écritures ORM (Note, Project, Area, User) : lues dans l'historique des
+#     attributs au before_flush ;
+#   - INSERT directs (rattachements, import en masse) : déclarées avec
+#     record_deltas / bump.
+# Elles sont cumulées dans session.info puis appliquées au before_commit par
+# un UPSERT "value = value + delta" : même transaction que l'écriture, et pas
+# de compteur perdu entre deux écrivains concurrents.
+#
+# Les écritures faites hors session (scripts SQL, seed) ne sont pas vues :
+# reconcile_user_stats recalcule tout à partir des tables
+# (python -m database.reconcile_stats).
+
+_PENDING_KEY = "user_stats_pending"
+_DROPPED_KEY = "user_stats_dropped"
+
+# Compteurs dont ref_id est l'id d'un projet / d'une zone / d'un tag
+KEYED_COUNTERS = ("project_notes", "area_notes", "tag_notes")
+PROJECT_STATUSES = ("ACTIVE", "PAUSED", "COMPLETED")
+
+Deltas = Counter  # (counter, ref_id) -> variation
+
+
+def note_deltas(pinned, word_count, project_ids: Iterable[str] = (), area_ids: Iterable[str] = (),
+                tag_ids: Iterable[str] = (), sign: int = 1) -> Deltas:
+    """Contribution d'une note aux compteurs (sign=-1 pour la retirer)."""
+    deltas = Counter({("notes", ""): sign, ("pinned", ""): sign * bool(pinned), ("words", ""): sign * (word_count or 0)})
+    deltas.update({("project_notes", pid): sign for pid in project_ids})
+    deltas.update({("area_notes", aid): sign for aid in area_ids})
+    deltas.update({("tag_notes", tid): sign for tid in tag_ids})
+    return deltas
+
+
+def record_deltas(db, user_id: str, deltas: Deltas) -> None:
+    """Ajoute des variations à appliquer au commit de `db` (Session ou AsyncSession)."""
+    pending = db.info.setdefault(_PENDING_KEY, Counter())
+    for (counter, ref_id), delta in deltas.items():
+        if delta:
+            pending[(user_id, counter, ref_id)] += delta
+
+
+def bump(db, user_id: str, counter: str, ref_id: str = "", delta: int = 1) -> None:
+    record_deltas(db, user_id, Counter({(counter, ref_id): delta}))
+
+
+###############################################################
+# CAPTURE DES ÉCRITURES ORM
+###############################################################
+def _ids(objects) -> Set[str]:
+    return {o.id for o in objects if o is not None}
+
+
+def _committed(state, key: str):
+    """Valeur en base avant la transaction (chargée si besoin)."""
+    history = state.attrs[key].load_history()
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else None
+
+
+def _collection_change(state, key: str) -> Tuple[Set[str], Set[str]]:
+    history = state.attrs[key].load_history()
+    return _ids(history.added), _ids(history.deleted)
+
+
+def _note_change(state) -> Deltas:
+    note = state.obj()
+    deltas = Counter()
+    for key, counter in (("pinned", "pinned"), ("wordCount", "words")):
+        history = state.attrs[key].history
+        if history.has_changes():
+            before = _committed(state, key)
+            after = getattr(note, key)
+            if key == "pinned":
+                before, after = bool(before), bool(after)
+            deltas[(counter, "")] += (after or 0) - (before or 0)
+    for key, counter in (("projects", "project_notes"), ("areas", "area_notes"), ("tags", "tag_notes")):
+        if state.attrs[key].history.has_changes():
+            added, removed = _collection_change(state, key)
+            deltas.update({(counter, i): 1 for i in added - removed})
+            deltas.update({(counter, i): -1 for i in removed - added})
+    return deltas
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_deltas(session, flush_context, instances):
+    dropped = session.info.setdefault(_DROPPED_KEY, {"users": set(), "refs": set()})
+
+    for obj in session.new:
+        if isinstance(obj, Note):
+            record_deltas(session, obj.user_id, note_deltas(
+                obj.pinned, obj.wordCount, _ids(obj.projects), _ids(obj.areas), _ids(obj.tags),
+            ))
+        elif isinstance(obj, Project):
+            bump(session, obj.user_id, "projects", obj.status or "ACTIVE")
+        elif isinstance(obj, Area):
+            bump(session, obj.user_id, "areas")
+
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            state = inspect(obj)
+            record_deltas(session, obj.user_id, note_deltas(
+                _committed(state, "pinned"), _committed(state, "wordCount"),
+                _ids(obj.projects), _ids(obj.areas), _ids(obj.tags), sign=-1,
+            ))
+        elif isinstance(obj, Project):
+            bump(session, obj.user_id, "projects", _committed(inspect(obj), "status") or "ACTIVE", -1)
+            dropped["refs"].add(("project_notes", obj.id))
+        elif isinstance(obj, Area):
+            bump(session, obj.user_id, "areas", delta=-1)
+            dropped["refs"].add(("area_notes", obj.id))
+        elif isinstance(obj, User):
+            dropped["users"].add(obj.id)
+
+    for obj in session.dirty:
+        if isinstance(obj, Note):
+            record_deltas(session, obj.user_id, _note_change(inspect(obj)))
+        elif isinstance(obj, Project):
+            state = inspect(obj)
+            if state.attrs.status.history.has_changes():
+                before = _committed(state, "status")
+                if before != obj.status:
+                    bump(session, obj.user_id, "projects", before, -1)
+                    bump(session, obj.user_id, "projects", obj.status)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_before_commit(session):
+    # Le flush final (et ses variations) a lieu après before_commit : on le fait ici
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    dropped = session.info.pop(_DROPPED_KEY, None)
+    if pending or (dropped and (dropped["users"] or dropped["refs"])):
+        apply_deltas(session, pending or Counter(), dropped or {"users": set(), "refs": set()})
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_DROPPED_KEY, None)
+
+
+###############################################################
+# ÉCRITURE DES COMPTEURS
+###############################################################
+def _upsert(db, rows) -> None:
+    table = UserCounter.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "counter", "ref_id"],
+                set_={"value": table.c.value + stmt.excluded.value},
+            ),
+            rows,
+        )
+        return
+
+    # Autres moteurs : UPDATE, puis INSERT des compteurs encore absents
+    for row in rows:
+        updated = db.execute(
+            update(table)
+            .where(table.c.user_id == row["user_id"], table.c.counter == row["counter"], table.c.ref_id == row["ref_id"])
+            .values(value=table.c.value + row["value"])
+        ).rowcount
+        if not updated:
+            db.execute(insert(table), [row])
+
+
+def apply_deltas(db, pending: Counter, dropped: dict) -> None:
+    table = UserCounter.__table__
+    rows = [
+        {"user_id": user_id, "counter": counter, "ref_id": ref_id, "value": delta}
+        for (user_id, counter, ref_id), delta in sorted(pending.items())
+        if delta and user_id not in dropped["users"]
+    ]
+    if rows:
+        _upsert(db, rows)
+        # Projets / zones / tags qui n'ont plus de note
+        db.execute(
+            delete(table).where(
+                table.c.user_id.in_({r["user_id"] for r in rows}),
+                table.c.counter.in_(KEYED_COUNTERS),
+                table.c.value == 0,
+            )
+        )
+    # Sans PRAGMA foreign_keys, pas de suppression en cascade
+    if dropped["refs"]:
+        db.execute(delete(table).where(tuple_(table.c.counter, table.c.ref_id).in_(sorted(dropped["refs"]))))
+    if dropped["users"]:
+        db.execute(delete(table).where(table.c.user_id.in_(dropped["users"])))
+
+
+###############################################################
+# LECTURE
+###############################################################
+def user_stats(db: Session, user_id: str) -> dict:
+    """Tableau de bord : compteurs de l'utilisateur, nommés (3 requêtes indexées)."""
+    values: Dict[Tuple[str, str], int] = {
+        (c, r): v for c, r, v in db.execute(
+            select(UserCounter.counter, UserCounter.ref_id, UserCounter.value).where(UserCounter.user_id == user_id)
+        )
+    }
+    by_status = {s: values.get(("projects", s), 0) for s in PROJECT_STATUSES}
+
+    projects = db.execute(
+        select(Project.id, Project.name, Project.status).where(Project.user_id == user_id)
+        .order_by(Project.createdAt, Project.id)
+    ).all()
+    areas = db.execute(
+        select(Area.id, Area.name).where(Area.user_id == user_id).order_by(Area.createdAt, Area.id)
+    ).all()
+    tag_counts = {r: v for (c, r), v in values.items() if c == "tag_notes" and v > 0}
+    tags = db.execute(select(Tag.id, Tag.name).where(Tag.id.in_(list(tag_counts)))).all() if tag_counts else []
+
+    return {
+        "notes": values.get(("notes", ""), 0),
+        "pinned": values.get(("pinned", ""), 0),
+        "words": values.get(("words", ""), 0),
+        "areas": values.get(("areas", ""), 0),
+        "projects": sum(by_status.values()),
+        "projects_by_status": by_status,
+        "active_projects": by_status["ACTIVE"],
+        "completed_projects": by_status["COMPLETED"],
+        "notes_by_project": [
+            {"id": p.id, "name": p.name, "status": p.status, "notes": values.get(("project_notes", p.id), 0)}
+            for p in projects
+        ],
+        "notes_by_area": [
+            {"id": a.id, "name": a.name, "notes": values.get(("area_notes", a.id), 0)} for a in areas
+        ],
+        "notes_by_tag": sorted(
+            ({"id": t.id, "name": t.name, "notes": tag_counts[t.id]} for t in tags),
+            key=lambda t: (-t["notes"], t["name"]),
+        ),
+    }
+
+
+###############################################################
+# RÉCONCILIATION
+###############################################################
+def compute_user_counters(db, user_id: str) -> Dict[Tuple[str, str], int]:
+    """Valeurs exactes recalculées à partir des tables (agrégats indexés par user_id)."""
+    notes, pinned, words = db.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((Note.pinned, 1), else_=0)), 0),
+            func.coalesce(func.sum(Note.wordCount), 0),
+        ).where(Note.user_id == user_id)
+    ).one()
+    values = {("notes", ""): notes, ("pinned", ""): pinned, ("words", ""): words}
+    values[("areas", "")] = db.execute(select(func.count()).select_from(Area).where(Area.user_id == user_id)).scalar()
+    for status, n in db.execute(
+        select(Project.status, func.count()).where(Project.user_id == user_id).group_by(Project.status)
+    ):
+        values[("projects", status)] = n
+
+    grouped = (
+        ("project_notes", project_notes.c.project_id, project_notes.c.note_id),
+        ("area_notes", area_notes.c.area_id, area_notes.c.note_id),
+        ("tag_notes", note_tags.c.tag_id, note_tags.c.note_id),
+    )
+    for counter, ref_col, note_col in grouped:
+        for ref_id, n in db.execute(
+            select(ref_col, func.count())
+            .join(Note, Note.id == note_col)
+            .where(Note.user_id == user_id)
+            .group_by(ref_col)
+        ):
+            values[(counter, ref_id)] = n
+    return values
+
+
+def reconcile_user_stats(db, user_id: str, dry_run: bool = False) -> Dict[str, dict]:
+    """
+    Remplace les compteurs de l'utilisateur par les valeurs recalculées ;
+    retourne les écarts {"counter[ref_id]": {"stored", "actual"}}. Ne valide
+    pas la transaction. `db` : Session ou Connection (migrations).
+    """
+    table = UserCounter.__table__
+    actual = {k: v for k, v in compute_user_counters(db, user_id).items() if v}
+    stored = {
+        (c, r): v for c, r, v in db.execute(
+            select(table.c.counter, table.c.ref_id, table.c.value).where(table.c.user_id == user_id)
+        )
+        if v
+    }
+    drift = {
+        f"{c}[{r}]" if r else c: {"stored": stored.get((c, r), 0), "actual": actual.get((c, r), 0)}
+        for c, r in sorted(set(stored) | set(actual))
+        if stored.get((c, r), 0) != actual.get((c, r), 0)
+    }
+    if drift and not dry_run:
+        db.execute(delete(table).where(table.c.user_id == user_id))
+        db.execute(insert(table), [
+            {"user_id": user_id, "counter": c, "ref_id": r, "value": v} for (c, r), v in sorted(actual.items())
+        ])
+    return drift
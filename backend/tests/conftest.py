@@ -0,0 +1,69 @@
+# backend/tests/conftest.py
+"""
+Fixtures communes : base de test jetable, client HTTP et fabriques.
+
+La base est choisie avant l'import de l'app (le moteur est créé à l'import) :
+    TEST_DATABASE_URL   : URL de la base de test (ex. PostgreSQL en CI) ;
+                          défaut : fichier SQLite temporaire
+Les workers de fond (indexation, outbox n8n) ne sont pas lancés : les tests
+appellent drain() / dispatch explicitement.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+_TMP_DIR = tempfile.mkdtemp(prefix="corebrain-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or (
+    "sqlite:///" + os.path.join(_TMP_DIR, "corebrain.db")
+)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("LLM_PROVIDER", "echo")
+os.environ["N8N_DISPATCHER_ENABLED"] = "0"
+os.environ["INDEXER_ENABLED"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    import app as app_module
+    return app_module.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    return TestClient(app)
+
+
+@pytest.fixture
+def db(app):
+    # L'import de l'app applique les migrations
+    from database.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(client):
+    def make(name: str = "test") -> str:
+        email = f"{name}-{uuid.uuid4().hex[:12]}@example.com"
+        res = client.post("/users/", json={"name": name, "email": email, "password": "secret"})
+        assert res.status_code == 201, res.text
+        return res.json()["id"]
+    return make
+
+
+@pytest.fixture
+def make_note(client):
+    def make(user_id: str, title: str = "Note", content: str = "", **fields) -> dict:
+        res = client.post("/notes/", json={"user_id": user_id, "title": title, "content": content, **fields})
+        assert res.status_code == 201, res.text
+        return res.json()
+    return make
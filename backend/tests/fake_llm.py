@@ -0,0 +1,101 @@
+# backend/tests/fake_llm.py
+"""
+Serveur HTTP local compatible OpenAI (/v1/chat/completions, JSON et SSE)
+pour tester le client sans réseau : pannes, lenteur, concurrence observée.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeLLMServer:
+    def __init__(self, reply: str = "réponse du faux serveur"):
+        self.reply = reply
+        self.fail_first = 0  # nb de requêtes en erreur avant de répondre
+        self.fail_status = 500
+        self.delay = 0.0  # secondes avant la réponse
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.max_in_flight_by_user: dict = {}
+        self._in_flight_by_user: dict = {}
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                user = body["messages"][-1]["content"].split(":", 1)[0]
+                with server._lock:
+                    server.requests += 1
+                    failing = server.requests <= server.fail_first
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    count = server._in_flight_by_user.get(user, 0) + 1
+                    server._in_flight_by_user[user] = count
+                    server.max_in_flight_by_user[user] = max(server.max_in_flight_by_user.get(user, 0), count)
+                try:
+                    if server.delay:
+                        time.sleep(server.delay)
+                    if failing:
+                        self._json(server.fail_status, {"error": {"message": "panne simulée", "type": "server_error"}})
+                    elif body.get("stream"):
+                        self._stream(body["model"])
+                    else:
+                        self._json(200, {
+                            "id": "chatcmpl-fake", "object": "chat.completion", "created": 0,
+                            "model": body["model"],
+                            "choices": [{
+                                "index": 0, "finish_reason": "stop",
+                                "message": {"role": "assistant", "content": server.reply},
+                            }],
+                        })
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                        server._in_flight_by_user[user] -= 1
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for word in server.reply.split(" "):
+                    chunk = {
+                        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,147 @@
+# backend/tests/test_agent_load.py
+"""
+Chat agent sous charge avec un LLM simulé (latence fixe) : les appels LLM,
+résumé glissant compris, passent par les créneaux de llm_services et ne
+bloquent pas les routes CRUD des notes.
+"""
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+import pytest
+
+from services import llm_providers, llm_services
+from services.llm_providers import LLMProvider
+from database.database import SessionLocal
+from database.models import Conversation, ConversationMessage
+
+LLM_LATENCY = 0.3
+
+
+class StubLLM(LLMProvider):
+    """Réponse après LLM_LATENCY s ; compte les appels simultanés."""
+    name = "stub"
+    default_model = "stub-1"
+
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def complete(self, messages, model, temperature):
+        raise AssertionError("appel LLM synchrone depuis une route async")
+
+    async def acomplete(self, messages, model, temperature):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(LLM_LATENCY)
+        finally:
+            self.in_flight -= 1
+        return "ok"
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    provider = StubLLM()
+    monkeypatch.setitem(llm_providers.PROVIDERS, "stub", provider)
+    return provider
+
+
+def long_conversations(count: int, turns: int = 40) -> list:
+    ids = [f"load::{uuid.uuid4()}" for _ in range(count)]
+    db = SessionLocal()
+    try:
+        db.add_all([Conversation(id=conv_id) for conv_id in ids])
+        db.add_all([
+            ConversationMessage(
+                conversation_id=conv_id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"tour {i} " + "mot " * 30,
+            )
+            for conv_id in ids
+            for i in range(turns)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return ids
+
+
+def chat_payload(user_id: str, conv_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "conversation_id": conv_id,
+        "message": "et maintenant ?",
+        "provider": "stub",
+        "max_context_tokens": 400,  # force le résumé glissant
+        "cache": False,
+    }
+
+
+def test_summary_uses_user_slots(app, make_user, monkeypatch, stub):
+    """Avec 1 créneau par utilisateur, résumé et réponse ne se chevauchent jamais."""
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY_PER_USER", 1)
+    uid = make_user()
+    conversations = long_conversations(4)
+
+    async def chats():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await asyncio.gather(
+                *[http.post("/api/agent/chat", json=chat_payload(uid, c)) for c in conversations]
+            )
+
+    responses = asyncio.run(chats())
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert all(r.json()["context"]["summary_tokens"] > 0 for r in responses)
+    assert stub.calls == 8  # un résumé + une réponse par chat
+    assert stub.max_in_flight == 1
+
+
+async def _note_crud_latency(http: httpx.AsyncClient, user_id: str, rounds: int) -> list:
+    latencies = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        res = await http.post("/notes/", json={"user_id": user_id, "title": f"Charge {i}", "content": "texte"})
+        note_id = res.json()["id"]
+        await http.get(f"/notes/{note_id}")
+        await http.put(f"/notes/{note_id}", json={"content": "modifié"})
+        await http.delete(f"/notes/{note_id}")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def test_note_crud_latency_stays_flat_during_200_chats(app, make_user, monkeypatch, stub):
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY", 512)
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY_PER_USER", 64)
+    users = [make_user(f"load{i}") for i in range(5)]
+    conversations = [(users[i % len(users)], conv) for i, conv in enumerate(long_conversations(200))]
+    crud_user = make_user("crud")
+
+    async def scenario():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60
+        ) as http:
+            baseline = await _note_crud_latency(http, crud_user, 20)
+
+            chats = [
+                asyncio.create_task(http.post("/api/agent/chat", json=chat_payload(uid, conv)))
+                for uid, conv in conversations
+            ]
+            await asyncio.sleep(LLM_LATENCY / 3)  # chats en attente du LLM
+            under_load = await _note_crud_latency(http, crud_user, 20)
+            responses = await asyncio.gather(*chats)
+            return baseline, under_load, responses
+
+    baseline, under_load, responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 200
+    # Les 200 chats attendent leur LLM en même temps, sans thread bloqué
+    assert stub.max_in_flight >= 100
+    base, loaded = statistics.median(baseline), statistics.median(under_load)
+    print(f"\nCRUD note p50 : {base * 1000:.1f} ms à vide, {loaded * 1000:.1f} ms pendant 200 chats")
+    assert loaded < max(3 * base, base + 0.05)
@@ -0,0 +1,87 @@
+# backend/tests/test_agent_results.py
+import asyncio
+
+from database.session import AsyncSessionLocal
+from services.agent_results import store_result
+
+
+def project(client, make_user, name="Agents"):
+    res = client.post("/projects/", json={"user_id": make_user("agents"), "name": name})
+    assert res.status_code == 201, res.text
+    return res.json()["id"]
+
+
+def post_result(client, pid, kind, body):
+    res = client.post(f"/projects/{pid}/agent/{kind}/latest", json=body)
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def test_each_post_is_a_new_version(client, make_user):
+    pid = project(client, make_user)
+    assert client.get(f"/projects/{pid}/agent/todos/latest").status_code == 404
+
+    assert post_result(client, pid, "todos", {"todos": ["a"]})["version"] == 1
+    # JSON brut accepté comme les anciens récepteurs
+    assert post_result(client, pid, "todos", ["b", "c"])["version"] == 2
+    # Versions indépendantes par kind, clé « analyse » pour analysis
+    assert post_result(client, pid, "analysis", {"analyse": "ok"})["version"] == 1
+
+    latest = client.get(f"/projects/{pid}/agent/todos/latest").json()
+    assert (latest["version"], latest["todos"]) == (2, ["b", "c"])
+    assert client.get(f"/projects/{pid}/agent/analysis/latest").json()["analyse"] == "ok"
+
+
+def test_latest_cache_is_invalidated_by_new_results(client, make_user):
+    pid = project(client, make_user)
+    post_result(client, pid, "objectives", {"objectives": ["v1"]})
+    assert client.get(f"/projects/{pid}/agent/objectives/latest").json()["objectives"] == ["v1"]
+    assert client.get("/projects/agent/objectives/latest").json()["objectives"] == ["v1"]
+
+    post_result(client, pid, "objectives", {"objectives": ["v2"]})
+    assert client.get(f"/projects/{pid}/agent/objectives/latest").json()["objectives"] == ["v2"]
+    # Dernier résultat tous projets confondus
+    assert client.get("/projects/agent/objectives/latest").json()["project_id"] == pid
+
+
+def test_history_pages_towards_older_versions(client, make_user):
+    pid = project(client, make_user)
+    for i in range(5):
+        post_result(client, pid, "advices", {"advices": i})
+
+    first = client.get(f"/projects/{pid}/agent/advices/history", params={"limit": 2}).json()
+    assert [r["version"] for r in first] == [5, 4]
+    older = client.get(
+        f"/projects/{pid}/agent/advices/history", params={"limit": 10, "before_version": first[-1]["version"]}
+    ).json()
+    assert [r["version"] for r in older] == [3, 2, 1]
+    assert [r["advices"] for r in older] == [2, 1, 0]
+
+
+def test_concurrent_results_get_distinct_versions(client, make_user):
+    pid = project(client, make_user)
+
+    async def store(i):
+        async with AsyncSessionLocal() as db:
+            return (await store_result(db, pid, "deadlines", [i]))["version"]
+
+    async def run():
+        return await asyncio.gather(*(store(i) for i in range(3)))
+
+    assert sorted(asyncio.run(run())) == [1, 2, 3]
+
+
+def test_deleting_project_drops_cached_results(client, make_user):
+    pid = project(client, make_user)
+    post_result(client, pid, "todos", {"todos": ["x"]})
+    assert client.get(f"/projects/{pid}/agent/todos/latest").status_code == 200
+
+    assert client.delete(f"/projects/{pid}").status_code == 204
+    assert client.get(f"/projects/{pid}/agent/todos/latest").status_code == 404
+
+
+def test_unknown_kind_or_project(client, make_user):
+    pid = project(client, make_user)
+    assert client.post(f"/projects/{pid}/agent/inconnu/latest", json={}).status_code == 404
+    assert client.get("/projects/agent/inconnu/latest").status_code == 404
+    assert client.post("/projects/absent/agent/todos/latest", json={}).status_code == 404
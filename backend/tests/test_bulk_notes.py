@@ -0,0 +1,134 @@
+# backend/tests/test_bulk_notes.py
+import json
+
+from database.models import NoteChange
+
+from services import bulk_notes
+from services.bulk_notes import iter_ndjson_lines, parse_line
+
+
+def ndjson(*rows) -> bytes:
+    return b"".join(
+        (r if isinstance(r, bytes) else json.dumps(r).encode()) + b"\n" for r in rows
+    )
+
+
+def export(client, uid):
+    res = client.get(f"/notes/export/{uid}")
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in res.text.splitlines()]
+
+
+def test_parse_line_validation():
+    assert parse_line(b'{"title": "t", "content": "c", "autoSummary": true, "summary": "x"}')["summary"] is None
+    for raw, message in [
+        (b"{pas du json", "JSON invalide"),
+        (b"[1, 2]", "objet JSON"),
+        (b'{"title": "t"}', "content"),
+        (b'{"title": "t", "content": "c", "createdAt": "hier"}', "createdAt"),
+        (b'{"title": "t", "content": "c", "tag_names": [1]}', "tag_names"),
+        (b'{"title": "t", "content": "c", "pinned": "false"}', "pinned"),
+        (b'{"title": "t", "content": "c", "autoSummary": 1}', "autoSummary"),
+    ]:
+        try:
+            parse_line(raw)
+        except ValueError as e:
+            assert message in str(e)
+        else:
+            raise AssertionError(raw)
+
+
+def test_iter_ndjson_lines_keeps_partial_line():
+    lines, rest = iter_ndjson_lines(b'{"a"', b': 1}\n{"b": 2}\n{"c"')
+    assert lines == [b'{"a": 1}', b'{"b": 2}']
+    assert rest == b'{"c"'
+
+
+def test_iter_ndjson_lines_drops_overlong_lines():
+    lines, rest = iter_ndjson_lines(b"", b"court\n" + b"x" * 20, max_bytes=10)
+    assert (lines, rest) == ([b"court", None], None)
+    # Suite de la ligne trop longue ignorée jusqu'au saut de ligne
+    lines, rest = iter_ndjson_lines(rest, b"x" * 20, max_bytes=10)
+    assert (lines, rest) == ([], None)
+    lines, rest = iter_ndjson_lines(rest, b"xx\nsuite\n" + b"y" * 11 + b"\nfin", max_bytes=10)
+    assert (lines, rest) == ([b"suite", None], b"fin")
+
+
+def test_import_reports_bad_lines_without_blocking(client, make_user, db):
+    uid = make_user("import")
+    project = client.post("/projects/", json={"user_id": uid, "name": "P"}).json()["id"]
+    other = client.post("/projects/", json={"user_id": make_user("autre"), "name": "X"}).json()["id"]
+    body = ndjson(
+        {"title": "Un", "content": "alpha beta", "project_ids": [project], "tag_names": ["t1", "t2"]},
+        b"pas du json",
+        b"",
+        {"title": "Deux", "content": "gamma", "pinned": True, "createdAt": "2024-01-02T03:04:05Z"},
+        {"title": "Trois", "content": "delta", "project_ids": [other]},
+        {"title": "Quatre", "content": "epsilon"},
+    )
+    res = client.post(f"/notes/import/{uid}", params={"batch_size": 2}, content=body)
+    assert res.status_code == 200, res.text
+    result = res.json()
+    assert result["imported"] == 3
+    assert result["failed"] == 2
+    assert [e["line"] for e in result["errors"]] == [2, 5]
+    assert other in result["errors"][1]["error"]
+
+    notes = {n["title"]: n for n in export(client, uid)}
+    assert set(notes) == {"Un", "Deux", "Quatre"}
+    assert notes["Un"]["project_ids"] == [project]
+    assert sorted(notes["Un"]["tag_names"]) == ["t1", "t2"]
+    assert notes["Un"]["wordCount"] == 2
+    assert notes["Deux"]["pinned"] is True
+    assert notes["Deux"]["createdAt"] == "2024-01-02T03:04:05"
+
+    # Les INSERT directs passent quand même par les compteurs et la file d'indexation
+    drift = client.post(f"/users/{uid}/stats/reconcile", params={"dry_run": True}).json()["drift"]
+    assert not drift
+    ids = {n["id"] for n in notes.values()}
+    queued = {c.note_id for c in db.query(NoteChange).filter(NoteChange.note_id.in_(ids))}
+    assert queued == ids
+
+
+def test_import_rejects_overlong_lines(client, make_user, monkeypatch):
+    monkeypatch.setattr(bulk_notes, "IMPORT_MAX_LINE_BYTES", 100)
+    uid = make_user("import-long")
+    body = ndjson({"title": "Court", "content": "ok"}, {"title": "Long", "content": "x" * 200}, {"title": "Après", "content": "ok"})
+
+    result = client.post(f"/notes/import/{uid}", content=body).json()
+
+    assert (result["imported"], result["failed"]) == (2, 1)
+    assert result["errors"][0]["line"] == 2
+    assert "trop longue" in result["errors"][0]["error"]
+
+
+def test_export_round_trips_through_import(client, make_user):
+    src, dst = make_user("src"), make_user("dst")
+    for i in range(7):
+        client.post("/notes/", json={"user_id": src, "title": f"N{i}", "content": f"texte {i}"})
+    exported = export(client, src)
+    assert len(exported) == 7
+    # Pagination keyset : chaque note une seule fois, dans l'ordre de création
+    assert [n["title"] for n in exported] == [f"N{i}" for i in range(7)]
+
+    res = client.post(f"/notes/import/{dst}", content="".join(json.dumps(n) + "\n" for n in exported))
+    assert res.json() == {"imported": 7, "failed": 0, "errors": []}
+    reimported = export(client, dst)
+    keys = ("title", "content", "summary", "pinned", "wordCount", "createdAt", "updatedAt")
+    assert [{k: n[k] for k in keys} for n in reimported] == [{k: n[k] for k in keys} for n in exported]
+
+
+def test_export_chunking_is_stable(make_user, make_note):
+    from services.bulk_notes import export_notes
+
+    uid = make_user("chunks")
+    for i in range(5):
+        make_note(uid, f"C{i}")
+    lines = [json.loads(line) for line in export_notes(uid, chunk_size=2)]
+    assert [n["title"] for n in lines] == [f"C{i}" for i in range(5)]
+
+
+def test_import_export_unknown_user(client):
+    assert client.post("/notes/import/inconnu", content=b"{}\n").status_code == 404
+    assert client.get("/notes/export/inconnu").status_code == 404
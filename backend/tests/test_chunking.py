@@ -0,0 +1,104 @@
+# backend/tests/test_chunking.py
+from sqlalchemy import select
+
+from database.models import Note, NoteChunk
+from services.chunking import refresh_chunks, split_chunks
+from services.embeddings import refresh_embeddings
+
+NOTE = """# Salon
+Intro du salon.
+
+## Budget
+Stand : 2 000 €.
+
+Flyers : 300 €.
+
+## Transport
+Camionnette louée.
+"""
+
+
+def test_split_follows_headings_and_bounds():
+    chunks = split_chunks("n", NOTE)
+
+    assert [c.heading for c in chunks] == ["Salon", "Salon > Budget", "Salon > Transport"]
+    assert [c.position for c in chunks] == [0, 1, 2]
+    for c in chunks:
+        assert NOTE[c.start:c.end] == c.text
+    # Le titre fait partie du premier chunk de sa section
+    assert chunks[1].text == "## Budget\nStand : 2 000 €.\n\nFlyers : 300 €."
+
+
+def test_code_blocks_stay_whole():
+    content = "Avant.\n\n```python\nx = 1\n\n# pas un titre\ny = 2\n```\n\nAprès."
+    chunks = split_chunks("n", content, max_chars=45)
+
+    assert [c.heading for c in chunks] == [None, None, None]
+    assert chunks[1].text == "```python\nx = 1\n\n# pas un titre\ny = 2\n```"
+
+
+def test_long_paragraphs_are_cut_on_sentences():
+    content = " ".join(f"Phrase numéro {i} du paragraphe." for i in range(20))
+    chunks = split_chunks("n", content, max_chars=100)
+
+    assert len(chunks) > 1
+    assert all(len(c.text) <= 100 for c in chunks)
+    assert all(c.text.endswith(".") for c in chunks)
+    assert " ".join(c.text for c in chunks) == content
+
+
+def test_empty_note_and_duplicate_sections():
+    [empty] = split_chunks("n", "   ")
+    assert (empty.text, empty.start, empty.end) == ("", 0, 0)
+
+    twice = split_chunks("n", "# A\nmême texte\n\n# A\nmême texte")
+    assert twice[0].text == twice[1].text
+    assert twice[0].id != twice[1].id
+
+
+def test_chunk_ids_survive_edits_elsewhere():
+    before = {c.text: c.id for c in split_chunks("n", NOTE)}
+    after = split_chunks("n", "Nouvelle intro.\n\n" + NOTE.replace("300 €", "350 €"))
+
+    kept = [c for c in after if c.text in before]
+    assert [c.heading for c in kept] == ["Salon", "Salon > Transport"]
+    assert all(before[c.text] == c.id for c in kept)
+    # Autre note, même texte : autre id
+    assert split_chunks("m", NOTE)[0].id != split_chunks("n", NOTE)[0].id
+
+
+def test_only_edited_chunks_lose_their_vector(client, db, make_user, make_note):
+    uid = make_user("chunks")
+    note = make_note(uid, "Salon", NOTE)
+    refresh_embeddings(db, uid, [note["id"]])
+    db.commit()
+    before = {c.heading: (c.id, c.vector) for c in db.scalars(select(NoteChunk).where(NoteChunk.note_id == note["id"]))}
+
+    client.put(f"/notes/{note['id']}", json={"content": NOTE.replace("Camionnette", "Fourgon")})
+    refresh_chunks(db, uid, [note["id"]])
+
+    db.expire_all()
+    after = {c.heading: c for c in db.scalars(select(NoteChunk).where(NoteChunk.note_id == note["id"]))}
+    assert (after["Salon > Budget"].id, after["Salon > Budget"].vector) == before["Salon > Budget"]
+    assert after["Salon > Transport"].id != before["Salon > Transport"][0]
+    assert after["Salon > Transport"].vector is None
+    assert after["Salon > Transport"].noteHash == db.get(Note, note["id"]).contentHash
+
+
+def test_chunks_route_and_search_anchor(client, make_user, make_note):
+    uid = make_user("chunks-route")
+    note = make_note(uid, "Salon", NOTE)
+
+    # Lecture seule : rien d'indexé tant que le journal n'est pas traité
+    pending = client.get(f"/notes/{note['id']}/chunks")
+    assert (pending.json(), pending.headers["x-index-pending"]) == ([], "1")
+
+    res = client.get(f"/notes/{note['id']}/chunks", params={"wait": 5})
+    chunks = res.json()
+    assert res.headers["x-index-pending"] == "0"
+    assert [c["heading"] for c in chunks] == ["Salon", "Salon > Budget", "Salon > Transport"]
+    assert client.get("/notes/absente/chunks").status_code == 404
+
+    [hit] = client.get("/notes/search", params={"user_id": uid, "q": "camionnette"}).json()["items"]
+    assert hit["chunk"]["id"] == chunks[2]["id"]
+    assert NOTE[hit["chunk"]["start"]:hit["chunk"]["end"]].endswith("Camionnette louée.")
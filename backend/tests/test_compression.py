@@ -0,0 +1,122 @@
+# backend/tests/test_compression.py
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.compression import CompressionMiddleware
+from services.static_assets import StaticManifest
+
+BIG = "corebrain " * 500
+
+
+def etagged(request: Request):
+    etag = request.query_params.get("etag", '"v1"')
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+    return PlainTextResponse(BIG, headers={"ETag": etag})
+
+
+def stream(request: Request):
+    async def chunks():
+        for i in range(3):
+            yield f"{i}:{BIG}\n"
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+def events(request: Request):
+    return PlainTextResponse(BIG, media_type="text/event-stream")
+
+
+def encoded(request: Request):
+    return Response(gzip.compress(BIG.encode()), headers={"Content-Encoding": "gzip"}, media_type="text/plain")
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[
+        Route("/etag", etagged),
+        Route("/small", lambda r: PlainTextResponse("court")),
+        Route("/stream", stream),
+        Route("/events", events),
+        Route("/encoded", encoded),
+    ])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def raw_get(client, url, **headers):
+    """Corps tel qu'envoyé (sans décompression automatique par httpx)."""
+    with client.stream("GET", url, headers={"Accept-Encoding": "gzip", **headers}) as res:
+        return res, b"".join(res.iter_raw())
+
+
+def test_compresses_large_responses_only(client):
+    res, body = raw_get(client, "/etag")
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert int(res.headers["content-length"]) == len(body)
+    assert gzip.decompress(body).decode() == BIG
+
+    res, body = raw_get(client, "/small")
+    assert "content-encoding" not in res.headers
+    assert body == b"court"
+
+    res = client.get("/etag", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+
+
+def test_streams_are_compressed_chunk_by_chunk(client):
+    res, body = raw_get(client, "/stream")
+    assert res.headers["content-encoding"] == "gzip"
+    assert "content-length" not in res.headers
+    assert gzip.decompress(body).decode().splitlines()[2].startswith("2:")
+
+
+def test_event_streams_and_encoded_bodies_pass_through(client):
+    res, _ = raw_get(client, "/events")
+    assert "content-encoding" not in res.headers
+    res, body = raw_get(client, "/encoded")
+    assert gzip.decompress(body).decode() == BIG
+
+
+def test_strong_etag_becomes_weak_when_compressed(client):
+    res, _ = raw_get(client, "/etag")
+    assert res.headers["etag"] == 'W/"v1"'
+
+    # Non compressée : l'ETag fort de l'app est conservé
+    plain = client.get("/etag", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] == '"v1"'
+
+    # Déjà faible : inchangé
+    res, _ = raw_get(client, '/etag?etag=W/"v2"')
+    assert res.headers["etag"] == 'W/"v2"'
+
+
+def test_revalidation_of_compressed_response(client):
+    res, _ = raw_get(client, "/etag")
+    revalidated = client.get("/etag", headers={"Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == 'W/"v1"'
+
+
+def test_static_manifest_behind_middleware(tmp_path):
+    """Fichier sans variante précompressée : compressé à la volée, ETag faible, 304 conservé."""
+    (tmp_path / "index.html").write_text("<p>" + BIG + "</p>")
+    manifest = StaticManifest(tmp_path)
+    app = Starlette(routes=[Route("/{path:path}", lambda r: manifest.response(r, r.path_params["path"]))])
+    app.add_middleware(CompressionMiddleware)
+    client = TestClient(app)
+
+    res, _ = raw_get(client, "/index.html")
+    strong = manifest.files["index.html"].etag
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["etag"] == "W/" + strong
+
+    again = client.get("/index.html", headers={"Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]})
+    assert again.status_code == 304
+    assert again.headers["etag"] == "W/" + strong
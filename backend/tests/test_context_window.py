@@ -0,0 +1,94 @@
+# backend/tests/test_context_window.py
+import asyncio
+import uuid
+
+from services import context_window
+from services.context_window import SUMMARY_BATCH, build_context as abuild_context, message_tokens
+
+
+def build_context(*args, **kwargs):
+    return asyncio.run(abuild_context(*args, **kwargs))
+
+
+def conversation(turns: int, words: int = 40):
+    history = [{"role": "system", "content": "Tu es un assistant."}]
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        history.append({"role": role, "content": f"tour{i} " + "mot " * words})
+    return history
+
+
+def test_short_history_is_sent_whole():
+    history = conversation(4)
+
+    messages, stats = build_context(str(uuid.uuid4()), history, "question", budget=6000)
+
+    assert messages == history + [{"role": "user", "content": "question"}]
+    assert stats["turns_dropped"] == 0
+    assert stats["tokens_sent"] == stats["tokens_full_history"]
+
+
+def test_long_history_keeps_recent_turns_within_budget():
+    history = conversation(60)
+    calls = []
+
+    async def summarize(previous, turns):
+        calls.append(len(turns))
+        return "résumé"
+
+    messages, stats = build_context(str(uuid.uuid4()), history, "question", budget=1500, summarize=summarize)
+
+    assert stats["tokens_sent"] <= 1500
+    assert sum(message_tokens(m) for m in messages) == stats["tokens_sent"]
+    assert messages[0] == history[0]
+    assert "résumé" in messages[1]["content"]
+    assert messages[-2] == history[-1]
+    assert messages[-1] == {"role": "user", "content": "question"}
+    assert calls == [stats["turns_dropped"]]
+
+
+def test_summary_is_cached_until_enough_new_turns():
+    conv = str(uuid.uuid4())
+    calls = []
+
+    async def summarize(previous, turns):
+        calls.append((previous, len(turns)))
+        return f"résumé {len(calls)}"
+
+    history = conversation(60)
+    build_context(conv, history, "q", budget=1500, summarize=summarize)
+    # Deux tours de plus : pas assez pour re-résumer
+    history += conversation(2)[1:]
+    _, stats = build_context(conv, history, "q", budget=1500, summarize=summarize)
+    assert len(calls) == 1
+    assert stats["summary_tokens"] > 0
+
+    history += conversation(SUMMARY_BATCH)[1:]
+    build_context(conv, history, "q", budget=1500, summarize=summarize)
+    assert len(calls) == 2
+    assert calls[1][0] == "résumé 1"
+
+
+def test_summary_failure_keeps_previous_summary():
+    conv = str(uuid.uuid4())
+    history = conversation(60)
+    async def old(previous, turns):
+        return "ancien"
+
+    build_context(conv, history, "q", budget=1500, summarize=old)
+
+    async def failing(previous, turns):
+        raise RuntimeError("LLM indisponible")
+
+    history += conversation(SUMMARY_BATCH + 2)[1:]
+    messages, _ = build_context(conv, history, "q", budget=1500, summarize=failing)
+
+    assert "ancien" in messages[1]["content"]
+
+
+def test_summary_cache_is_bounded():
+    cache = context_window._SummaryCache(2)
+    for i in range(3):
+        cache.set(str(i), i, f"s{i}")
+    assert cache.get("0") == (0, "")
+    assert cache.get("2") == (2, "s2")
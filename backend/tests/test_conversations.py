@@ -0,0 +1,92 @@
+# backend/tests/test_conversations.py
+import uuid
+
+from database.database import SessionLocal
+from services.storage_services import MemoryConversationStore, SQLConversationStore
+
+
+def conv_id() -> str:
+    return f"test::{uuid.uuid4()}"
+
+
+def test_sql_store_round_trip(app):
+    store = SQLConversationStore()
+    cid = conv_id()
+
+    store.create(cid)
+    store.append(cid, "user", "bonjour")
+    store.append(cid, "assistant", "salut")
+
+    assert store.get(cid) == [
+        {"role": "user", "content": "bonjour"},
+        {"role": "assistant", "content": "salut"},
+    ]
+
+
+def test_sql_store_is_shared_between_workers(app):
+    """Deux stores = deux workers : chacun voit les messages de l'autre."""
+    first, second = SQLConversationStore(), SQLConversationStore()
+    cid = conv_id()
+
+    first.append(cid, "user", "un")
+    assert second.get(cid) == [{"role": "user", "content": "un"}]
+
+    second.append(cid, "assistant", "deux")
+    first.append(cid, "user", "trois")
+
+    expected = ["un", "deux", "trois"]
+    assert [m["content"] for m in first.get(cid)] == expected
+    assert [m["content"] for m in second.get(cid)] == expected
+
+
+def test_sql_store_reads_only_new_rows(app):
+    queries = []
+
+    class CountingSession:
+        def __init__(self):
+            self._db = SessionLocal()
+
+        def query(self, *args):
+            queries.append(args)
+            return self._db.query(*args)
+
+        def __getattr__(self, name):
+            return getattr(self._db, name)
+
+    store = SQLConversationStore(session_factory=CountingSession)
+    cid = conv_id()
+    for i in range(3):
+        store.append(cid, "user", f"m{i}")
+
+    assert len(store.get(cid)) == 3
+    store.append(cid, "user", "m3")
+    assert [m["content"] for m in store.get(cid)] == ["m0", "m1", "m2", "m3"]
+    assert len(queries) == 2
+
+
+def test_sql_store_lru_is_bounded(app):
+    store = SQLConversationStore(cache_size=2)
+    ids = [conv_id() for _ in range(3)]
+    for cid in ids:
+        store.append(cid, "user", cid)
+
+    for cid in ids:
+        assert store.get(cid) == [{"role": "user", "content": cid}]
+    assert len(store._cache) == 2
+
+
+def test_create_is_idempotent(app):
+    store = SQLConversationStore()
+    cid = conv_id()
+    store.create(cid)
+    SQLConversationStore().create(cid)
+    assert store.get(cid) == []
+
+
+def test_memory_store():
+    store = MemoryConversationStore()
+    store.create("c")
+    store.append("c", "user", "x")
+    messages = store.get("c")
+    messages.append({"role": "user", "content": "copie"})
+    assert store.get("c") == [{"role": "user", "content": "x"}]
@@ -0,0 +1,111 @@
+# backend/tests/test_embeddings.py
+import numpy as np
+import pytest
+
+from services import embeddings
+from services.conversation_services import _build_project_system_prompt, invalidate_project_prompts
+from services.embeddings import (
+    HashingEmbedder, UnknownEmbedderError, get_embedder, refresh_embeddings, tokenize,
+)
+from services.indexing import drain
+
+
+def similar(client, user_id, q, **params):
+    # wait : les notes écrites juste avant sont indexées avant la recherche
+    res = client.get("/notes/similar", params={"user_id": user_id, "q": q, "wait": 5, **params})
+    assert res.status_code == 200, res.text
+    assert res.headers["x-index-pending"] == "0"
+    return res.json()
+
+
+def test_tokenize_folds_accents_stopwords_and_stems():
+    assert tokenize("La Réunion des équipes") == ["reunio", "equipe"]
+    assert tokenize("sauvegardes") == tokenize("sauvegarde")
+
+
+def test_hashing_embedder_is_normalized_and_deterministic():
+    embedder = HashingEmbedder(dim=64)
+    vectors = embedder.embed(["budget du salon", "budget du salon", "", "recette de crêpes"])
+    assert vectors.shape == (4, 64)
+    assert np.allclose(np.linalg.norm(vectors[[0, 1, 3]], axis=1), 1.0, atol=1e-5)
+    assert not vectors[2].any()
+    assert np.array_equal(vectors[0], vectors[1])
+    assert float(vectors[0] @ vectors[3]) < 0.5
+
+
+def test_unknown_embedder():
+    with pytest.raises(UnknownEmbedderError):
+        get_embedder("absent")
+
+
+def test_similar_notes_route(client, make_user, make_note):
+    uid, other = make_user("similar"), make_user("similar-other")
+    budget = make_note(uid, "Budget du salon", "Réserver le stand, budget impression des flyers.")
+    make_note(uid, "Recette", "Crêpes : farine, oeufs, lait.")
+    make_note(other, "Budget du salon", "budget flyers stand")
+
+    # Lecture seule : avant l'indexation, rien à trouver et du retard signalé
+    res = client.get("/notes/similar", params={"user_id": uid, "q": "budget flyers"})
+    assert (res.json(), res.headers["x-index-pending"]) == ([], "2")
+
+    hits = similar(client, uid, "budget flyers")
+    assert [h["id"] for h in hits] == [budget["id"]]
+    assert "flyers" in hits[0]["chunk"]["text"]
+    assert 0 < hits[0]["score"] <= 1
+    # Requête sans mot significatif : aucun résultat au-dessus du seuil
+    assert similar(client, uid, "de la") == []
+
+
+def test_similar_notes_limited_to_project(client, make_user, make_note):
+    uid = make_user("similar-project")
+    pid = client.post("/projects/", json={"user_id": uid, "name": "Salon"}).json()["id"]
+    inside = make_note(uid, "Stand", "budget du stand", project_ids=[pid])
+    make_note(uid, "Perso", "budget des vacances")
+
+    assert [h["id"] for h in similar(client, uid, "budget", project_id=pid)] == [inside["id"]]
+    assert len(similar(client, uid, "budget")) == 2
+
+
+def test_edited_note_is_searched_with_its_new_content(client, make_user, make_note):
+    uid = make_user("similar-edit")
+    note = make_note(uid, "Note", "jardinage et tomates")
+    assert similar(client, uid, "tomates")
+
+    client.put(f"/notes/{note['id']}", json={"content": "astronomie et télescopes"})
+
+    assert similar(client, uid, "tomates") == []
+    assert [h["id"] for h in similar(client, uid, "telescope")] == [note["id"]]
+
+
+def test_refresh_is_incremental_and_follows_the_embedder(db, make_user, make_note, monkeypatch):
+    uid = make_user("embed-refresh")
+    make_note(uid, "A", "premier paragraphe")
+    make_note(uid, "B", "second paragraphe")
+
+    assert refresh_embeddings(db, uid) == 2
+    assert refresh_embeddings(db, uid) == 0
+
+    class Small(HashingEmbedder):
+        name = "hashing-test"
+
+    monkeypatch.setitem(embeddings.EMBEDDERS, "hashing-test", Small(dim=32))
+    monkeypatch.setattr(embeddings, "DEFAULT_EMBEDDER", "hashing-test")
+    # Changer d'embedder invalide tous les vecteurs existants
+    assert refresh_embeddings(db, uid) == 2
+    assert refresh_embeddings(db, uid) == 0
+
+
+def test_project_prompt_uses_closest_passages(client, make_user, make_note):
+    uid = make_user("prompt")
+    pid = client.post("/projects/", json={"user_id": uid, "name": "Salon"}).json()["id"]
+    make_note(uid, "Logistique", "# Transport\nLouer une camionnette.\n\n# Budget\nDevis imprimeur reçu.", project_ids=[pid])
+    make_note(uid, "Idées", "Thème du stand : la forêt.", project_ids=[pid])
+    drain()
+    invalidate_project_prompts([pid])
+
+    prompt = _build_project_system_prompt(pid, "devis imprimeur")
+
+    assert "- Logistique › Budget: # Budget Devis imprimeur reçu." in prompt
+    assert "camionnette" not in prompt
+    # Sans message : notes épinglées puis récentes
+    assert "Idées" in _build_project_system_prompt(pid)
@@ -0,0 +1,166 @@
+# backend/tests/test_graph.py
+import itertools
+
+import pytest
+from sqlalchemy import delete, select
+
+from database.models import NoteConcept, NoteLink
+from services import graph_services
+from services.graph_services import refresh_links, title_key, wiki_targets
+from services.indexing import drain
+
+# Tags de chaque note : concepts partagés à des degrés divers
+TAGS = {
+    "A": ["rouge", "vert", "bleu"],
+    "B": ["rouge", "vert"],
+    "C": ["rouge"],
+    "D": ["vert", "bleu"],
+    "E": ["bleu", "jaune"],
+    "F": ["jaune"],
+}
+
+
+def links(client, note_id, what, **params):
+    res = client.get(f"/notes/{note_id}/{what}", params=params)
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def concept_edges(db, user_id) -> set:
+    db.expire_all()
+    return {
+        (s, t, round(w, 4)) for s, t, w in db.execute(
+            select(NoteLink.source_id, NoteLink.target_id, NoteLink.weight)
+            .where(NoteLink.user_id == user_id, NoteLink.kind == "concept")
+        )
+    }
+
+
+def reset_concepts(db, user_id) -> None:
+    db.execute(delete(NoteLink).where(NoteLink.user_id == user_id, NoteLink.kind == "concept"))
+    db.execute(delete(NoteConcept).where(NoteConcept.user_id == user_id))
+    db.commit()
+
+
+@pytest.fixture
+def tagged(make_user, make_note):
+    uid = make_user("graph")
+    ids = {name: make_note(uid, name, "x", tag_names=tags)["id"] for name, tags in TAGS.items()}
+    return uid, ids
+
+
+def test_wiki_targets_and_title_keys():
+    assert title_key("  Budget   Salon ") == "budget salon"
+    assert wiki_targets("voir [[Budget  salon|le budget]], [[Plan#Étapes]] et [[ ]]") == {"budget salon", "plan"}
+
+
+def test_wiki_links_backlinks_and_late_targets(client, make_user, make_note):
+    uid = make_user("wiki")
+    source = make_note(uid, "Source", "Voir [[Cible]] et [[Plus tard]].")
+    target = make_note(uid, "cible", "rien")
+    drain()
+
+    assert [n["id"] for n in links(client, target["id"], "backlinks")] == [source["id"]]
+    out = links(client, source["id"], "neighbors", kinds="wiki")
+    assert [(n["id"], n["direction"]) for n in out] == [(target["id"], "out")]
+    assert [(n["id"], n["direction"]) for n in links(client, target["id"], "neighbors", kinds="wiki")] == [
+        (source["id"], "in")
+    ]
+
+    # Note créée après le lien : récupère son lien entrant
+    late = make_note(uid, "Plus tard", "")
+    drain()
+    assert [n["id"] for n in links(client, late["id"], "backlinks")] == [source["id"]]
+
+    # Renommée : le lien suit le titre
+    client.put(f"/notes/{target['id']}", json={"title": "Autre"})
+    drain()
+    assert links(client, target["id"], "backlinks") == []
+    assert client.get(f"/notes/{target['id']}/neighbors", params={"kinds": "autre"}).status_code == 400
+
+
+def test_concept_links_keep_top_k_per_note(client, db, tagged, monkeypatch):
+    monkeypatch.setattr(graph_services, "CONCEPT_LINKS_PER_NOTE", 1)
+    uid, ids = tagged
+    drain()
+
+    edges = concept_edges(db, uid)
+    assert {s for s, _, _ in edges} == set(ids.values())
+    assert len(edges) == len(ids)
+    # F ne partage que « jaune » avec E : seule voisine possible
+    assert (ids["F"], ids["E"]) in {(s, t) for s, t, _ in edges}
+
+    # Voisins lus sans orientation, une ligne par note
+    neighbours = links(client, ids["E"], "neighbors", kinds="concept")
+    assert len({n["id"] for n in neighbours}) == len(neighbours)
+    assert ids["F"] in {n["id"] for n in neighbours}
+    assert all(n["direction"] == "both" for n in neighbours)
+
+
+def test_concept_links_do_not_depend_on_indexing_order(db, tagged, monkeypatch):
+    monkeypatch.setattr(graph_services, "CONCEPT_LINKS_PER_NOTE", 1)
+    uid, ids = tagged
+    reset_concepts(db, uid)
+    refresh_links(db, uid, ids.values())
+    db.commit()
+    expected = concept_edges(db, uid)
+
+    for order in itertools.islice(itertools.permutations(ids.values()), 0, None, 97):
+        reset_concepts(db, uid)
+        for note_id in order:
+            refresh_links(db, uid, [note_id])
+            db.commit()
+        assert concept_edges(db, uid) == expected
+
+
+def test_edits_and_deletes_update_neighbours(client, db, tagged, monkeypatch):
+    monkeypatch.setattr(graph_services, "CONCEPT_LINKS_PER_NOTE", 1)
+    uid, ids = tagged
+    drain()
+
+    # Un seul lot, comme l'indexation après une modification
+    client.put(f"/notes/{ids['C']}", json={"tag_names": ["jaune"]})
+    drain()
+    incremental = concept_edges(db, uid)
+    reset_concepts(db, uid)
+    refresh_links(db, uid, ids.values())
+    db.commit()
+    assert incremental == concept_edges(db, uid)
+
+    # F ne garde pas de lien vers une note supprimée : il en reprend une autre
+    client.delete(f"/notes/{ids['E']}")
+    drain()
+    edges = concept_edges(db, uid)
+    assert all(ids["E"] not in (s, t) for s, t, _ in edges)
+    assert (ids["F"], ids["C"]) in {(s, t) for s, t, _ in edges}
+
+
+def test_subgraph_walks_links_both_ways(client, make_user, make_note):
+    uid = make_user("subgraph")
+    a = make_note(uid, "A", "[[B]]")
+    b = make_note(uid, "B", "[[C]]")
+    c = make_note(uid, "C", "x", tag_names=["commun"])
+    d = make_note(uid, "D", "x", tag_names=["commun"])
+    drain()
+
+    graph = links(client, c["id"], "graph", depth=1)
+    assert {n["id"]: n["depth"] for n in graph["nodes"]} == {c["id"]: 0, b["id"]: 1, d["id"]: 1}
+    assert sorted((e["kind"], e["source"], e["target"]) for e in graph["edges"]) == sorted([
+        ("wiki", b["id"], c["id"]),
+        ("concept", min(c["id"], d["id"]), max(c["id"], d["id"])),
+    ])
+
+    graph = links(client, d["id"], "graph", depth=3, kinds="wiki,concept")
+    assert {n["id"]: n["depth"] for n in graph["nodes"]}[a["id"]] == 3
+    assert [n["id"] for n in links(client, d["id"], "graph", depth=3, kinds="wiki")["nodes"]] == [d["id"]]
+
+
+def test_subgraph_walk_is_capped(db, make_user, make_note, monkeypatch):
+    uid = make_user("subgraph-cap")
+    notes = [make_note(uid, f"N{i}", f"[[N{i + 1}]]") for i in range(5)]
+    drain()
+
+    monkeypatch.setattr(graph_services, "GRAPH_MAX_VISITS", 3)
+    graph = graph_services.subgraph(db, notes[0]["id"], depth=4)
+
+    assert [n["id"] for n in graph["nodes"]] == [n["id"] for n in notes[:3]]
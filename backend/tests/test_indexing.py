@@ -0,0 +1,188 @@
+# backend/tests/test_indexing.py
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from database.models import Note, NoteChange, NoteChunk
+from database.session import AsyncSessionLocal
+from services import indexing
+from services.indexing import (
+    IndexWorkers, drain, indexing_stats, process_batch, record_changes, wait_until_indexed,
+)
+
+
+@pytest.fixture
+def journal(app, db):
+    """Journal vide au départ : les lignes laissées par d'autres tests ne faussent pas les comptes."""
+    drain()
+    db.execute(delete(NoteChange))
+    db.commit()
+    yield
+    db.execute(delete(NoteChange))
+    db.commit()
+
+
+def changes(db, note_id):
+    db.expire_all()
+    return db.scalars(select(NoteChange).where(NoteChange.note_id == note_id).order_by(NoteChange.id)).all()
+
+
+def chunk_count(db, note_id):
+    return len(db.scalars(select(NoteChunk.id).where(NoteChunk.note_id == note_id)).all())
+
+
+def test_writes_are_journaled_then_indexed(client, db, journal, make_user, make_note):
+    uid = make_user("journal")
+    note = make_note(uid, "Titre", "# Un\nPremier.\n\n# Deux\nSecond.")
+    client.put(f"/notes/{note['id']}", json={"tag_names": ["x"]})
+
+    assert [c.kind for c in changes(db, note["id"])] == ["content", "links"]
+    assert chunk_count(db, note["id"]) == 0
+
+    assert drain() == 2
+    assert changes(db, note["id"]) == []
+    assert chunk_count(db, note["id"]) == 2
+    vectors = db.scalars(select(NoteChunk.vector).where(NoteChunk.note_id == note["id"])).all()
+    assert all(vectors)
+
+    assert client.delete(f"/notes/{note['id']}").status_code in (200, 204)
+    assert [c.kind for c in changes(db, note["id"])] == ["delete"]
+    drain()
+    assert chunk_count(db, note["id"]) == 0
+
+
+def test_indexer_repairs_rows_written_without_derived_fields(db, journal, make_user, make_note):
+    uid = make_user("journal-derived")
+    note = make_note(uid, "Direct", "Écrit hors de l'API.")
+    db.execute(update(Note).where(Note.id == note["id"]).values(contentHash=None, wordCount=None, summary=None))
+    db.commit()
+
+    drain()
+
+    db.expire_all()
+    row = db.get(Note, note["id"])
+    assert (row.wordCount, row.summary) == (4, "Écrit hors de l'API.")
+
+
+def test_rolled_back_changes_are_not_journaled(db, journal, make_user, make_note):
+    uid = make_user("journal-rollback")
+    note = make_note(uid)
+    drain()
+
+    record_changes(db, uid, [note["id"]], "content")
+    db.rollback()
+
+    assert changes(db, note["id"]) == []
+    assert not db.info.get(indexing._PENDING_KEY)
+
+
+def test_failed_batches_are_retried_then_abandoned(db, journal, make_user, make_note, monkeypatch):
+    def broken(db, user_id, changed, deleted):
+        raise RuntimeError("indexeur en panne")
+
+    monkeypatch.setitem(indexing.INDEXERS, "broken", broken)
+    monkeypatch.setattr(indexing, "INDEXER_MAX_ATTEMPTS", 2)
+    uid = make_user("journal-fail")
+    note = make_note(uid)
+
+    assert process_batch() == 1
+    [row] = changes(db, note["id"])
+    assert (row.attempts, row.claimToken) == (1, None)
+    assert row.lastError == "RuntimeError: indexeur en panne"
+    # Réservation toujours en cours : pas repris avant l'expiration du bail
+    assert process_batch() == 0
+
+    monkeypatch.setattr(indexing, "INDEXER_LEASE", timedelta(0))
+    assert process_batch() == 1
+    assert changes(db, note["id"])[0].attempts == 2
+    # Abandonné : plus réservé, compté à part
+    assert process_batch() == 0
+    stats = indexing_stats()
+    assert (stats["pending"], stats["failed"]) == (0, 1)
+    assert stats["last_error"] == "RuntimeError: indexeur en panne"
+
+
+def test_a_failing_note_does_not_block_the_batch(db, journal, make_user, make_note, monkeypatch):
+    uid, other = make_user("journal-isolated"), make_user("journal-isolated-other")
+    bad = make_note(uid, "Mauvaise", "Contenu.")
+    good = make_note(uid, "Bonne", "Contenu.")
+    elsewhere = make_note(other, "Ailleurs", "Contenu.")
+
+    def broken(db, user_id, changed, deleted):
+        if bad["id"] in changed:
+            raise RuntimeError("note illisible")
+
+    monkeypatch.setitem(indexing.INDEXERS, "broken", broken)
+
+    assert process_batch() == 3
+
+    [row] = changes(db, bad["id"])
+    assert (row.attempts, row.lastError) == (1, "RuntimeError: note illisible")
+    for note in (good, elsewhere):
+        assert changes(db, note["id"]) == []
+        assert chunk_count(db, note["id"]) == 1
+
+
+def test_wait_gives_up_on_rows_claimed_elsewhere(db, journal, make_user, make_note):
+    uid = make_user("journal-wait-claimed")
+    make_note(uid)
+    # Lot réservé par un autre process : rien à traiter ici avant la fin du bail
+    assert indexing._claim(10) is not None
+
+    started = time.monotonic()
+    assert asyncio.run(asyncio.wait_for(wait_until_indexed(0.2), 5)) is False
+    assert time.monotonic() - started < 2
+
+
+def test_expired_claims_are_taken_over(db, journal, make_user, make_note, monkeypatch):
+    uid = make_user("journal-lease")
+    note = make_note(uid)
+    # Lot réservé par un worker disparu
+    assert indexing._claim(10) is not None
+    assert process_batch() == 0
+
+    monkeypatch.setattr(indexing, "INDEXER_LEASE", timedelta(0))
+    assert process_batch() == 1
+    assert changes(db, note["id"]) == []
+
+
+def test_wait_route_indexes_without_workers(client, db, journal, make_user, make_note):
+    uid = make_user("journal-wait")
+    note = make_note(uid, "Attente", "Du contenu.")
+
+    res = client.post("/notes/indexing/wait", params={"timeout": 5})
+
+    assert res.status_code == 200, res.text
+    assert res.json()["pending"] == 0
+    assert chunk_count(db, note["id"]) == 1
+    assert client.get("/notes/indexing/status").json()["workers"] == 0
+
+
+def test_workers_are_woken_by_commits(db, journal, make_user, make_note, monkeypatch):
+    # Scrutation très lente : seul le réveil au commit peut traiter la ligne à temps
+    monkeypatch.setattr(indexing, "INDEXER_POLL_INTERVAL", 60)
+    uid = make_user("journal-workers")
+    note = make_note(uid)
+    drain()
+
+    async def scenario():
+        pool = IndexWorkers(count=1)
+        monkeypatch.setattr(indexing, "workers", pool)
+        pool.start()
+        try:
+            await asyncio.sleep(0.05)
+            async with AsyncSessionLocal() as session:
+                record_changes(session, uid, [note["id"]], "content")
+                await session.commit()
+            for _ in range(100):
+                if not await asyncio.to_thread(indexing._pending_up_to, None):
+                    return True
+                await asyncio.sleep(0.05)
+            return False
+        finally:
+            await pool.stop()
+
+    assert asyncio.run(scenario())
@@ -0,0 +1,85 @@
+# backend/tests/test_llm_cache.py
+import asyncio
+
+import pytest
+
+from services import llm_providers, llm_services
+from services.llm_cache import LLMResponseCache, cache_key
+from services.llm_providers import EchoProvider
+
+MESSAGES = [{"role": "user", "content": "bonjour"}]
+
+
+class CountingEcho(EchoProvider):
+    name = "counting"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def complete(self, messages, model, temperature):
+        self.calls += 1
+        return super().complete(messages, model, temperature)
+
+    async def acomplete(self, messages, model, temperature):
+        self.calls += 1
+        return await super().acomplete(messages, model, temperature)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    p = CountingEcho()
+    monkeypatch.setitem(llm_providers.PROVIDERS, p.name, p)
+    monkeypatch.setattr(llm_services, "response_cache", LLMResponseCache(maxsize=16))
+    return p
+
+
+def test_cache_key_normalizes_whitespace_and_depends_on_model():
+    a = cache_key("m", 0, [{"role": "user", "content": "a  b\n"}])
+    assert a == cache_key("m", 0.0, [{"role": "user", "content": "a b"}])
+    assert a != cache_key("autre", 0, [{"role": "user", "content": "a b"}])
+    assert a != cache_key("m", 0.5, [{"role": "user", "content": "a b"}])
+
+
+def test_temperature_zero_is_cached(provider):
+    first = llm_services.get_llm_response(MESSAGES, temperature=0, provider="counting")
+    second = asyncio.run(llm_services.aget_llm_response(MESSAGES, temperature=0, provider="counting"))
+
+    assert first == second
+    assert provider.calls == 1
+
+
+def test_sampling_is_not_cached_unless_forced(provider):
+    llm_services.get_llm_response(MESSAGES, temperature=0.7, provider="counting")
+    llm_services.get_llm_response(MESSAGES, temperature=0.7, provider="counting")
+    assert provider.calls == 2
+
+    llm_services.get_llm_response(MESSAGES, temperature=0.7, provider="counting", cache=True)
+    llm_services.get_llm_response(MESSAGES, temperature=0.7, provider="counting", cache=True)
+    assert provider.calls == 3
+
+    llm_services.get_llm_response(MESSAGES, temperature=0, provider="counting", cache=False)
+    assert provider.calls == 4
+    assert llm_services.response_cache.stats()["bypassed"] == 3
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    LLMResponseCache(disk_path=path).set("k", "v")
+
+    fresh = LLMResponseCache(disk_path=path)
+
+    assert fresh.get("k") == "v"
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_expiry(tmp_path):
+    cache = LLMResponseCache(ttl=-1, disk_path=str(tmp_path / "llm_cache.db"))
+    cache._disk.set("k", "v", -1)
+    assert cache._disk.get("k") is None
+
+
+def test_empty_replies_are_not_cached():
+    cache = LLMResponseCache()
+    cache.set("k", "")
+    assert cache.get("k") is None
@@ -0,0 +1,199 @@
+# backend/tests/test_llm_client.py
+"""Client LLM async contre un faux serveur OpenAI : retries, timeout, concurrence, SSE."""
+import asyncio
+import json
+
+import pytest
+from openai import APITimeoutError, BadRequestError, InternalServerError
+
+from services import llm_providers, llm_services
+from services.llm_providers import OpenAIProvider
+from tests.fake_llm import FakeLLMServer
+
+MESSAGES = [{"role": "user", "content": "u1: bonjour"}]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeLLMServer().start()
+    monkeypatch.setenv("OPENAI_BASE_URL", fake.base_url)
+    monkeypatch.setattr(llm_providers, "LLM_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(llm_providers, "LLM_MAX_RETRIES", 2)
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def provider(monkeypatch, server):
+    p = OpenAIProvider()
+    monkeypatch.setitem(llm_providers.PROVIDERS, "openai", p)
+    return p
+
+
+def run(provider, coro):
+    """asyncio.run() qui ferme le client httpx avant la fin de la boucle."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await provider.aclose()
+    return asyncio.run(main())
+
+
+def test_reply(server, provider):
+    assert run(provider, provider.acomplete(MESSAGES, "gpt-test", 0)) == "réponse du faux serveur"
+
+
+def test_retries_server_errors(server, provider):
+    server.fail_first = 2
+
+    assert run(provider, provider.acomplete(MESSAGES, "gpt-test", 0)) == "réponse du faux serveur"
+    assert server.requests == 3
+
+
+def test_retries_rate_limits(server, provider):
+    server.fail_first, server.fail_status = 1, 429
+
+    assert run(provider, provider.acomplete(MESSAGES, "gpt-test", 0)) == "réponse du faux serveur"
+    assert server.requests == 2
+
+
+def test_gives_up_after_max_retries(server, provider):
+    server.fail_first = 10
+
+    with pytest.raises(InternalServerError):
+        run(provider, provider.acomplete(MESSAGES, "gpt-test", 0))
+    assert server.requests == 3
+
+
+def test_client_errors_are_not_retried(server, provider):
+    server.fail_first, server.fail_status = 1, 400
+
+    with pytest.raises(BadRequestError):
+        run(provider, provider.acomplete(MESSAGES, "gpt-test", 0))
+    assert server.requests == 1
+
+
+def test_timeout_is_retried_then_raised(monkeypatch, server, provider):
+    monkeypatch.setattr(llm_providers, "LLM_TIMEOUT", 0.2)
+    monkeypatch.setattr(llm_providers, "LLM_MAX_RETRIES", 1)
+    server.delay = 1.0
+
+    with pytest.raises(APITimeoutError):
+        run(provider, provider.acomplete(MESSAGES, "gpt-test", 0))
+    assert server.requests == 2
+
+
+def test_stream_retries_opening(server, provider):
+    server.fail_first = 1
+
+    async def collect():
+        return [d async for d in provider.astream(MESSAGES, "gpt-test", 0)]
+
+    assert "".join(run(provider, collect())).strip() == "réponse du faux serveur"
+    assert server.requests == 2
+
+
+def test_concurrency_limits(monkeypatch, server, provider):
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY", 3)
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY_PER_USER", 2)
+    server.delay = 0.1
+
+    async def burst():
+        calls = [
+            llm_services.aget_llm_response(
+                [{"role": "user", "content": f"{user}: question {i}"}],
+                user_id=user, provider="openai", cache=False,
+            )
+            for user in ("alice", "bob", "carol")
+            for i in range(4)
+        ]
+        return await asyncio.gather(*calls)
+
+    replies = run(provider, burst())
+
+    assert len(replies) == 12
+    assert server.max_in_flight == 3
+    assert max(server.max_in_flight_by_user.values()) == 2
+
+
+def test_queue_timeout_raises_busy(monkeypatch, server, provider):
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY_PER_USER", 1)
+    monkeypatch.setattr(llm_services, "LLM_QUEUE_TIMEOUT", 0.05)
+    server.delay = 0.3
+
+    async def two_calls():
+        return await asyncio.gather(
+            *[llm_services.aget_llm_response(MESSAGES, user_id="u1", provider="openai", cache=False)
+              for _ in range(2)],
+            return_exceptions=True,
+        )
+
+    results = run(provider, two_calls())
+
+    assert sum(isinstance(r, llm_services.LLMBusyError) for r in results) == 1
+
+
+def test_each_loop_gets_its_own_client(server, provider):
+    first_loop = asyncio.new_event_loop()
+    try:
+        first_loop.run_until_complete(provider.acomplete(MESSAGES, "gpt-test", 0))
+        [first_client] = provider._aclients.values()
+
+        # Autre boucle : autre client, celui de la première reste ouvert
+        run(provider, provider.acomplete(MESSAGES, "gpt-test", 0))
+        assert not first_client.is_closed()
+
+        first_loop.run_until_complete(provider.aclose())
+        assert first_client.is_closed()
+        assert len(provider._aclients) == 0
+    finally:
+        first_loop.close()
+
+
+def test_closed_stream_releases_its_slot(monkeypatch, server, provider):
+    monkeypatch.setattr(llm_services, "LLM_MAX_CONCURRENCY_PER_USER", 1)
+    monkeypatch.setattr(llm_services, "LLM_QUEUE_TIMEOUT", 0.5)
+
+    async def abandon_then_ask():
+        stream = llm_services.astream_llm_response(MESSAGES, user_id="u1", provider="openai", cache=False)
+        await stream.__anext__()
+        # Client SSE parti après le premier fragment
+        await stream.aclose()
+        return await llm_services.aget_llm_response(MESSAGES, user_id="u1", provider="openai", cache=False)
+
+    assert run(provider, abandon_then_ask()) == "réponse du faux serveur"
+    assert "u1" not in llm_services._pool.user_slots
+
+
+def sse_events(body: str):
+    for block in body.strip().split("\n\n"):
+        event, data = None, None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+        yield event, data
+
+
+def test_chat_stream_route(client, make_user, server, provider):
+    uid = make_user()
+    res = client.post("/api/agent/chat/stream", json={"user_id": uid, "message": f"{uid}: salut", "provider": "openai"})
+
+    assert res.status_code == 200
+    events = list(sse_events(res.text))
+    assert events[0][0] == "meta"
+    deltas = "".join(d["delta"] for e, d in events if e is None)
+    assert deltas.strip() == "réponse du faux serveur"
+    assert events[-1] == ("done", {"reply": "réponse du faux serveur"})
+
+
+def test_chat_stream_reports_errors(client, make_user, server, provider):
+    server.fail_first = 10
+    uid = make_user()
+    res = client.post("/api/agent/chat/stream", json={"user_id": uid, "message": f"{uid}: salut", "provider": "openai"})
+
+    events = list(sse_events(res.text))
+    assert events[0][0] == "meta"
+    assert events[-1][0] == "error"
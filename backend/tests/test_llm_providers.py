@@ -0,0 +1,56 @@
+# backend/tests/test_llm_providers.py
+import asyncio
+
+import pytest
+
+from services.llm_providers import EchoProvider, UnknownProviderError, get_provider
+
+MESSAGES = [{"role": "system", "content": "s"}, {"role": "user", "content": "bonjour le monde"}]
+
+
+def test_echo_provider_sync_async_and_stream():
+    echo = EchoProvider()
+
+    async def collect():
+        return [d async for d in echo.astream(MESSAGES, "echo-1", 0)]
+
+    assert echo.complete(MESSAGES, "echo-1", 0) == "[echo-1] bonjour le monde"
+    assert asyncio.run(echo.acomplete(MESSAGES, "echo-1", 0)) == "[echo-1] bonjour le monde"
+    assert "".join(echo.stream(MESSAGES, "echo-1", 0)) == "".join(asyncio.run(collect()))
+
+
+def test_unknown_provider():
+    with pytest.raises(UnknownProviderError):
+        get_provider("inexistant")
+
+
+def chat(client, uid, **fields):
+    return client.post("/api/agent/chat", json={"user_id": uid, "message": "ping", **fields})
+
+
+def test_chat_with_request_provider(client, make_user):
+    res = chat(client, make_user(), provider="echo", model="echo-test")
+
+    assert res.status_code == 200, res.text
+    assert res.json()["reply"] == "[echo-test] ping"
+
+
+def test_project_settings_then_request_override(client, make_user):
+    uid = make_user()
+    pid = client.post(
+        "/projects/", json={"user_id": uid, "name": "P", "llmProvider": "echo", "llmModel": "echo-projet"}
+    ).json()["id"]
+
+    assert chat(client, uid, project_id=pid).json()["reply"] == "[echo-projet] ping"
+    assert chat(client, uid, project_id=pid, model="echo-requete").json()["reply"] == "[echo-requete] ping"
+
+    client.put(f"/projects/{pid}", json={"llmModel": "echo-modifie"})
+    assert chat(client, uid, project_id=pid).json()["reply"] == "[echo-modifie] ping"
+
+
+def test_unknown_provider_is_rejected(client, make_user):
+    uid = make_user()
+
+    assert chat(client, uid, provider="inexistant").status_code == 400
+    res = client.post("/projects/", json={"user_id": uid, "name": "P", "llmProvider": "inexistant"})
+    assert res.status_code == 400
@@ -0,0 +1,199 @@
+# backend/tests/test_migrations.py
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from database.database import Base, engine as app_engine
+from database.migrations import MIGRATIONS, run_migrations
+from services.user_stats import compute_user_counters
+
+# Tables hors modèles : index FTS5 (SQLite) et suivi des versions
+_NOT_MODELED = ("notes_fts", "schema_migrations")
+# Colonnes hors modèles : tsvector de recherche (PostgreSQL, migration 0015)
+_NOT_MODELED_COLUMNS = {"notes": {"searchVector"}}
+
+
+@pytest.fixture
+def migration_engine(app, tmp_path):
+    """
+    Base vide pour rejouer les migrations : fichier SQLite temporaire, ou
+    schéma jetable dans la base PostgreSQL de test (les extensions restent
+    dans `public`, installées par l'import de l'app).
+    """
+    if app_engine.dialect.name != "postgresql":
+        engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+        yield engine
+        engine.dispose()
+        return
+
+    schema = f"migrations_{uuid.uuid4().hex[:8]}"
+    with app_engine.begin() as conn:
+        conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    engine = create_engine(app_engine.url, connect_args={"options": f"-csearch_path={schema},public"})
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with app_engine.begin() as conn:
+            conn.exec_driver_sql(f"DROP SCHEMA {schema} CASCADE")
+
+
+def integrity_check(engine) -> list:
+    if engine.dialect.name != "sqlite":
+        return ["ok"]
+    with engine.connect() as conn:
+        return [r[0] for r in conn.exec_driver_sql("PRAGMA integrity_check")]
+
+
+def insert_user_and_notes(engine, count: int = 3) -> None:
+    now = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            text('INSERT INTO users (id, name, email, "createdAt") VALUES (:id, :id, :id, :t)'),
+            {"id": "u1", "t": now},
+        )
+        for i in range(count):
+            conn.execute(
+                text(
+                    'INSERT INTO notes (id, user_id, title, content, pinned, "createdAt", "updatedAt") '
+                    "VALUES (:id, 'u1', :title, 'contenu', :pinned, :t, :t)"
+                ),
+                {"id": f"n{i}", "title": f"Note {i}", "pinned": False, "t": now},
+            )
+
+
+def test_versions_are_unique_and_contiguous():
+    versions = sorted(v for v, _, _ in MIGRATIONS)
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def test_migrated_schema_matches_models(app, db):
+    """Toute évolution de database/models.py doit avoir sa migration."""
+    inspector = inspect(db.get_bind())
+    tables = {t for t in inspector.get_table_names() if not t.startswith(_NOT_MODELED)}
+    assert tables == set(Base.metadata.tables)
+
+    for name, table in Base.metadata.tables.items():
+        columns = {c["name"] for c in inspector.get_columns(name)} - _NOT_MODELED_COLUMNS.get(name, set())
+        assert columns == {c.name for c in table.columns}, name
+        indexes = {i["name"] for i in inspector.get_indexes(name)}
+        assert {i.name for i in table.indexes} <= indexes, name
+
+
+def test_upgrade_of_populated_database(migration_engine):
+    run_migrations(migration_engine, target=1)
+    insert_user_and_notes(migration_engine)
+
+    run_migrations(migration_engine)
+
+    assert integrity_check(migration_engine) == ["ok"]
+    with migration_engine.connect() as conn:
+        done = {r[0] for r in conn.execute(text("SELECT version FROM schema_migrations"))}
+        assert done == {v for v, _, _ in MIGRATIONS}
+
+
+@pytest.mark.parametrize("target", [v for v, _, _ in sorted(MIGRATIONS)][:-1])
+def test_upgrade_from_each_version(migration_engine, target):
+    run_migrations(migration_engine, target=target)
+    if target >= 1:
+        insert_user_and_notes(migration_engine)
+
+    run_migrations(migration_engine)
+
+    assert integrity_check(migration_engine) == ["ok"]
+
+
+def test_migrations_are_idempotent(migration_engine):
+    """Bases créées avant le suivi des versions : chaque migration est rejouée."""
+    run_migrations(migration_engine)
+    insert_user_and_notes(migration_engine)
+    with migration_engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM schema_migrations")
+
+    run_migrations(migration_engine)
+
+    assert integrity_check(migration_engine) == ["ok"]
+    assert run_migrations(migration_engine) == []
+
+
+def test_note_embeddings_history_is_replayed_as_shipped(migration_engine):
+    """0009 / 0010 recréent la table livrée (FK, index), remplacée ensuite par note_chunks (0011)."""
+    run_migrations(migration_engine, target=9)
+    inspector = inspect(migration_engine)
+    assert {i["name"] for i in inspector.get_indexes("note_embeddings")} == {"ix_note_embeddings_user"}
+    assert {fk["referred_table"] for fk in inspector.get_foreign_keys("note_embeddings")} == {"notes", "users"}
+
+    run_migrations(migration_engine, target=10)
+    inspector = inspect(migration_engine)
+    assert {i["name"] for i in inspector.get_indexes("note_embeddings")} == {"ix_note_embeddings_user_model"}
+    assert "note_changes" in inspector.get_table_names()
+
+    run_migrations(migration_engine, target=11)
+    tables = inspect(migration_engine).get_table_names()
+    assert "note_embeddings" not in tables and "note_chunks" in tables
+
+
+def test_title_key_index_built_before_its_column_is_rebuilt(migration_engine):
+    """0003 telle que livrée : index sur "titleKey" avant l'ajout de la colonne (SQLite l'accepte)."""
+    if migration_engine.dialect.name != "sqlite":
+        pytest.skip("PostgreSQL refuse l'index sur une colonne absente")
+    run_migrations(migration_engine, target=2)
+    insert_user_and_notes(migration_engine)
+    with migration_engine.begin() as conn:
+        conn.exec_driver_sql('CREATE INDEX ix_notes_user_title_key ON notes (user_id, "titleKey")')
+    run_migrations(migration_engine, target=15)
+    assert integrity_check(migration_engine) != ["ok"]
+
+    run_migrations(migration_engine)
+
+    assert integrity_check(migration_engine) == ["ok"]
+    with migration_engine.begin() as conn:
+        conn.exec_driver_sql('UPDATE notes SET "titleKey" = lower(title)')
+        found = conn.execute(text('SELECT id FROM notes WHERE user_id = \'u1\' AND "titleKey" = \'note 1\'')).all()
+    assert found == [("n1",)]
+
+
+def test_user_counters_are_filled_from_existing_rows(migration_engine):
+    run_migrations(migration_engine, target=12)
+    insert_user_and_notes(migration_engine)
+    with migration_engine.begin() as conn:
+        conn.execute(text('UPDATE notes SET pinned = :t, "wordCount" = 4 WHERE id = \'n0\''), {"t": True})
+        conn.execute(
+            text(
+                'INSERT INTO projects (id, user_id, name, status, priority, "startDate", "createdAt", "updatedAt") '
+                "VALUES ('p1', 'u1', 'P', 'PAUSED', 0, :t, :t, :t)"
+            ),
+            {"t": datetime(2024, 1, 1)},
+        )
+        conn.execute(text("INSERT INTO project_notes (project_id, note_id, added_at) VALUES ('p1', 'n1', :t)"),
+                     {"t": datetime(2024, 1, 1)})
+
+    run_migrations(migration_engine, target=13)
+
+    with migration_engine.connect() as conn:
+        stored = {(c, r): v for c, r, v in conn.execute(text("SELECT counter, ref_id, value FROM user_counters"))}
+        actual = {k: v for k, v in compute_user_counters(conn, "u1").items() if v}
+    assert stored == actual
+    assert stored[("notes", "")] == 3 and stored[("projects", "PAUSED")] == 1 and stored[("project_notes", "p1")] == 1
+
+
+def test_constraint_failure_inside_a_migration_is_raised(migration_engine, monkeypatch):
+    """Une IntegrityError du corps de la migration n'est pas prise pour « déjà appliquée »."""
+    from database import migrations
+
+    def broken(conn):
+        conn.exec_driver_sql("CREATE TABLE broken_migration (id INTEGER PRIMARY KEY)")
+        conn.exec_driver_sql("INSERT INTO broken_migration (id) VALUES (1), (1)")
+
+    last = max(v for v, _, _ in MIGRATIONS)
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS + [(last + 1, "broken", broken)])
+
+    with pytest.raises(IntegrityError):
+        migrations.run_migrations(migration_engine)
+
+    with migration_engine.connect() as conn:
+        assert last + 1 not in migrations.applied_versions(conn)
+        assert last in migrations.applied_versions(conn)
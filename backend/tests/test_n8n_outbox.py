@@ -0,0 +1,219 @@
+# backend/tests/test_n8n_outbox.py
+import asyncio
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from sqlalchemy import select, update
+
+from database.models import N8nOutbox
+from database.session import AsyncSessionLocal
+from services import n8n_notify
+from services.n8n_notify import OutboxDispatcher, enqueue_event
+
+
+class StubWebhook:
+    """Webhook n8n local : enregistre les payloads, répond `status`."""
+
+    def __init__(self):
+        self.status = 200
+        self.received = []
+        self._httpd = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+
+    def start(self) -> "StubWebhook":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                stub.received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_response(stub.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def for_project(self, project_id):
+        return [p for p in self.received if p["project_id"] == project_id]
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    stub = StubWebhook().start()
+    monkeypatch.setattr(n8n_notify, "N8N_WEBHOOK_URL", stub.url)
+    monkeypatch.setattr(n8n_notify, "N8N_BACKOFF_BASE", 0.0)
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def project_id(app):
+    return f"outbox-{uuid.uuid4().hex[:8]}"
+
+
+async def enqueue(project_id, event="project_button_pressed"):
+    async with AsyncSessionLocal() as db:
+        return await enqueue_event(db, event=event, project_id=project_id)
+
+
+async def dispatch_once(post=None):
+    dispatcher = OutboxDispatcher()
+    dispatcher._client = httpx.AsyncClient(timeout=5)
+    if post is not None:
+        dispatcher._client.post = post
+    try:
+        return await dispatcher.dispatch_once()
+    finally:
+        await dispatcher._client.aclose()
+
+
+def rows(db, project_id):
+    db.expire_all()
+    return db.scalars(select(N8nOutbox).where(N8nOutbox.project_id == project_id).order_by(N8nOutbox.id)).all()
+
+
+def test_enqueue_coalesces_only_pending_rows(db, project_id):
+    first, coalesced = asyncio.run(enqueue(project_id))
+    assert not coalesced
+    assert asyncio.run(enqueue(project_id)) == (first, True)
+    assert rows(db, project_id)[0].coalesced == 1
+
+    # Ligne déjà partie ou en cours d'envoi : le nouvel événement a sa propre ligne
+    for status in ("sending", "sent"):
+        db.execute(update(N8nOutbox).where(N8nOutbox.project_id == project_id).values(status=status))
+        db.commit()
+        row_id, coalesced = asyncio.run(enqueue(project_id))
+        assert not coalesced and row_id != first
+        first = row_id
+    assert len(rows(db, project_id)) == 3
+
+
+def test_enqueue_does_not_coalesce_into_a_row_claimed_meanwhile(db, project_id):
+    first, _ = asyncio.run(enqueue(project_id))
+
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            lookup = session.scalar
+
+            async def claimed_after_lookup(*args, **kwargs):
+                # Le dispatcher réserve la ligne juste après la recherche du doublon
+                found = await lookup(*args, **kwargs)
+                db.execute(update(N8nOutbox).where(N8nOutbox.id == first).values(status="sending"))
+                db.commit()
+                return found
+
+            session.scalar = claimed_after_lookup
+            return await enqueue_event(session, event="project_button_pressed", project_id=project_id)
+
+    row_id, coalesced = asyncio.run(scenario())
+
+    assert not coalesced and row_id != first
+    assert [(r.status, r.coalesced) for r in rows(db, project_id)] == [("sending", 0), ("pending", 0)]
+
+
+def test_dispatch_delivers_to_webhook(db, webhook, project_id):
+    asyncio.run(enqueue(project_id))
+
+    assert asyncio.run(dispatch_once()) >= 1
+
+    [payload] = webhook.for_project(project_id)
+    assert payload["event"] == "project_button_pressed"
+    [row] = rows(db, project_id)
+    assert (row.status, row.attempts, row.lastError) == ("sent", 1, None)
+    assert row.sentAt is not None
+
+
+def test_failures_retry_then_go_dead(db, webhook, project_id, monkeypatch):
+    monkeypatch.setattr(n8n_notify, "N8N_MAX_ATTEMPTS", 2)
+    webhook.status = 500
+    asyncio.run(enqueue(project_id))
+
+    asyncio.run(dispatch_once())
+    [row] = rows(db, project_id)
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert row.lastError.startswith("HTTP 500")
+
+    asyncio.run(dispatch_once())
+    [row] = rows(db, project_id)
+    assert (row.status, row.attempts) == ("dead", 2)
+    assert len(webhook.for_project(project_id)) == 2
+
+
+def test_unexpected_send_errors_are_recorded(db, project_id):
+    async def broken_post(*args, **kwargs):
+        raise RuntimeError("payload refusé")
+
+    asyncio.run(enqueue(project_id))
+    asyncio.run(dispatch_once(post=broken_post))
+
+    [row] = rows(db, project_id)
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert row.lastError == "RuntimeError: payload refusé"
+
+
+def test_old_sent_rows_are_purged(db, project_id):
+    now = datetime.utcnow()
+    for age in (n8n_notify.N8N_SENT_RETENTION + 1, 1):
+        sent_at = now - timedelta(hours=age)
+        db.add(N8nOutbox(
+            event=f"sent-{age}", project_id=project_id, payload={}, status="sent",
+            attempts=1, coalesced=0, nextAttemptAt=sent_at, createdAt=sent_at, sentAt=sent_at,
+        ))
+    db.commit()
+
+    assert asyncio.run(OutboxDispatcher().purge_sent()) >= 1
+
+    assert [r.event for r in rows(db, project_id)] == ["sent-1"]
+
+
+def test_stale_sending_rows_are_requeued_on_every_poll(db, webhook, project_id):
+    """Un worker tué pendant l'envoi : la ligne repart sans redémarrage du dispatcher."""
+    long_ago = datetime.utcnow() - n8n_notify._STALE_SENDING - timedelta(seconds=5)
+    db.add(N8nOutbox(
+        event="project_button_pressed", project_id=project_id,
+        payload={"event": "project_button_pressed", "project_id": project_id},
+        status="sending", attempts=0, coalesced=0, nextAttemptAt=long_ago, createdAt=long_ago,
+    ))
+    db.commit()
+
+    asyncio.run(dispatch_once())
+
+    assert len(webhook.for_project(project_id)) == 1
+    assert rows(db, project_id)[0].status == "sent"
+
+
+def test_running_dispatcher_sends_new_events(webhook, project_id, monkeypatch):
+    monkeypatch.setattr(n8n_notify, "N8N_POLL_INTERVAL", 0.05)
+
+    async def scenario():
+        dispatcher = OutboxDispatcher()
+        dispatcher.start()
+        try:
+            await enqueue(project_id)
+            for _ in range(100):
+                if webhook.for_project(project_id):
+                    return True
+                await asyncio.sleep(0.05)
+            return False
+        finally:
+            await dispatcher.stop()
+
+    assert asyncio.run(scenario())
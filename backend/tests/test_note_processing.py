@@ -0,0 +1,94 @@
+# backend/tests/test_note_processing.py
+from sqlalchemy import update
+
+from database.backfill_notes import backfill
+from database.models import Note
+from services.note_processing import apply_content, content_hash, derived_fields, extractive_summary
+
+
+def test_extractive_summary_strips_markdown_and_headings():
+    content = "# Titre\n\n- [x] **Acheter** du `pain`.\n> Citation ici.\n1. Fin."
+    assert extractive_summary(content) == "Acheter du pain. Citation ici. Fin."
+    # Uniquement des titres : gardés, sans leur balisage
+    assert extractive_summary("## Seul titre") == "Seul titre"
+
+
+def test_extractive_summary_cuts_on_sentences_then_words():
+    content = "Première phrase courte. Deuxième phrase un peu plus longue. Troisième."
+    assert extractive_summary(content, max_chars=50) == "Première phrase courte."
+    long_sentence = "mot " * 100
+    summary = extractive_summary(long_sentence, max_chars=30)
+    assert summary.endswith("…") and len(summary) <= 31
+    assert not summary[:-1].endswith(" ")
+
+
+def test_derived_fields_prefer_user_summary():
+    auto = derived_fields("Un deux trois.")
+    assert auto == {
+        "contentHash": content_hash("Un deux trois."), "wordCount": 3,
+        "summary": "Un deux trois.", "autoSummary": True,
+    }
+    manual = derived_fields("Un deux trois.", "Le mien")
+    assert (manual["summary"], manual["autoSummary"]) == ("Le mien", False)
+
+
+def test_apply_content_recomputes_only_on_change():
+    note = Note(content="Alpha beta.", **derived_fields("Alpha beta."))
+    assert apply_content(note) is False
+    assert apply_content(note, "Alpha beta.") is False
+
+    assert apply_content(note, "Gamma delta epsilon.") is True
+    assert (note.wordCount, note.summary) == (3, "Gamma delta epsilon.")
+
+    # Résumé utilisateur conservé quand le contenu change
+    apply_content(note, summary="Manuel", summary_set=True)
+    apply_content(note, "Autre contenu.")
+    assert (note.summary, note.autoSummary) == ("Manuel", False)
+
+    # summary vide → retour au résumé automatique
+    assert apply_content(note, summary="", summary_set=True) is True
+    assert (note.summary, note.autoSummary) == ("Autre contenu.", True)
+
+
+def test_apply_content_on_legacy_rows():
+    # Lignes d'avant la migration 0008 : autoSummary NULL, pas d'empreinte
+    with_summary = Note(content="Texte ancien.", summary="Saisi à la main", autoSummary=None)
+    apply_content(with_summary)
+    assert (with_summary.summary, with_summary.autoSummary, with_summary.wordCount) == ("Saisi à la main", False, 2)
+
+    without = Note(content="Texte ancien.", summary=None, autoSummary=None)
+    apply_content(without)
+    assert (without.summary, without.autoSummary) == ("Texte ancien.", True)
+
+
+def test_routes_keep_derived_fields_in_sync(client, make_user, make_note):
+    uid = make_user("derived")
+    note = make_note(uid, "Note", "Un deux trois. Quatre.")
+    assert (note["wordCount"], note["summary"]) == (4, "Un deux trois. Quatre.")
+
+    updated = client.put(f"/notes/{note['id']}", json={"content": "Cinq six."}).json()
+    assert (updated["wordCount"], updated["summary"]) == (2, "Cinq six.")
+    updated = client.put(f"/notes/{note['id']}", json={"summary": "Perso"}).json()
+    assert updated["summary"] == "Perso"
+    updated = client.put(f"/notes/{note['id']}", json={"content": "Sept huit neuf."}).json()
+    assert (updated["wordCount"], updated["summary"]) == (3, "Perso")
+
+    stats = client.get(f"/users/{uid}/stats").json()
+    assert stats["words"] == 3
+
+
+def test_backfill_fills_missing_derived_fields(client, db, make_user, make_note):
+    uid = make_user("backfill")
+    note = make_note(uid, "Ancienne", "Contenu à reprendre.")
+    db.execute(
+        update(Note).where(Note.id == note["id"])
+        .values(contentHash=None, wordCount=None, summary=None, autoSummary=None)
+    )
+    db.commit()
+
+    assert backfill(batch_size=2) >= 1
+
+    db.expire_all()
+    row = db.get(Note, note["id"])
+    assert row.contentHash == content_hash("Contenu à reprendre.")
+    assert (row.wordCount, row.summary, row.autoSummary) == (3, "Contenu à reprendre.", True)
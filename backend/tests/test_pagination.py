@@ -0,0 +1,113 @@
+# backend/tests/test_pagination.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from database.models import Note
+
+from services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, select_fields
+
+
+def walk(client, url, limit, **params):
+    """Toutes les pages d'une liste ; retourne (lignes, nombre de pages)."""
+    items, pages, cursor = [], 0, None
+    while pages < 100:
+        res = client.get(url, params={"limit": limit, **({"cursor": cursor} if cursor else {}), **params})
+        assert res.status_code == 200, res.text
+        items += res.json()
+        pages += 1
+        cursor = res.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return items, pages
+    raise AssertionError("pagination sans fin")
+
+
+def test_cursor_round_trip():
+    created = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created, "abc")) == (created, "abc")
+    with pytest.raises(ValueError):
+        decode_cursor("pas-un-curseur")
+
+
+def test_select_fields():
+    available = {"id": 1, "title": 2, "pinned": 3}
+    assert list(select_fields("title, id,title", available, ["id"])) == ["title", "id"]
+    assert list(select_fields(None, available, ["id", "pinned"])) == ["id", "pinned"]
+    with pytest.raises(ValueError):
+        select_fields("id,secret", available, ["id"])
+
+
+def test_note_pages_cover_full_list_in_order(client, make_user, make_note):
+    uid = make_user()
+    for i in range(7):
+        make_note(uid, f"Note {i}")
+
+    full = client.get(f"/notes/user/{uid}").json()
+    paged, pages = walk(client, f"/notes/user/{uid}", 3)
+
+    assert pages == 3
+    assert [n["id"] for n in paged] == [n["id"] for n in full]
+    assert [n["title"] for n in paged] == [f"Note {i}" for i in reversed(range(7))]
+
+
+def test_same_created_at_is_ordered_by_id(client, db, make_user, make_note):
+    uid = make_user()
+    ids = [make_note(uid, f"Egal {i}")["id"] for i in range(5)]
+    db.execute(update(Note).where(Note.user_id == uid).values(createdAt=datetime(2024, 1, 1)))
+    db.commit()
+
+    paged, _ = walk(client, f"/notes/user/{uid}", 2)
+
+    assert [n["id"] for n in paged] == sorted(ids, reverse=True)
+
+
+def test_last_page_has_no_cursor(client, make_user, make_note):
+    uid = make_user()
+    for i in range(2):
+        make_note(uid, f"Note {i}")
+
+    res = client.get(f"/notes/user/{uid}", params={"limit": 2})
+
+    assert len(res.json()) == 2
+    assert NEXT_CURSOR_HEADER not in res.headers
+
+
+def test_fields_projection(client, make_user, make_note):
+    uid = make_user()
+    make_note(uid, "Projection", "contenu long", pinned=True)
+
+    res = client.get(f"/notes/user/{uid}", params={"fields": "id,title,pinned"})
+
+    assert res.status_code == 200
+    assert list(res.json()[0]) == ["id", "title", "pinned"]
+    assert client.get(f"/notes/user/{uid}", params={"fields": "id,nope"}).status_code == 400
+
+
+def test_invalid_cursor_is_rejected(client, make_user):
+    uid = make_user()
+    res = client.get(f"/notes/user/{uid}", params={"limit": 2, "cursor": "xyz"})
+    assert res.status_code == 400
+
+
+def test_project_and_area_lists(client, make_user, make_note):
+    uid = make_user()
+    project_ids = [
+        client.post("/projects/", json={"user_id": uid, "name": f"P{i}"}).json()["id"] for i in range(4)
+    ]
+    area_ids = [
+        client.post("/areas/", json={"user_id": uid, "name": f"A{i}"}).json()["id"] for i in range(3)
+    ]
+    note_ids = [
+        make_note(uid, f"N{i}", project_ids=[project_ids[0]], area_ids=[area_ids[0]])["id"] for i in range(5)
+    ]
+
+    projects, _ = walk(client, f"/projects/user/{uid}", 3)
+    areas, _ = walk(client, f"/areas/user/{uid}", 2)
+    project_notes, _ = walk(client, f"/projects/{project_ids[0]}/notes", 2)
+    area_notes, _ = walk(client, f"/areas/{area_ids[0]}/notes", 4)
+
+    assert [p["id"] for p in projects] == list(reversed(project_ids))
+    assert [a["id"] for a in areas] == list(reversed(area_ids))
+    assert [n["note_id"] for n in project_notes] == list(reversed(note_ids))
+    assert [n["note_id"] for n in area_notes] == list(reversed(note_ids))
@@ -0,0 +1,67 @@
+# backend/tests/test_prompt_cache.py
+import time
+
+from services.cache import TTLCache
+from services.conversation_services import _build_project_system_prompt, project_prompt_cache_stats
+
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # évince "b", le moins récemment lu
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1)
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.invalidate("a", "absent")
+    assert cache.get("a", "défaut") == "défaut"
+
+
+def make_project(client, uid, **fields):
+    res = client.post("/projects/", json={"user_id": uid, "name": "Salon", **fields})
+    assert res.status_code == 201, res.text
+    return res.json()["id"]
+
+
+def test_project_prompt_is_cached(client, make_user):
+    pid = make_project(client, make_user(), description="Organisation du salon")
+
+    first = _build_project_system_prompt(pid)
+    hits = project_prompt_cache_stats()["hits"]
+    second = _build_project_system_prompt(pid)
+
+    assert first == second
+    assert "Organisation du salon" in first
+    assert project_prompt_cache_stats()["hits"] == hits + 1
+
+
+def test_project_prompt_is_invalidated_by_writes(client, make_user, make_note):
+    uid = make_user()
+    pid = make_project(client, uid)
+    _build_project_system_prompt(pid)
+
+    client.put(f"/projects/{pid}", json={"description": "Nouvelle description"})
+    assert "Nouvelle description" in _build_project_system_prompt(pid)
+
+    note = make_note(uid, "Budget", "200 euros", project_ids=[pid])
+    assert "Budget" in _build_project_system_prompt(pid)
+
+    client.put(f"/notes/{note['id']}", json={"title": "Budget révisé"})
+    assert "Budget révisé" in _build_project_system_prompt(pid)
+
+    other = make_note(uid, "Traiteur", "menu")
+    client.post(f"/projects/{pid}/notes/{other['id']}")
+    assert "Traiteur" in _build_project_system_prompt(pid)
+
+    client.delete(f"/notes/{note['id']}")
+    assert "Budget révisé" not in _build_project_system_prompt(pid)
@@ -0,0 +1,86 @@
+# backend/tests/test_query_plans.py
+"""
+EXPLAIN QUERY PLAN (SQLite) des requêtes chaudes des routes : chacune doit
+passer par l'index prévu, sans scan complet ni tri temporaire des listes.
+"""
+import pytest
+from sqlalchemy import select
+
+from database.models import (
+    Area, Note, NoteChunk, NoteConcept, NoteLink, NoteLinkRef, Project, area_notes, note_tags, project_notes,
+)
+
+_UID = "00000000-0000-0000-0000-000000000000"
+
+HOT_QUERIES = [
+    ("notes par utilisateur (liste paginée)",
+     select(Note.id, Note.title).where(Note.user_id == _UID)
+     .order_by(Note.createdAt.desc(), Note.id.desc()).limit(50),
+     "ix_notes_user_created"),
+    ("projets par utilisateur (liste paginée)",
+     select(Project.id, Project.name).where(Project.user_id == _UID)
+     .order_by(Project.createdAt.desc(), Project.id.desc()).limit(50),
+     "ix_projects_user_created"),
+    ("zones par utilisateur (liste paginée)",
+     select(Area.id, Area.name).where(Area.user_id == _UID)
+     .order_by(Area.createdAt.desc(), Area.id.desc()).limit(50),
+     "ix_areas_user_created"),
+    ("notes d'un projet",
+     select(Note.id, Note.title).join(project_notes, project_notes.c.note_id == Note.id)
+     .where(project_notes.c.project_id == _UID),
+     "sqlite_autoindex_project_notes_1"),
+    ("notes d'une zone",
+     select(Note.id, Note.title).join(area_notes, area_notes.c.note_id == Note.id)
+     .where(area_notes.c.area_id == _UID),
+     "sqlite_autoindex_area_notes_1"),
+    ("projets d'une note (jointure inverse)",
+     select(project_notes.c.project_id).where(project_notes.c.note_id == _UID),
+     "ix_project_notes_note"),
+    ("zones d'une note (jointure inverse)",
+     select(area_notes.c.area_id).where(area_notes.c.note_id == _UID),
+     "ix_area_notes_note"),
+    ("notes d'un tag",
+     select(note_tags.c.note_id).where(note_tags.c.tag_id == _UID),
+     "ix_note_tags_tag"),
+    ("chunks d'une note",
+     select(NoteChunk.id).where(NoteChunk.note_id == _UID).order_by(NoteChunk.position),
+     "ix_note_chunks_note"),
+    ("vecteurs d'un utilisateur (index de recherche)",
+     select(NoteChunk.id, NoteChunk.vector).where(NoteChunk.user_id == _UID, NoteChunk.model == "hashing-512"),
+     "ix_note_chunks_user_model"),
+    ("liens sortants d'une note",
+     select(NoteLink.target_id).where(NoteLink.source_id == _UID, NoteLink.kind.in_(["wiki", "concept"])),
+     "sqlite_autoindex_note_links_1"),
+    ("rétroliens d'une note",
+     select(NoteLink.source_id).where(NoteLink.target_id == _UID, NoteLink.kind == "wiki"),
+     "ix_note_links_target"),
+    ("notes par titre normalisé (résolution des [[liens]])",
+     select(Note.id).where(Note.user_id == _UID, Note.titleKey.in_(["a", "b"])),
+     "ix_notes_user_title_key"),
+    ("notes citant un titre",
+     select(NoteLinkRef.source_id).where(NoteLinkRef.user_id == _UID, NoteLinkRef.target_key == "a"),
+     "ix_note_link_refs_key"),
+    ("fréquence des concepts",
+     select(NoteConcept.concept).where(NoteConcept.user_id == _UID, NoteConcept.concept.in_(["tag:a"])),
+     "ix_note_concepts_user_concept"),
+]
+
+
+def query_plan(engine, stmt):
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+@pytest.mark.parametrize("label,stmt,index", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(app, db, label, stmt, index):
+    engine = db.get_bind()
+    if engine.dialect.name != "sqlite":
+        pytest.skip("EXPLAIN QUERY PLAN : SQLite uniquement")
+
+    plan = query_plan(engine, stmt)
+
+    assert any(f"INDEX {index} " in step for step in plan), plan
+    assert not [step for step in plan if step.startswith("SCAN") and "USING" not in step], plan
+    if "liste paginée" in label:
+        assert not [step for step in plan if "TEMP B-TREE" in step], plan
@@ -0,0 +1,165 @@
+# backend/tests/test_search.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from database.migrations import run_migrations
+from services.search_services import build_match_query, rebuild_notes_fts, search_notes
+
+
+def search(client, user_id, q, **params):
+    res = client.get("/notes/search", params={"user_id": user_id, "q": q, **params})
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def is_sqlite(db):
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def test_match_query_quotes_terms_and_prefixes_last():
+    assert build_match_query('a"b  ') == '{title content summary tags} : ("a""b"*)'
+    assert build_match_query("budget salon") == '{title content summary tags} : ("budget" "salon"*)'
+    assert build_match_query('  "" ') is None
+
+
+def test_search_ranks_title_before_content(client, make_user, make_note):
+    uid = make_user()
+    body = make_note(uid, "Courses", "acheter du budget pour le marché")
+    title = make_note(uid, "Budget annuel", "répartition des dépenses")
+
+    hits = search(client, uid, "budget")["items"]
+
+    assert [h["id"] for h in hits] == [title["id"], body["id"]]
+    assert "<mark>" in hits[1]["snippet"]
+
+
+def test_search_prefix_diacritics_and_tags(client, make_user, make_note):
+    uid = make_user()
+    note = make_note(uid, "Réunion", "ordre du jour", tag_names=["équipe"])
+
+    assert [h["id"] for h in search(client, uid, "reun")["items"]] == [note["id"]]
+    assert [h["id"] for h in search(client, uid, "equipe")["items"]] == [note["id"]]
+
+
+def test_search_never_returns_other_users_notes(client, make_user, make_note):
+    alice, bob = make_user("alice"), make_user("bob")
+    mine = make_note(alice, "Projet secret", "plan")
+    make_note(bob, "Projet secret", "plan de bob")
+
+    hits = search(client, alice, "secret")["items"]
+
+    assert [h["id"] for h in hits] == [mine["id"]]
+    assert "bob" not in hits[0]["snippet"]
+
+
+def test_search_does_not_match_user_id_tokens(client, make_user, make_note):
+    uid = make_user()
+    make_note(uid, "Titre", "contenu")
+
+    assert search(client, uid, uid.split("-")[0])["items"] == []
+
+
+def test_search_pagination(client, make_user, make_note):
+    uid = make_user()
+    for i in range(5):
+        make_note(uid, f"Page {i}", "pagination")
+
+    first = search(client, uid, "pagination", limit=2)
+    rest = search(client, uid, "pagination", limit=2, offset=first["next_offset"])
+    last = search(client, uid, "pagination", limit=2, offset=rest["next_offset"])
+
+    ids = [h["id"] for page in (first, rest, last) for h in page["items"]]
+    assert len(set(ids)) == 5
+    assert last["next_offset"] is None
+
+
+def test_search_follows_updates_tags_and_deletes(client, make_user, make_note):
+    uid = make_user()
+    note = make_note(uid, "Ancien", "texte", tag_names=["alpha"])
+
+    client.put(f"/notes/{note['id']}", json={"title": "Nouveau"})
+    assert search(client, uid, "ancien")["items"] == []
+    assert [h["id"] for h in search(client, uid, "nouveau")["items"]] == [note["id"]]
+
+    client.put(f"/notes/{note['id']}", json={"tag_names": ["beta"]})
+    assert search(client, uid, "alpha")["items"] == []
+    assert [h["id"] for h in search(client, uid, "beta")["items"]] == [note["id"]]
+
+    client.delete(f"/notes/{note['id']}")
+    assert search(client, uid, "nouveau")["items"] == []
+
+
+def test_search_does_not_depend_on_notes_rowid(client, db, make_user, make_note):
+    """`notes` a une clé TEXT : ses rowid peuvent être renumérotés (VACUUM)."""
+    if not is_sqlite(db):
+        pytest.skip("SQLite uniquement")
+    alice, bob = make_user("alice"), make_user("bob")
+    notes = [make_note(alice, f"Renumérotation {i}", f"mot{i}") for i in range(10)]
+    make_note(bob, "Autre", "mot0 mot1 mot2")
+
+    # Même effet qu'un VACUUM qui renumérote : aucun trigger ne se déclenche
+    db.execute(text("UPDATE notes SET rowid = -rowid"))
+    db.commit()
+
+    for i, note in enumerate(notes):
+        hits = search(client, alice, f"mot{i}")["items"]
+        assert [h["id"] for h in hits] == [note["id"]]
+    client.delete(f"/notes/{notes[0]['id']}")
+    assert search(client, alice, "mot0")["items"] == []
+    assert len(search(client, bob, "mot0")["items"]) == 1
+
+
+def test_rebuild_notes_fts(client, db, make_user, make_note):
+    if not is_sqlite(db):
+        pytest.skip("SQLite uniquement")
+    uid = make_user()
+    note = make_note(uid, "Reconstruction", "index")
+
+    rebuild_notes_fts(db.get_bind())
+
+    assert [h["id"] for h in search(client, uid, "reconstruction")["items"]] == [note["id"]]
+    count = db.execute(text("SELECT count(*) FROM notes_fts")).scalar()
+    assert count == db.execute(text("SELECT count(*) FROM notes")).scalar()
+
+
+def test_migration_0014_reindexes_existing_notes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    run_migrations(engine, target=13)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, name, email, \"passwordHash\", \"createdAt\") "
+            "VALUES ('u1', 'u', 'u@example.com', 'x', '2024-01-01')"
+        )
+        for i in range(3):
+            conn.exec_driver_sql(
+                "INSERT INTO notes (id, user_id, title, content, pinned, \"createdAt\", \"updatedAt\") "
+                f"VALUES ('n{i}', 'u1', 'Ancienne {i}', 'contenu{i}', 0, '2024-01-01', '2024-01-01')"
+            )
+
+    run_migrations(engine)
+
+    with Session(engine) as db:
+        assert [r["id"] for r in search_notes(db, "u1", "contenu1")] == ["n1"]
+        assert len(search_notes(db, "u1", "ancienne")) == 3
+    engine.dispose()
+
+
+def test_pg_search_uses_stored_vector(client, db, make_user, make_note):
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("PostgreSQL uniquement")
+    uid = make_user()
+    note = make_note(uid, "Vecteur", "stocké", tag_names=["indexé"])
+
+    vector = db.execute(text('SELECT "searchVector"::text FROM notes WHERE id = :id'), {"id": note["id"]}).scalar()
+    assert "'vecteur':1A" in vector and "'indexe':2B" in vector
+
+    # Table minuscule en test : on interdit le parcours séquentiel pour voir l'index
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = "\n".join(r[0] for r in db.execute(
+        text("""EXPLAIN SELECT id FROM notes, to_tsquery('simple', 'vecteur') AS query
+                WHERE user_id = :uid AND "searchVector" @@ query"""),
+        {"uid": uid},
+    ))
+    db.rollback()
+    assert "ix_notes_search_vector" in plan
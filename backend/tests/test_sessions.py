@@ -0,0 +1,129 @@
+# backend/tests/test_sessions.py
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import session as session_module
+from database.models import Note, User
+from database.session import THREADED_SESSION_SLOTS, AsyncSessionLocal, ThreadedSession
+
+sqlite_only = pytest.mark.skipif(
+    session_module.engine.dialect.name != "sqlite", reason="mode par défaut propre à SQLite"
+)
+
+
+@sqlite_only
+def test_sqlite_defaults_to_threaded_sessions():
+    assert session_module.ASYNC_SESSION_MODE == "threaded"
+    assert isinstance(AsyncSessionLocal(), ThreadedSession)
+
+
+def test_native_mode_factory(monkeypatch):
+    monkeypatch.setattr(session_module, "ASYNC_SESSION_MODE", "native")
+    assert isinstance(AsyncSessionLocal(), AsyncSession)
+
+
+def test_threaded_session_api(app, make_user, make_note):
+    uid = make_user("threaded")
+    note = make_note(uid, "Avant", "contenu")
+    loop_thread = threading.get_ident()
+
+    async def scenario():
+        async with ThreadedSession() as db:
+            assert (await db.get(User, uid)).id == uid
+            assert await db.scalar(select(func.count()).select_from(Note).where(Note.user_id == uid)) == 1
+            titles = (await db.scalars(select(Note.title).where(Note.user_id == uid))).all()
+            rows = (await db.execute(select(Note.id, Note.title).where(Note.user_id == uid))).mappings().all()
+            worker = await db.run_sync(lambda s: threading.get_ident())
+
+            result = await db.execute(update(Note).where(Note.id == note["id"]).values(title="Après"))
+            assert result.rowcount == 1
+            await db.rollback()
+            obj = await db.get(Note, note["id"])
+            assert obj.title == "Avant"
+            obj.title = "Après"
+            await db.commit()
+            # expire_on_commit=False : lisible après commit sans recharger
+            assert obj.title == "Après"
+        return titles, rows, worker
+
+    titles, rows, worker = asyncio.run(scenario())
+    assert titles == ["Avant"]
+    assert rows == [{"id": note["id"], "title": "Avant"}]
+    assert worker != loop_thread
+
+
+def test_threaded_delete_loads_cascades_off_the_loop(app, make_user, make_note):
+    uid = make_user("threaded-delete")
+    make_note(uid, "Supprimée", "contenu")
+    loop_thread = threading.get_ident()
+    sql_threads = []
+
+    def record(*args):
+        sql_threads.append(threading.get_ident())
+
+    async def scenario():
+        async with ThreadedSession() as db:
+            user = await db.get(User, uid)
+            sql_threads.clear()
+            # cascade="all, delete" : charge projets, notes et zones
+            await db.delete(user)
+            await db.commit()
+        async with ThreadedSession() as db:
+            return await db.get(User, uid)
+
+    event.listen(session_module.threaded_engine, "before_cursor_execute", record)
+    try:
+        assert asyncio.run(scenario()) is None
+    finally:
+        event.remove(session_module.threaded_engine, "before_cursor_execute", record)
+    assert sql_threads and loop_thread not in sql_threads
+
+
+def test_threaded_sessions_wait_for_a_connection_on_the_loop(app):
+    """Plus de sessions que de connexions : pas d'interblocage du threadpool."""
+
+    async def one():
+        async with ThreadedSession() as db:
+            await db.scalar(select(func.count()).select_from(User))
+            await asyncio.sleep(0.01)  # garde la connexion entre deux await
+            return await db.scalar(select(func.count()).select_from(Note))
+
+    async def many():
+        return await asyncio.wait_for(asyncio.gather(*(one() for _ in range(THREADED_SESSION_SLOTS * 4))), 30)
+
+    assert len(asyncio.run(many())) == THREADED_SESSION_SLOTS * 4
+
+
+def test_cancelled_threaded_session_releases_its_slot(app):
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hold():
+            async with ThreadedSession() as db:
+                await db.scalar(select(1))
+                started.set()
+                await asyncio.sleep(10)
+
+        tasks = [asyncio.create_task(hold()) for _ in range(THREADED_SESSION_SLOTS)]
+        await started.wait()
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        async with ThreadedSession() as db:
+            return await asyncio.wait_for(db.scalar(select(1)), 5)
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_routes_work_with_native_sessions(client, make_user, monkeypatch):
+    monkeypatch.setattr(session_module, "ASYNC_SESSION_MODE", "native")
+    uid = make_user("native")
+    res = client.post("/notes/", json={"user_id": uid, "title": "Native", "content": "aiosqlite"})
+    assert res.status_code == 201, res.text
+    listed = client.get(f"/notes/user/{uid}").json()
+    assert [n["title"] for n in listed] == ["Native"]
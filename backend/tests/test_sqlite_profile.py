@@ -0,0 +1,89 @@
+# backend/tests/test_sqlite_profile.py
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database.database import engine, engine_options, install_sqlite_profile, sqlite_pragmas
+
+sqlite_only = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="profil propre à SQLite")
+
+
+def pragma(conn, name):
+    return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_engine_options_by_backend(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    file_opts = engine_options("sqlite:///tmp/x.db")
+    assert file_opts["connect_args"] == {"check_same_thread": False}
+    assert file_opts["pool_pre_ping"] is False
+    assert file_opts["pool_size"] == 7
+
+    memory_opts = engine_options("sqlite://")
+    assert "pool_size" not in memory_opts
+
+    pg_opts = engine_options("postgresql+psycopg://u:p@localhost/db")
+    assert pg_opts["pool_pre_ping"] is True
+    assert "connect_args" not in pg_opts
+
+
+def test_sqlite_pragmas_env(monkeypatch):
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "FULL")
+    monkeypatch.setenv("SQLITE_CACHE_SIZE_KB", "1024")
+    pragmas = sqlite_pragmas()
+    assert pragmas["synchronous"] == "FULL"
+    assert pragmas["cache_size"] == -1024
+    assert pragmas["foreign_keys"] == "ON"
+    monkeypatch.setenv("SQLITE_TUNING", "0")
+    assert sqlite_pragmas() == {}
+
+
+def test_profile_applied_to_every_connection(tmp_path):
+    target = create_engine(f"sqlite:///{tmp_path / 'p.db'}", **engine_options("sqlite:///x.db"))
+    install_sqlite_profile(target, {"journal_mode": "WAL", "busy_timeout": 1234, "foreign_keys": "ON"})
+    try:
+        with target.connect() as a, target.connect() as b:
+            for conn in (a, b):
+                assert pragma(conn, "journal_mode") == "wal"
+                assert pragma(conn, "busy_timeout") == 1234
+                assert pragma(conn, "foreign_keys") == 1
+    finally:
+        target.dispose()
+
+
+def test_historical_profile_leaves_defaults(tmp_path):
+    target = create_engine(f"sqlite:///{tmp_path / 'h.db'}")
+    install_sqlite_profile(target, {})
+    try:
+        with target.connect() as conn:
+            assert pragma(conn, "journal_mode") == "delete"
+            assert pragma(conn, "foreign_keys") == 0
+    finally:
+        target.dispose()
+
+
+@sqlite_only
+def test_app_engines_use_profile(app):
+    from database.session import async_engine
+
+    with engine.connect() as conn:
+        assert pragma(conn, "journal_mode") == "wal"
+        assert pragma(conn, "foreign_keys") == 1
+
+    async def check():
+        async with async_engine.connect() as conn:
+            result = await conn.exec_driver_sql("PRAGMA foreign_keys")
+            return result.scalar()
+
+    assert asyncio.run(check()) == 1
+
+
+@sqlite_only
+def test_foreign_keys_enforced(app):
+    with pytest.raises(Exception, match="FOREIGN KEY"):
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO notes (id, user_id, title, content, pinned, \"createdAt\", \"updatedAt\") "
+                "VALUES ('fk', 'utilisateur-absent', 't', 'c', 0, '2024-01-01', '2024-01-01')"
+            ))
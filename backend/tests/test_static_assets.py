@@ -0,0 +1,109 @@
+# backend/tests/test_static_assets.py
+import gzip
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.static_assets import (
+    IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, StaticManifest, accepted_encodings, precompress_dir,
+)
+
+HTML = "<html><body>" + "bonjour " * 200 + "</body></html>"
+JS = "console.log('corebrain');" * 100
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / "_next/static/chunks").mkdir(parents=True)
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "index.html").write_text(HTML)
+    (tmp_path / "notes/index.html").write_text(HTML.replace("bonjour", "notes"))
+    (tmp_path / "_next/static/chunks/app-abc123.js").write_text(JS)
+    (tmp_path / "petit.txt").write_text("trop court")
+    (tmp_path / "logo.png").write_bytes(os.urandom(2048))
+    return tmp_path
+
+
+def client_for(manifest: StaticManifest) -> TestClient:
+    async def serve(request: Request):
+        return manifest.response(request, request.path_params["path"]) or Response(status_code=404)
+
+    return TestClient(Starlette(routes=[Route("/{path:path}", serve)]))
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, br;q=0.5, deflate;q=0") == {"gzip", "br"}
+    assert accepted_encodings("") == set()
+
+
+def test_precompress_skips_small_binary_and_incompressible(dist):
+    written = precompress_dir(dist)
+    assert (dist / "index.html.gz").is_file()
+    assert (dist / "_next/static/chunks/app-abc123.js.gz").is_file()
+    assert not (dist / "petit.txt.gz").exists()
+    assert not (dist / "logo.png.gz").exists()
+    assert written["skipped"] == 1
+    assert gzip.decompress((dist / "index.html.gz").read_bytes()).decode() == HTML
+
+
+def test_serves_precompressed_variant_with_its_own_etag(dist):
+    precompress_dir(dist)
+    manifest = StaticManifest(dist)
+    assert "index.html.gz" not in manifest.files
+    client = client_for(manifest)
+
+    plain = client.get("/index.html", headers={"Accept-Encoding": "identity"})
+    gz = client.get("/index.html", headers={"Accept-Encoding": "gzip"})
+
+    assert plain.text == gz.text == HTML
+    assert "content-encoding" not in plain.headers
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.headers["vary"] == "Accept-Encoding"
+    assert gz.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    assert client.get("/index.html", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": gz.headers["etag"],
+    }).status_code == 304
+    # L'ETag d'une variante ne valide pas la représentation non compressée
+    assert client.get("/index.html", headers={
+        "Accept-Encoding": "identity", "If-None-Match": gz.headers["etag"],
+    }).status_code == 200
+
+
+def test_cache_control_and_spa_fallback(dist):
+    client = client_for(StaticManifest(dist))
+
+    asset = client.get("/_next/static/chunks/app-abc123.js")
+    assert asset.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    page = client.get("/notes")
+    assert page.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert "notes notes" in page.text
+
+    # Route du front inconnue → index.html ; asset absent → 404
+    assert client.get("/projets/42").text == HTML
+    assert client.get("/_next/static/chunks/absent.js").status_code == 404
+    assert client.get("/static/absent.png").status_code == 404
+
+
+def test_stale_variant_is_ignored(dist):
+    precompress_dir(dist)
+    source = dist / "index.html"
+    variant = dist / "index.html.gz"
+    stat = variant.stat()
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+
+    manifest = StaticManifest(dist)
+
+    assert "gzip" not in manifest.files["index.html"].variants
+    assert "gzip" in manifest.files["_next/static/chunks/app-abc123.js"].variants
+
+
+def test_missing_dist_serves_nothing(tmp_path):
+    manifest = StaticManifest(tmp_path / "absent")
+    assert manifest.files == {} and manifest.index is None
+    assert client_for(manifest).get("/").status_code == 404
@@ -0,0 +1,94 @@
+# backend/tests/test_tags.py
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database.database import engine
+from database.models import Note, Tag
+
+from services.tag_services import _insert_missing, _tag_id_cache, resolve_tag_ids, resolve_tags
+
+
+def names(*bases):
+    suffix = uuid.uuid4().hex[:8]
+    return [f"{b}-{suffix}" for b in bases]
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+
+
+def test_resolve_tag_ids_creates_missing_and_caches_on_commit(db):
+    a, b = names("a", "b")
+    ids = resolve_tag_ids(db, [a, b, a, ""])
+    assert set(ids) == {a, b}
+    # Pas encore commité : le cache ne doit rien exposer
+    assert _tag_id_cache.get(a) is None
+    db.commit()
+    assert _tag_id_cache.get(a) == ids[a]
+
+    with count_queries() as statements:
+        assert resolve_tag_ids(db, [a, b]) == ids
+    assert statements == []
+
+
+def test_rollback_does_not_cache_created_tags(db):
+    (a,) = names("rollback")
+    resolve_tag_ids(db, [a])
+    db.rollback()
+    assert _tag_id_cache.get(a) is None
+    assert db.query(Tag).filter(Tag.name == a).count() == 0
+
+
+def test_insert_missing_ignores_concurrent_creation(db):
+    (a,) = names("race")
+    first = resolve_tag_ids(db, [a])[a]
+    db.commit()
+    # Un autre écrivain a déjà créé le tag : pas d'IntegrityError
+    _insert_missing(db, [a])
+    db.commit()
+    assert [t.id for t in db.query(Tag).filter(Tag.name == a)] == [first]
+
+
+def test_resolve_tags_revalidates_stale_cache(db):
+    a, b = names("stale", "frais")
+    tags = resolve_tags(db, [a, b])
+    db.commit()
+    assert [t.name for t in tags] == [a, b]
+
+    # Tag supprimé par un script de maintenance : l'id en cache est périmé
+    db.query(Tag).filter(Tag.name == a).delete()
+    db.commit()
+    assert _tag_id_cache.get(a) is not None
+    again = resolve_tags(db, [a, b])
+    db.commit()
+    assert [t.name for t in again] == [a, b]
+    assert again[0].id != tags[0].id
+    assert again[1].id == tags[1].id
+    assert _tag_id_cache.get(a) == again[0].id
+
+
+def test_note_routes_share_tags(client, make_user, make_note, db):
+    uid = make_user("tags")
+    a, b, c = names("x", "y", "z")
+    first = make_note(uid, "Un", tag_names=[a, b])
+    second = make_note(uid, "Deux", tag_names=[b, c])
+    tag_ids = lambda note_id: {t.name: t.id for t in db.get(Note, note_id).tags}
+    assert tag_ids(first["id"])[b] == tag_ids(second["id"])[b]
+
+    res = client.put(f"/notes/{first['id']}", json={"tag_names": [c]})
+    assert res.status_code == 200, res.text
+    db.expire_all()
+    assert tag_ids(first["id"]) == {c: tag_ids(second["id"])[c]}
+    assert db.query(Tag).filter(Tag.name.in_([a, b, c])).count() == 3
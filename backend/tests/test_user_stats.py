@@ -0,0 +1,87 @@
+# backend/tests/test_user_stats.py
+import json
+
+from sqlalchemy import update
+
+from database.models import Note
+from services.user_stats import reconcile_user_stats
+
+
+def stats(client, user_id):
+    res = client.get(f"/users/{user_id}/stats")
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def create(client, path, **body):
+    res = client.post(path, json=body)
+    assert res.status_code == 201, res.text
+    return res.json()["id"]
+
+
+def assert_no_drift(db, user_id):
+    db.expire_all()
+    assert reconcile_user_stats(db, user_id, dry_run=True) == {}
+
+
+def test_counters_follow_every_write(client, db, make_user, make_note):
+    uid = make_user("stats")
+    pid = create(client, "/projects/", user_id=uid, name="Salon")
+    aid = create(client, "/areas/", user_id=uid, name="Travail")
+
+    a = make_note(uid, "A", "un deux trois", pinned=True, project_ids=[pid], tag_names=["salon"])
+    b = make_note(uid, "B", "quatre cinq", area_ids=[aid], tag_names=["salon", "budget"])
+    assert client.post(f"/projects/{pid}/notes/{b['id']}").status_code == 200
+
+    s = stats(client, uid)
+    assert (s["notes"], s["pinned"], s["words"], s["areas"], s["projects"]) == (2, 1, 5, 1, 1)
+    assert s["notes_by_project"] == [{"id": pid, "name": "Salon", "status": "ACTIVE", "notes": 2}]
+    assert s["notes_by_area"][0]["notes"] == 1
+    assert [(t["name"], t["notes"]) for t in s["notes_by_tag"]] == [("salon", 2), ("budget", 1)]
+    assert_no_drift(db, uid)
+
+    client.put(f"/notes/{a['id']}", json={"pinned": False, "content": "un", "tag_names": []})
+    client.put(f"/projects/{pid}", json={"status": "COMPLETED"})
+    s = stats(client, uid)
+    assert (s["pinned"], s["words"]) == (0, 3)
+    assert (s["active_projects"], s["completed_projects"]) == (0, 1)
+    assert [(t["name"], t["notes"]) for t in s["notes_by_tag"]] == [("budget", 1), ("salon", 1)]
+    assert_no_drift(db, uid)
+
+    client.delete(f"/notes/{b['id']}")
+    client.delete(f"/areas/{aid}")
+    s = stats(client, uid)
+    assert (s["notes"], s["words"], s["areas"]) == (1, 1, 0)
+    assert s["notes_by_project"][0]["notes"] == 1
+    assert s["notes_by_tag"] == []
+    assert_no_drift(db, uid)
+
+
+def test_bulk_import_is_counted(client, db, make_user):
+    uid = make_user("stats-import")
+    lines = "\n".join(json.dumps({"title": f"N{i}", "content": "mot " * i, "pinned": i == 1}) for i in range(1, 4))
+    res = client.post(f"/notes/import/{uid}", content=lines)
+    assert res.status_code == 200, res.text
+
+    s = stats(client, uid)
+    assert (s["notes"], s["pinned"], s["words"]) == (3, 1, 6)
+    assert_no_drift(db, uid)
+
+
+def test_reconcile_fixes_writes_made_outside_the_session(client, db, make_user, make_note):
+    uid = make_user("stats-drift")
+    note = make_note(uid, "A", "un deux")
+    db.execute(update(Note).where(Note.id == note["id"]).values(wordCount=10, pinned=True))
+    db.commit()
+
+    dry = client.post(f"/users/{uid}/stats/reconcile", params={"dry_run": True}).json()
+    assert dry["fixed"] is False
+    assert dry["drift"] == {"pinned": {"stored": 0, "actual": 1}, "words": {"stored": 2, "actual": 10}}
+    assert stats(client, uid)["words"] == 2
+
+    fixed = client.post(f"/users/{uid}/stats/reconcile").json()
+    assert fixed["fixed"] is True
+    assert stats(client, uid)["words"] == 10
+    assert client.post(f"/users/{uid}/stats/reconcile").json()["drift"] == {}
+    assert client.get("/users/absent/stats").status_code == 404
+
@@ -5,7 +5,7 @@ import { useRouter } from "next/navigation";
 import Card from "@/components/ui/card";
 import MiniStat from "@/components/dashboard/ministat";
 import { getSession } from "@/lib/session";
-import { api, type Project, type Note, type Area } from "@/lib/api";
+import { api } from "@/lib/api";
 
 export default function DashboardOverview() {
   const router = useRouter();
@@ -29,20 +29,13 @@ export default function DashboardOverview() {
       try {
         setLoading(true);
 
-        const [projects, notes, areas] = await Promise.all([
-          api.getProjectsByUser(s.userId) as Promise<Project[]>,
-          api.getUserNotes(s.userId) as Promise<Note[]>,
-          api.getAreasByUser(s.userId) as Promise<Area[]>,
-        ]);
+        // Server-side counters: no need to download every note to count them
+        const stats = await api.getUserStats(s.userId);
 
-        setProjectsCount(projects.length);
-        setNotesCount(notes.length);
-        setAreasCount(areas.length);
-
-        // handle both "archived" and "ARCHIVED"
-        const isArchived = (p: Project) =>
-          String(p.status).toLowerCase() === "archived";
-        setArchivesCount(projects.filter(isArchived).length);
+        setProjectsCount(stats.projects);
+        setNotesCount(stats.notes);
+        setAreasCount(stats.areas);
+        setArchivesCount(stats.completed_projects);
       } catch (e: any) {
         setError(e?.message ?? "Unable to load dashboard data.");
       } finally {
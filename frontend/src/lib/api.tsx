@@ -124,6 +124,20 @@ export type User = {
   createdAt?: string;
 };
 
+export type UserStats = {
+  notes: number;
+  pinned: number;
+  words: number;
+  areas: number;
+  projects: number;
+  projects_by_status: Record<string, number>;
+  active_projects: number;
+  completed_projects: number;
+  notes_by_project: { id: string; name: string; status: string; notes: number }[];
+  notes_by_area: { id: string; name: string; notes: number }[];
+  notes_by_tag: { id: string; name: string; notes: number }[];
+};
+
 export type AreaCreateBody = {
   user_id: string;
   name: string;
@@ -170,6 +184,7 @@ export const api = {
     request<User>("/users/", { method: "POST", body: JSON.stringify(b) }),
   getUsers: () => request<User[]>("/users/"),
   getUser: (id: string) => request<User>(`/users/${id}`),
+  getUserStats: (id: string) => request<UserStats>(`/users/${id}/stats`),
   updateUser: (id: string, b: Partial<{ name: string; avatarUrl: string; password: string }>) =>
     request<User>(`/users/${id}`, { method: "PUT", body: JSON.stringify(b) }),
   deleteUser: (id: string) => request(`/users/${id}`, { method: "DELETE" }),